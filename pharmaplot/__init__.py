@@ -0,0 +1,14 @@
+"""
+interactive plots and numerical tools for pharmacology teaching and screening
+
+importing the package or any of its modules only loads numpy and the standard library: bokeh, scipy, pandas, yaml
+and multiprocessing are imported inside the functions that need them, so that worker processes and command line calls
+start quickly. pharmaplot/tests/test_imports.py enforces this
+"""
+import os as _os
+
+if _os.environ.get('PHARMAPLOT_PROFILE'):
+    # opt-in instrumentation, see pharmaplot.instrument
+    from pharmaplot.instrument import enable_from_environment
+
+    enable_from_environment()
@@ -0,0 +1,229 @@
+"""
+command line entry point: python -m pharmaplot <command>
+"""
+import argparse
+import os
+import sys
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m pharmaplot')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pipeline = commands.add_parser('pipeline', help='QC and fit every plate of a dose-response screening campaign')
+    pipeline.add_argument('inputs', nargs='+', help='plate-reader exports (csv or tsv)')
+    pipeline.add_argument('-o', '--output', required=True, help='csv file the fit results are appended to')
+    pipeline.add_argument('--qc-output', help="csv file the plate QC is appended to (default: <output>.qc.csv)")
+    pipeline.add_argument('-j', '--workers', type=int, help='number of worker processes (default: number of cpus)')
+    pipeline.add_argument('--max-in-flight', type=int, help='maximum number of plates in memory (default: 2 * workers)')
+    pipeline.add_argument('--positive', default='POS', help='compound name of the positive control wells')
+    pipeline.add_argument('--negative', default='NEG', help='compound name of the negative control wells')
+    pipeline.add_argument('--cache-dir', help='read the exports through the columnar cache in this directory')
+    pipeline.add_argument('--store', help='SQLite database of fit results; only new or changed compounds are fitted')
+
+    ingest = commands.add_parser('ingest', help='parse plate-reader exports into the columnar cache')
+    ingest.add_argument('inputs', nargs='+', help='plate-reader exports (csv, tsv or xlsx)')
+    ingest.add_argument('--cache-dir', help='cache directory (default: config.ingest_cache_dir)')
+
+    build = commands.add_parser('build', help='render the interactive pages in scripts/ headlessly')
+    build.add_argument('scripts', nargs='*', help='scripts to build (default: every scripts/*.py)')
+    build.add_argument('-o', '--output-dir', help='output directory (default: config.html_output_dir)')
+    build.add_argument('-j', '--workers', type=int, help='number of worker processes (default: number of cpus)')
+    build.add_argument('-f', '--force', action='store_true', help='rebuild pages even if their inputs are unchanged')
+
+    optimize = commands.add_parser('optimize', help='compact the data arrays of saved pages in place')
+    optimize.add_argument('pages', nargs='+', help='html files saved by bokeh')
+    optimize.add_argument('--encoding', choices=('float64', 'float32', 'uint16'), default='float32',
+                          help='storage of float arrays (default: float32)')
+    optimize.add_argument('--no-derive', action='store_true', help='ship derived columns such as x_log as they are')
+
+    serve = commands.add_parser('serve', help='serve the spec-defined pages with curves evaluated in python')
+    serve.add_argument('scripts', nargs='*', help='page scripts defining a SPEC (default: every scripts/*.py)')
+    serve.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=8000, help='port to listen on (default: 8000)')
+    serve.add_argument('--cache-size', type=int, default=4096, help='maximum number of cached curves')
+    serve.add_argument('-v', '--verbose', action='store_true', help='log every request')
+
+    loadtest = commands.add_parser('loadtest', help='simulate many students using a plot server at once')
+    loadtest.add_argument('scripts', nargs='*', help='page scripts defining a SPEC (default: every scripts/*.py)')
+    loadtest.add_argument('--url', help='address of a running plot server (default: start one in this process)')
+    loadtest.add_argument('--clients', type=int, default=100, help='number of concurrent clients (default: 100)')
+    loadtest.add_argument('--updates', type=int, default=20, help='slider updates per client (default: 20)')
+    loadtest.add_argument('--cache-size', type=int, default=4096, help='maximum number of cached curves')
+
+    api = commands.add_parser('api', help='serve the json evaluation and fitting api')
+    api.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    api.add_argument('--port', type=int, default=8001, help='port to listen on (default: 8001)')
+    api.add_argument('--window-ms', type=float, default=2., help='micro-batching window (default: 2 ms)')
+    api.add_argument('--max-batch', type=int, default=1024, help='largest batch (default: 1024)')
+
+    api_bench = commands.add_parser('api-bench', help='measure requests/s of the evaluation api')
+    api_bench.add_argument('--host', default='127.0.0.1', help='address of the api')
+    api_bench.add_argument('--port', type=int, help='port of a running api (default: start one in this process)')
+    api_bench.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64, 256],
+                           help='numbers of concurrent connections (default: 1 16 64 256)')
+    api_bench.add_argument('--requests', type=int, default=2000, help='requests per concurrency level')
+    api_bench.add_argument('--model', default='mm_competitive', help='model to evaluate (default: mm_competitive)')
+    api_bench.add_argument('--window-ms', type=float, default=2., help='micro-batching window of the in-process api')
+
+    sweep = commands.add_parser('sweep', help='evaluate a model over a parameter grid into a .npy file, out of core')
+    sweep.add_argument('model', help='registered model, e.g. mm_competitive')
+    sweep.add_argument('output', help='.npy file to write (an interrupted sweep of the same grid is resumed)')
+    sweep.add_argument('--x', required=True,
+                       help="x as start:stop:num (linspace), log:start:stop:num (logspace) or a comma-separated list, "
+                            "e.g. 'log:-1:3:10000'")
+    sweep.add_argument('-p', '--param', action='append', default=[], metavar='NAME=VALUES',
+                       help="a number or values as for --x per parameter, e.g. 'ki=log:-2:2:100'")
+    sweep.add_argument('--mode', choices=('product', 'zip'), default='product', help='grid mode (default: product)')
+    sweep.add_argument('--dtype', choices=('float32', 'float64'), default='float64')
+    sweep.add_argument('--chunk-mb', type=float, default=1., help='output evaluated per chunk (default: 1 MB)')
+    sweep.add_argument('-j', '--workers', type=int, default=1, help='threads evaluating every chunk (default: 1)')
+    sweep.add_argument('--restart', action='store_true', help='start over instead of resuming')
+
+    bench = commands.add_parser('bench', help='benchmark the model kernels, page builds and page sizes')
+    bench.add_argument('-o', '--output', default='benchmark.json', help='json results file (default: benchmark.json)')
+    bench.add_argument('--sizes', type=float, nargs='+', help='kernel array sizes (default: 1e2 1e3 ... 1e8)')
+    bench.add_argument('--dtypes', nargs='+', choices=('float32', 'float64'), default=['float32', 'float64'])
+    bench.add_argument('--no-kernels', action='store_true', help='skip the kernel benchmarks')
+    bench.add_argument('--no-builds', action='store_true', help='skip the page builds (and page sizes)')
+    bench.add_argument('--scripts', nargs='+', help='scripts to build (default: every scripts/*.py)')
+
+    bench_compare = commands.add_parser('bench-compare', help='flag regressions of benchmark results against a '
+                                                              'baseline')
+    bench_compare.add_argument('baseline', help='json results of the baseline')
+    bench_compare.add_argument('current', help='json results to check')
+    bench_compare.add_argument('--time-tolerance', type=float, default=0.2,
+                               help='relative slowdown counted as a regression (default: 0.2)')
+    bench_compare.add_argument('--size-tolerance', type=float, default=0.01,
+                               help='relative page size increase counted as a regression (default: 0.01)')
+
+    accuracy = commands.add_parser('accuracy', help='check the logistic and hill models against a high-precision '
+                                                     'reference')
+    accuracy.add_argument('--size', type=int, default=1000, help='points per case (default: 1000)')
+    accuracy.add_argument('--tolerance', type=float, default=16.,
+                          help='largest error in machine epsilons of the span (default: 16)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'pipeline':
+        from pharmaplot.pipeline import format_summary, run_pipeline
+        summary = run_pipeline(args.inputs, args.output, qc_output=args.qc_output, workers=args.workers,
+                               max_in_flight=args.max_in_flight, positive=args.positive, negative=args.negative,
+                               cache_dir=args.cache_dir, store=args.store)
+        print(format_summary(summary))
+    elif args.command == 'ingest':
+        import time
+        from pharmaplot.ingest import ingest
+        for path in args.inputs:
+            start = time.perf_counter()
+            columns = ingest(path, args.cache_dir)
+            print(f'{path}: {columns.plate.size:,} rows, {len(columns.plates)} plates, {len(columns.compounds)} '
+                  f'compounds in {time.perf_counter() - start:.2f} s')
+    elif args.command == 'build':
+        from pharmaplot.build import build, format_report
+        output_dir = os.path.abspath(args.output_dir) if args.output_dir else None
+        report = build(args.scripts or None, output_dir=output_dir, workers=args.workers, force=args.force)
+        print(format_report(report))
+        return int(any(entry['status'] == 'failed' for entry in report))
+    elif args.command == 'optimize':
+        from pharmaplot.payload import format_report, optimize_file
+        print(format_report([optimize_file(page, args.encoding, derive=not args.no_derive) for page in args.pages]))
+    elif args.command == 'serve':
+        from pharmaplot.server import PlotServer, script_specs
+        server = PlotServer(script_specs(args.scripts or None), host=args.host, port=args.port,
+                            cache_size=args.cache_size, verbose=args.verbose)
+        print(f'serving {len(server.pages)} pages on {server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    elif args.command == 'loadtest':
+        import threading
+        from pharmaplot.server import PlotServer, format_load_test, load_test, script_specs
+        specs = script_specs(args.scripts or None)
+        server = None
+        if args.url is None:
+            server = PlotServer(specs, port=0, cache_size=args.cache_size)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            print(format_load_test(load_test(args.url or server.url, specs, clients=args.clients,
+                                             updates=args.updates)))
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+    elif args.command == 'api':
+        from pharmaplot.api import serve
+        serve(args.host, args.port, window=args.window_ms / 1000, max_batch=args.max_batch)
+    elif args.command == 'api-bench':
+        import asyncio
+        from pharmaplot.api import EvalServer, benchmark, format_benchmark
+
+        async def run():
+            server = None
+            if args.port is None:
+                server = await EvalServer(window=args.window_ms / 1000).start(args.host, 0)
+            try:
+                return await benchmark(args.host, args.port or server.port, args.concurrency, args.requests,
+                                       args.model)
+            finally:
+                if server is not None:
+                    await server.close()
+
+        print(format_benchmark(asyncio.run(run())))
+    elif args.command == 'sweep':
+        from pharmaplot.models import get_model
+        from pharmaplot.sweep import format_report, parse_values, sweep
+
+        try:
+            x = parse_values(args.x)
+            params = {}
+            for param in args.param:
+                name, equals, values = param.partition('=')
+                if not equals:
+                    raise ValueError(f'expected NAME=VALUES, got {param!r}')
+                params[name.strip()] = parse_values(values)
+        except ValueError as error:
+            parser.error(str(error))
+        shown = -1
+
+        def progress(done, total):
+            nonlocal shown
+            percent = 100 * done // total
+            if percent != shown:
+                shown = percent
+                print(f'\r{done:,} / {total:,} curves ({percent}%)', end='', file=sys.stderr, flush=True)
+
+        report = sweep(get_model(args.model).function, x, args.output, mode=args.mode, dtype=args.dtype,
+                       chunk_bytes=int(args.chunk_mb * 2 ** 20), workers=args.workers, resume=not args.restart,
+                       progress=progress, **params)
+        print(file=sys.stderr)
+        print(format_report(report))
+    elif args.command == 'bench':
+        from pharmaplot.bench import SIZES, format_results, run
+        results = run(args.output, sizes=[int(size) for size in args.sizes or SIZES], dtypes=args.dtypes,
+                      kernels=not args.no_kernels, builds=not args.no_builds, scripts=args.scripts)
+        print(format_results(results))
+        print(f'results written to {args.output}')
+    elif args.command == 'bench-compare':
+        import json
+        from pharmaplot.bench import compare, format_comparison
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.time_tolerance, args.size_tolerance)
+        print(format_comparison(rows, baseline, current))
+        return int(any(row['regression'] for row in rows))
+    elif args.command == 'accuracy':
+        from pharmaplot.accuracy import failures, format_results, run
+        results = run(size=args.size)
+        print(format_results(results, args.tolerance))
+        return int(bool(failures(results, args.tolerance)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
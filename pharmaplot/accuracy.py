@@ -0,0 +1,153 @@
+"""
+accuracy of the logistic and hill models against a high-precision reference
+
+every case of CASES is evaluated in float32 and float64, both by the model function itself and by its generated
+kernel (through :func:`pharmaplot.grid.evaluate_grid`), and compared to the same equation evaluated with 50 significant
+digits in decimal arithmetic, at exactly the input values the float evaluation saw. the error is reported relative to
+the span of the curve (e.g. top - bottom) in units of the machine epsilon of the dtype, together with the number of
+non-finite values and whether any floating point overflow, division by zero or invalid operation occurred::
+
+    python -m pharmaplot accuracy
+
+the cases stress the formulations: steep hill slopes, concentration ranges far beyond the ec50, and molar ligand
+concentrations raised to high hill coefficients (whose powers leave the float32 range)
+"""
+import decimal
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+# significant digits of the reference
+PRECISION = 50
+
+# errors above this many machine epsilons (of the span) fail the check
+TOLERANCE = 16
+
+# (model, case, independent variable range, spacing, parameters)
+CASES = (
+    ('four_parameter_logistic_equation', 'standard', (-12., 0.), 'linear',
+     dict(top=100., bottom=0., hillslope=1., logec50=-6.)),
+    ('four_parameter_logistic_equation', 'steep', (-7., -5.), 'linear',
+     dict(top=100., bottom=0., hillslope=50., logec50=-6.)),
+    ('four_parameter_logistic_equation', 'wide range', (-60., 40.), 'linear',
+     dict(top=100., bottom=0., hillslope=5., logec50=-6.)),
+    ('four_parameter_logistic_equation', 'inhibition', (-12., 0.), 'linear',
+     dict(top=100., bottom=10., hillslope=-2., logec50=-6.)),
+    ('competitive_binding', 'standard', (-12., -2.), 'linear', dict(nonspecific=5., total=100., pIC50=7., nH=1.)),
+    ('competitive_binding', 'steep', (-60., 40.), 'linear', dict(nonspecific=5., total=100., pIC50=7., nH=20.)),
+    ('specific_binding_hill', 'micromolar', (1e-3, 1e3), 'log', dict(bmax=100., kd=5., hill_coef=1.5)),
+    ('specific_binding_hill', 'molar', (1e-12, 1e-3), 'log', dict(bmax=100., kd=1e-8, hill_coef=4.)),
+    ('specific_binding_hill', 'molar, steep', (1e-15, 1.), 'log', dict(bmax=100., kd=1e-8, hill_coef=40.)),
+)
+
+
+def _four_parameter_logistic_equation(x, top, bottom, hillslope, logec50):
+    return bottom + (top - bottom) / (1 + decimal.Decimal(10) ** ((logec50 - x) * hillslope))
+
+
+def _competitive_binding(x, nonspecific, total, pIC50, nH):
+    return nonspecific + (total - nonspecific) / (1 + decimal.Decimal(10) ** (nH * (pIC50 + x)))
+
+
+def _specific_binding_hill(x, bmax, kd, hill_coef):
+    bound = x ** hill_coef if x else decimal.Decimal(0)
+    return bmax * bound / (bound + kd ** hill_coef)
+
+
+_REFERENCES: Dict[str, Callable] = {
+    'four_parameter_logistic_equation': _four_parameter_logistic_equation,
+    'competitive_binding': _competitive_binding,
+    'specific_binding_hill': _specific_binding_hill,
+}
+
+_SPANS = {
+    'four_parameter_logistic_equation': lambda p: p['top'] - p['bottom'],
+    'competitive_binding': lambda p: p['total'] - p['nonspecific'],
+    'specific_binding_hill': lambda p: p['bmax'],
+}
+
+
+def reference(model: str, x: np.ndarray, params: dict) -> np.ndarray:
+    """the model evaluated at x in decimal arithmetic with PRECISION digits, rounded to float64"""
+    with decimal.localcontext() as context:
+        context.prec = PRECISION
+        # wide enough for 10**(hillslope * range) and l**hill_coef of every case
+        context.Emax, context.Emin = 10 ** 6, -10 ** 6
+        values = {name: decimal.Decimal(float(value)) for name, value in params.items()}
+        function = _REFERENCES[model]
+        return np.array([float(function(decimal.Decimal(float(xi)), **values)) for xi in x])
+
+
+def _evaluate(model: str, path: str, x: np.ndarray, params: dict, dtype: np.dtype):
+    """values of one evaluation path, and the first floating point error raised (or None)"""
+    from pharmaplot.grid import evaluate_grid
+    from pharmaplot.models import get_model
+
+    model = get_model(model)
+    with np.errstate(over='raise', divide='raise', invalid='raise'):
+        try:
+            if path == 'function':
+                values = model.function(x, **params)
+            else:
+                values = evaluate_grid(model.function, x, dtype=dtype, **params)
+            error = None
+        except FloatingPointError as exc:
+            error = str(exc)
+    if error is not None:
+        with np.errstate(all='ignore'):
+            values = model.function(x, **params) if path == 'function' else evaluate_grid(model.function, x,
+                                                                                           dtype=dtype, **params)
+    return values, error
+
+
+def measure(model: str, case: str, x_range: tuple, spacing: str, params: dict, dtype='float64',
+            size: int = 1000) -> List[dict]:
+    """
+    errors of one case in one dtype, for the model function and its kernel
+
+    Returns
+    -------
+    results: List[dict]
+        one dict per evaluation path: model, case, dtype, path ('function' or 'kernel'), dtype of the result,
+        max_error (largest error relative to the span, in machine epsilons of dtype), nonfinite (count) and
+        fp_error (the floating point error raised, or None)
+    """
+    dtype = np.dtype(dtype)
+    space = np.geomspace if spacing == 'log' else np.linspace
+    x = space(*x_range, num=size).astype(dtype)
+    expected = reference(model, x, params)
+    span = abs(_SPANS[model](params))
+    results = []
+    for path in ('function', 'kernel'):
+        values, fp_error = _evaluate(model, path, x, params, dtype)
+        values = np.asarray(values)
+        finite = np.isfinite(values)
+        error = np.abs(values[finite].astype(np.float64) - expected[finite]) / span / np.finfo(dtype).eps
+        results.append(dict(model=model, case=case, dtype=dtype.name, path=path, result_dtype=values.dtype.name,
+                            max_error=float(error.max(initial=0.)), nonfinite=int((~finite).sum()),
+                            fp_error=fp_error))
+    return results
+
+
+def run(dtypes: Sequence[str] = ('float32', 'float64'), size: int = 1000) -> List[dict]:
+    """:func:`measure` every case of CASES in every dtype"""
+    return [result for model, case, x_range, spacing, params in CASES for dtype in dtypes
+            for result in measure(model, case, x_range, spacing, params, dtype, size)]
+
+
+def failures(results: List[dict], tolerance: float = TOLERANCE) -> List[dict]:
+    """results with an error above tolerance, non-finite values, a floating point error or a promoted dtype"""
+    return [result for result in results if result['max_error'] > tolerance or result['nonfinite']
+            or result['fp_error'] or result['result_dtype'] != result['dtype']]
+
+
+def format_results(results: List[dict], tolerance: float = TOLERANCE) -> str:
+    """the results as a text table"""
+    failed = {id(result) for result in failures(results, tolerance)}
+    lines = [f'{"model":<34} {"case":<14} {"dtype":<8} {"path":<9} {"max error":>12} {"nonfinite":>9}']
+    for result in results:
+        flag = '  FAILED' + (f' ({result["fp_error"]})' if result['fp_error'] else '') if id(result) in failed else ''
+        lines.append(f'{result["model"]:<34} {result["case"]:<14} {result["dtype"]:<8} {result["path"]:<9} '
+                     f'{result["max_error"]:>8.2f} eps {result["nonfinite"]:>9}{flag}')
+    lines.append(f'{len(results)} evaluations, {len(failed)} above {tolerance} eps of the span or not finite')
+    return '\n'.join(lines)
@@ -0,0 +1,390 @@
+"""
+asyncio json api for model curves and fits, with micro-batching
+
+other tools can evaluate and fit the registered models over http without importing the package::
+
+    POST /eval/<model>   {"x": [...], "params": {"vmax": 100, "km": 5}}        -> {"y": [...]}
+    POST /fit/<model>    {"x": [...], "y": [...], "fixed": {"conc_i": 0}}      -> {"params": {...}, "stderr": {...},
+                                                                                   "converged": true, "sse": ...}
+    GET  /models         registered models and their parameters
+    GET  /stats          number of requests and batches served
+
+requests for the same model arriving within a few milliseconds of each other are gathered into one batch and
+evaluated with a single vectorized numpy call (fits with one :func:`pharmaplot.fit.fit_batch`), so throughput grows
+with the batch size rather than the number of requests. the server speaks just enough HTTP/1.1 (with keep-alive) for
+json clients; it is meant for a trusted local network::
+
+    python -m pharmaplot api --port 8001
+    python -m pharmaplot api-bench --concurrency 1 16 64 256
+"""
+import json
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from pharmaplot.models import MODELS, get_model
+from pharmaplot.server import json_values
+
+# largest request body accepted, in bytes
+MAX_BODY = 10_000_000
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# batched evaluation
+# ----------------------------------------------------------------------------------------------------------------------
+def _padded(rows: Sequence[np.ndarray]) -> np.ndarray:
+    """rows of different lengths as one (N, max length) array padded with nan"""
+    out = np.full((len(rows), max((row.size for row in rows), default=0)), np.nan)
+    for i, row in enumerate(rows):
+        out[i, :row.size] = row
+    return out
+
+
+def eval_batch(model: str, xs: Sequence[np.ndarray], params: Sequence[Dict[str, float]]) -> List[np.ndarray]:
+    """
+    evaluate one model for many requests in a single vectorized call
+
+    Parameters
+    ----------
+    model: str
+        registered model name
+
+    xs: Sequence[np.ndarray]
+        the x values of every request (lengths may differ)
+
+    params: Sequence[Dict[str, float]]
+        the parameter values of every request; parameters with defaults may be left out
+
+    Returns
+    -------
+    ys: List[np.ndarray]
+        the curve of every request
+    """
+    model = get_model(model)
+    columns = {name: np.array([p.get(name, model.defaults.get(name)) for p in params], dtype=float)[:, None]
+               for name in model.parameters}
+    with np.errstate(all='ignore'):
+        y = np.broadcast_to(model.function(_padded(xs), **columns), (len(xs), max(x.size for x in xs)))
+    return [y[i, :x.size] for i, x in enumerate(xs)]
+
+
+def fit_requests(model: str, xs: Sequence[np.ndarray], ys: Sequence[np.ndarray],
+                 fixed: Sequence[Dict[str, float]]) -> List[dict]:
+    """fit one model to the data of many requests (all fixing the same parameters) with a single fit_batch call"""
+    from pharmaplot.fit import fit_batch
+
+    fixed_columns = {name: np.array([f[name] for f in fixed], dtype=float) for name in (fixed[0] if fixed else {})}
+    fit = fit_batch(model, _padded(xs), _padded(ys), fixed=fixed_columns or None)
+    return [dict(params=dict(zip(fit.names, json_values(fit.params[i]))),
+                 stderr=dict(zip(fit.names, json_values(fit.stderr[i]))),
+                 converged=bool(fit.converged[i]), iterations=int(fit.iterations[i]), sse=json_values(fit.sse[i]))
+            for i in range(len(xs))]
+
+
+class Batcher:
+    """
+    gathers requests for the same model and kind into batches
+
+    the first request of a batch starts a timer of `window` seconds; the batch is run when the timer fires or when
+    it reaches max_batch requests, whichever comes first. batches run in the event loop's default executor, so the
+    loop keeps accepting requests meanwhile; if a batch fails, its requests are run one at a time so that each gets
+    its own result or error
+
+    Parameters
+    ----------
+    window: float
+        seconds to wait for more requests after the first one of a batch
+
+    max_batch: int
+        largest batch
+    """
+
+    def __init__(self, window: float = 0.002, max_batch: int = 1024):
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = self.batches = 0
+        self._queues = {}
+        self._running = set()
+
+    async def submit(self, key: tuple, request):
+        """queue a request under key = (kind, model, ...) and wait for its result"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.setdefault(key, [])
+        queue.append((request, future))
+        if len(queue) >= self.max_batch:
+            self._run(key)
+        elif len(queue) == 1:
+            loop.call_later(self.window, self._run, key)
+        return await future
+
+    def _run(self, key: tuple):
+        import asyncio
+
+        batch = self._queues.pop(key, None)
+        if not batch:
+            return
+        self.requests += len(batch)
+        self.batches += 1
+        # the event loop keeps only weak references to tasks
+        task = asyncio.ensure_future(self._execute(key, batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _execute(self, key: tuple, batch: list):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        requests = [request for request, _ in batch]
+        try:
+            results = await loop.run_in_executor(None, _compute, key, requests)
+        except Exception:
+            # one bad request must not fail the others of its batch
+            results = []
+            for request in requests:
+                try:
+                    results.append((await loop.run_in_executor(None, _compute, key, [request]))[0])
+                except Exception as error:
+                    results.append(error)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def _compute(key: tuple, requests: list) -> list:
+    """the results of a batch of requests queued under key"""
+    if key[0] == 'eval':
+        return [json_values(y) for y in eval_batch(key[1], [r['x'] for r in requests], [r['params'] for r in requests])]
+    return fit_requests(key[1], [r['x'] for r in requests], [r['y'] for r in requests], [r['fixed'] for r in requests])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# http
+# ----------------------------------------------------------------------------------------------------------------------
+def _parse(kind: str, model: str, body: dict) -> tuple:
+    """(batch key, request) for a request body, or ValueError/KeyError if it is invalid"""
+    model = get_model(model)
+    if not isinstance(body, dict):
+        raise ValueError('the request body must be a json object')
+    for name in ('params', 'fixed'):
+        if not isinstance(body.get(name, {}), dict):
+            raise ValueError(f'{name} must be a json object of parameter values')
+    x = np.asarray(body['x'], dtype=float).ravel()
+    if kind == 'eval':
+        params = {name: float(value) for name, value in body.get('params', {}).items()}
+        unknown = set(params) - set(model.parameters)
+        missing = [name for name in model.parameters if name not in params and name not in model.defaults]
+        if unknown or missing:
+            raise ValueError(f'{model.name} parameters: unknown {sorted(unknown)}, missing {missing}')
+        return ('eval', model.name), dict(x=x, params=params)
+
+    y = np.asarray(body['y'], dtype=float).ravel()
+    if y.size != x.size:
+        raise ValueError('x and y must have the same length')
+    fixed = {name: float(value) for name, value in body.get('fixed', {}).items()}
+    if set(fixed) - set(model.parameters):
+        raise ValueError(f'{model.name} has no parameter(s): {", ".join(sorted(set(fixed) - set(model.parameters)))}')
+    return ('fit', model.name, tuple(sorted(fixed))), dict(x=x, y=y, fixed=fixed)
+
+
+class EvalServer:
+    """
+    the json api; serve with ``await EvalServer().start(host, port)`` or :func:`serve`
+
+    Parameters
+    ----------
+    window: float
+        micro-batching window in seconds
+
+    max_batch: int
+        largest batch
+    """
+
+    def __init__(self, window: float = 0.002, max_batch: int = 1024):
+        self.batcher = Batcher(window, max_batch)
+        self.server = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8001):
+        """start listening; port 0 picks a free port (see the port attribute)"""
+        import asyncio
+
+        self.server = await asyncio.start_server(self._connection, host, port, backlog=1024)
+        return self
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _respond(self, method: str, path: str, body: bytes):
+        """(status, json value) for one request"""
+        parts = path.split('?')[0].strip('/').split('/')
+        if method == 'GET' and parts == ['models']:
+            return 200, {name: dict(variable=m.variable, parameters=list(m.parameters), defaults=m.defaults)
+                         for name, m in MODELS.items()}
+        if method == 'GET' and parts == ['stats']:
+            batcher = self.batcher
+            return 200, dict(requests=batcher.requests, batches=batcher.batches,
+                             mean_batch=batcher.requests / batcher.batches if batcher.batches else 0.)
+        if method != 'POST' or len(parts) != 2 or parts[0] not in ('eval', 'fit'):
+            return 404, dict(error=f'no such endpoint: {method} {path}')
+        try:
+            key, request = _parse(parts[0], parts[1], json.loads(body or b'{}'))
+        except (KeyError, TypeError, ValueError) as error:
+            return 400, dict(error=str(error).strip('"\''))
+        try:
+            result = await self.batcher.submit(key, request)
+        except Exception as error:
+            return 422, dict(error=repr(error))
+        return 200, dict(y=result) if parts[0] == 'eval' else result
+
+    async def _connection(self, reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter'):
+        import asyncio
+
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                method, path, version = lines[0].split(' ', 2)
+                headers = {name.strip().lower(): value.strip()
+                           for name, _, value in (line.partition(':') for line in lines[1:] if line)}
+                length = int(headers.get('content-length', 0))
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                if length > MAX_BODY:
+                    # the body is not read, so the connection cannot be reused
+                    status, value, keep_alive = 413, dict(error=f'request body over {MAX_BODY} bytes'), False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, value = await self._respond(method, path, body)
+                content = json.dumps(value, allow_nan=False).encode()
+                writer.write(f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                             f'Content-Type: application/json\r\nContent-Length: {len(content)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def serve(host: str = '127.0.0.1', port: int = 8001, window: float = 0.002, max_batch: int = 1024):
+    """run the api until interrupted"""
+    import asyncio
+
+    async def main():
+        server = await EvalServer(window, max_batch).start(host, port)
+        print(f'serving the evaluation api on http://{host}:{server.port}')
+        async with server.server:
+            await server.server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# benchmark client
+# ----------------------------------------------------------------------------------------------------------------------
+async def _client(host: str, port: int, requests: List[bytes], latencies: list):
+    import asyncio
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int(next(line.split(b':')[1] for line in head.split(b'\r\n')
+                              if line.lower().startswith(b'content-length')))
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def benchmark(host: str, port: int, concurrency: Sequence[int] = (1, 16, 64, 256), requests: int = 2000,
+                    model: str = 'mm_competitive', points: int = 100, seed: int = 0) -> List[dict]:
+    """
+    requests per second of /eval/<model> at several levels of concurrency
+
+    Parameters
+    ----------
+    host, port: str, int
+        address of a running api
+
+    concurrency: Sequence[int]
+        numbers of concurrent keep-alive connections to measure
+
+    requests: int
+        total number of requests per concurrency level
+
+    model: str
+        model to evaluate
+
+    points: int
+        length of x in every request
+
+    seed: int
+        seed for the random parameter values
+
+    Returns
+    -------
+    report: List[dict]
+        per level: concurrency, requests, seconds, requests_per_second, p50_ms, p99_ms and the mean batch size
+    """
+    import asyncio
+
+    rng = np.random.default_rng(seed)
+    model = get_model(model)
+    x = np.logspace(-1, 3, points).tolist()
+
+    def encode(params):
+        body = json.dumps(dict(x=x, params=params)).encode()
+        return (f'POST /eval/{model.name} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+
+    async def stats():
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b'GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+        return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+    report = []
+    for level in concurrency:
+        bodies = [encode({name: float(rng.uniform(1, 10)) for name in model.parameters}) for _ in range(requests)]
+        per_client = [bodies[i::level] for i in range(level)]
+        before, latencies = await stats(), []
+        start = time.perf_counter()
+        await asyncio.gather(*(_client(host, port, chunk, latencies) for chunk in per_client if chunk))
+        seconds = time.perf_counter() - start
+        after = await stats()
+        batches = after['batches'] - before['batches']
+        p50, p99 = 1000 * np.percentile(latencies, [50, 99])
+        report.append(dict(concurrency=level, requests=len(latencies), seconds=seconds,
+                           requests_per_second=len(latencies) / seconds, p50_ms=float(p50), p99_ms=float(p99),
+                           mean_batch=(after['requests'] - before['requests']) / batches if batches else 0.))
+    return report
+
+
+def format_benchmark(report: List[dict]) -> str:
+    """the result of :func:`benchmark` as a text table"""
+    lines = [f'{"clients":>8} {"requests":>9} {"req/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"mean batch":>11}']
+    for entry in report:
+        lines.append(f'{entry["concurrency"]:>8} {entry["requests"]:>9} {entry["requests_per_second"]:>9.0f} '
+                     f'{entry["p50_ms"]:>8.2f} {entry["p99_ms"]:>8.2f} {entry["mean_batch"]:>11.1f}')
+    return '\n'.join(lines)
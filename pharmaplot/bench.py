@@ -0,0 +1,265 @@
+"""
+benchmark suite: model kernel throughput, page build times and page sizes, saved as json and compared to a baseline
+
+three groups of measurements are taken:
+
+- kernels: every public model function of pharmaplot.mm and pharmaplot.receptors, at array sizes from 1e2 to 1e8
+  elements, in float32 and float64 (best time of several calls)
+- builds: the time to render each script of scripts/ headlessly, as in `python -m pharmaplot build --force`
+- pages: the size in bytes of every html page written by those builds
+
+results are saved as json together with metadata about the machine, python and library versions and the git commit.
+:func:`compare` flags every measurement that got worse than a baseline by more than a tolerance::
+
+    python -m pharmaplot bench -o baseline.json
+    ... change things ...
+    python -m pharmaplot bench -o current.json
+    python -m pharmaplot bench-compare baseline.json current.json
+"""
+import datetime
+import inspect
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from pharmaplot import mm, receptors
+
+FORMAT_VERSION = 1
+
+SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8)
+DTYPES = ('float32', 'float64')
+
+# parameter values for the functions without defaults; the values only need to keep the results finite
+PARAMS = dict(vmax=10., km=5., ki=5., conc_i=5., bmax=100., kd=5., hill_coef=1.5, nonspecific=0., total=100.,
+              pIC50=6., nH=1., top=100., bottom=0., hillslope=1., logec50=-6.)
+
+# independent variables that are log10 concentrations, and the range they are sampled from
+LOG_VARIABLES = ('log_inhibitor', 'log_cpnd')
+
+
+def kernel_functions() -> Dict[str, callable]:
+    """the public model functions of pharmaplot.mm and pharmaplot.receptors (not their jacobians), by name"""
+    functions = {}
+    for module in (mm, receptors):
+        for name, function in vars(module).items():
+            if (inspect.isfunction(function) and function.__module__ == module.__name__ and not name.startswith('_')
+                    and not name.endswith('_jacobian')):
+                functions[name] = function
+    return functions
+
+
+def machine() -> dict:
+    """metadata about the machine and the software versions the benchmarks ran with"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    from pharmaplot.build import ROOT_DIR
+
+    versions = {}
+    for package in ('numpy', 'bokeh', 'pandas'):
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return dict(platform=platform.platform(), machine=platform.machine(), processor=platform.processor(),
+                cpus=os.cpu_count(), python=platform.python_version(), versions=versions, commit=commit)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# measurements
+# ----------------------------------------------------------------------------------------------------------------------
+def _best_time(function, args, min_time: float, repeat: int) -> float:
+    """best time of one call, out of `repeat` rounds of as many calls as fit in min_time"""
+    start = time.perf_counter()
+    function(*args)
+    single = time.perf_counter() - start
+    number = max(1, int(min_time / max(single, 1e-9)))
+    best = single
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def bench_kernels(sizes: Sequence[int] = SIZES, dtypes: Sequence[str] = DTYPES, names: Sequence[str] = None,
+                  min_time: float = 0.05, repeat: int = 3) -> List[dict]:
+    """
+    time every model function at every array size and dtype
+
+    Returns
+    -------
+    results: List[dict]
+        one dict per measurement: name, dtype, size, seconds (best time of one call), elements_per_second and the
+        dtype of the result
+    """
+    functions = kernel_functions()
+    results = []
+    for name in names or sorted(functions):
+        function = functions[name]
+        variable, *parameters = inspect.signature(function).parameters
+        args = [PARAMS[parameter] for parameter in parameters]
+        for dtype in dtypes:
+            result_dtype = str(np.result_type(*np.atleast_1d(function(np.ones(2, dtype=dtype), *args))))
+            for size in sizes:
+                low, high = (-10., -3.) if variable in LOG_VARIABLES else (0.1, 100.)
+                x = np.linspace(low, high, num=int(size), dtype=dtype)
+                seconds = _best_time(function, [x, *args], min_time, repeat)
+                del x
+                results.append(dict(name=name, dtype=dtype, size=int(size), seconds=seconds,
+                                    elements_per_second=size / seconds, result_dtype=result_dtype))
+    return results
+
+
+def bench_builds(scripts: Sequence[str] = None) -> tuple:
+    """
+    build every page from scratch into a temporary directory
+
+    Returns
+    -------
+    builds, pages: tuple
+        builds = one dict per script with its build time in seconds (or its error); pages = one dict per html page
+        (and the shared BokehJS bundle) with its size in bytes
+    """
+    from pharmaplot.build import build
+
+    builds, pages = [], []
+    with tempfile.TemporaryDirectory() as output_dir:
+        # one worker, so that the scripts do not compete for the cpu
+        for entry in build(scripts, output_dir=output_dir, workers=1, force=True):
+            if entry['status'] == 'shared':
+                pages.append(dict(page=entry['script'], bytes=entry['size']))
+                continue
+            builds.append(dict(script=entry['script'], seconds=entry['seconds'], error=entry.get('error')))
+            pages.extend(dict(page=output, bytes=os.path.getsize(os.path.join(output_dir, output)))
+                         for output in entry['outputs'])
+    return builds, pages
+
+
+def run(output: str = None, sizes: Sequence[int] = SIZES, dtypes: Sequence[str] = DTYPES, kernels: bool = True,
+        builds: bool = True, scripts: Sequence[str] = None, min_time: float = 0.05, repeat: int = 3) -> dict:
+    """
+    run the benchmark suite
+
+    Parameters
+    ----------
+    output: str
+        json file the results are written to
+
+    sizes, dtypes:
+        array sizes and dtypes of the kernel benchmarks
+
+    kernels, builds: bool
+        which groups to run; the page sizes come with the builds
+
+    scripts: Sequence[str]
+        scripts to build; defaults to every scripts/*.py
+
+    min_time, repeat:
+        every kernel timing is the best of `repeat` rounds of at least min_time seconds
+
+    Returns
+    -------
+    results: dict
+        format version, creation time, machine metadata and the kernels, builds and pages measurements
+    """
+    results = dict(version=FORMAT_VERSION, created=datetime.datetime.now().isoformat(timespec='seconds'),
+                   machine=machine(), kernels=[], builds=[], pages=[])
+    if kernels:
+        results['kernels'] = bench_kernels(sizes, dtypes, min_time=min_time, repeat=repeat)
+    if builds:
+        results['builds'], results['pages'] = bench_builds(scripts)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# reporting
+# ----------------------------------------------------------------------------------------------------------------------
+def metrics(results: dict) -> Dict[str, tuple]:
+    """the measurements of a results dict as {key: (value, unit)}; lower is better for every one of them"""
+    values = {}
+    for entry in results['kernels']:
+        values[f'kernel {entry["name"]} {entry["dtype"]} n={entry["size"]:.0e}'] = (entry['seconds'], 's')
+    for entry in results['builds']:
+        if entry.get('error') is None:
+            values[f'build {entry["script"]}'] = (entry['seconds'], 's')
+    for entry in results['pages']:
+        values[f'page {entry["page"]}'] = (entry['bytes'], 'bytes')
+    return values
+
+
+def compare(baseline: dict, current: dict, time_tolerance: float = 0.2, size_tolerance: float = 0.01) -> List[dict]:
+    """
+    compare two result sets
+
+    Parameters
+    ----------
+    baseline, current: dict
+        results of :func:`run` (or loaded from their json files)
+
+    time_tolerance, size_tolerance: float
+        relative increase of a time or a size above which it counts as a regression
+
+    Returns
+    -------
+    rows: List[dict]
+        one row per measurement present in both: key, unit, baseline, current, change (relative) and regression
+    """
+    before, after = metrics(baseline), metrics(current)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        (old, unit), (new, _) = before[key], after[key]
+        change = new / old - 1 if old else 0.
+        tolerance = time_tolerance if unit == 's' else size_tolerance
+        rows.append(dict(key=key, unit=unit, baseline=old, current=new, change=change, regression=change > tolerance))
+    return rows
+
+
+def _value(value: float, unit: str) -> str:
+    return f'{value * 1e3:.4g} ms' if unit == 's' else f'{value:,} B'
+
+
+def format_results(results: dict) -> str:
+    """the kernel, build and page measurements as a text table"""
+    lines = [f'{results["machine"]["processor"] or results["machine"]["machine"]}, {results["machine"]["cpus"]} cpus, '
+             f'python {results["machine"]["python"]}, numpy {results["machine"]["versions"]["numpy"]}']
+    for entry in results['kernels']:
+        lines.append(f'{entry["name"]:<34} {entry["dtype"]:<8} n={entry["size"]:<10.0e} '
+                     f'{entry["seconds"] * 1e3:10.4g} ms {entry["elements_per_second"] / 1e6:10.1f} M/s')
+    for entry in results['builds']:
+        lines.append(f'build {entry["script"]:<32} ' + (entry['error'] or f'{entry["seconds"]:.2f} s'))
+    for entry in results['pages']:
+        lines.append(f'page  {entry["page"]:<32} {entry["bytes"]:,} bytes')
+    return '\n'.join(lines)
+
+
+def format_comparison(rows: List[dict], baseline: dict = None, current: dict = None) -> str:
+    """regressions and improvements of :func:`compare`, and a warning when the machines differ"""
+    lines = []
+    if baseline and current and baseline['machine'] != current['machine']:
+        differ = sorted(key for key in baseline['machine'].keys() | current['machine'].keys()
+                        if baseline['machine'].get(key) != current['machine'].get(key) and key != 'commit')
+        if differ:
+            lines.append(f'warning: the results are from different machines or versions ({", ".join(differ)})')
+    for row in rows:
+        if row['regression'] or row['change'] < -0.2:
+            flag = 'REGRESSION' if row['regression'] else 'improved'
+            lines.append(f'{flag:>10} {row["key"]:<56} {_value(row["baseline"], row["unit"]):>12} -> '
+                         f'{_value(row["current"], row["unit"]):>12} ({row["change"]:+.0%})')
+    regressions = sum(row['regression'] for row in rows)
+    lines.append(f'{len(rows)} measurements compared, {regressions} regression{"s" * (regressions != 1)}')
+    return '\n'.join(lines)
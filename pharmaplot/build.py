@@ -0,0 +1,245 @@
+"""
+headless, incremental rendering of the interactive pages in scripts/
+
+every script is run in a worker process with bokeh's show() replaced by save(), writing its page to
+config.html_output_dir instead of opening a browser. a manifest in the output directory records a hash of each
+page's inputs (the script source, the source of every pharmaplot module it imports, the config values and the bokeh
+version); pages whose hash is unchanged and whose outputs still exist are skipped
+
+with config.shared_resources set, the pages of the site then share one local, content-hashed BokehJS bundle (see
+pharmaplot.resources) instead of each loading the runtime from the CDN
+"""
+import ast
+import hashlib
+import json
+import os
+import runpy
+import time
+from typing import Dict, List, Sequence
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(PACKAGE_DIR)
+SCRIPTS_DIR = os.path.join(ROOT_DIR, 'scripts')
+MANIFEST = '.build-manifest.json'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# input hashing
+# ----------------------------------------------------------------------------------------------------------------------
+def _imported_modules(path: str) -> set:
+    """pharmaplot modules imported by a python file"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.add(node.module)
+            # `from pharmaplot import mm` imports the submodule pharmaplot.mm
+            modules.update(f'{node.module}.{alias.name}' for alias in node.names)
+    return {module for module in modules if module.split('.')[0] == 'pharmaplot'}
+
+
+def _module_path(module: str):
+    parts = module.split('.')[1:]
+    for path in (os.path.join(PACKAGE_DIR, *parts) + '.py', os.path.join(PACKAGE_DIR, *parts, '__init__.py')):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def dependencies(script: str) -> List[str]:
+    """source files of the pharmaplot modules a script imports, directly or through other pharmaplot modules"""
+    seen, pending = set(), [script]
+    while pending:
+        for module in _imported_modules(pending.pop()):
+            path = _module_path(module)
+            if path and path not in seen:
+                seen.add(path)
+                pending.append(path)
+    return sorted(seen)
+
+
+def _config_values() -> Dict[str, str]:
+    from pharmaplot import config
+    return {name: repr(value) for name, value in sorted(vars(config).items())
+            if not name.startswith('_') and name != 'html_output_dir' and not callable(value)}
+
+
+def input_hash(script: str) -> str:
+    """sha256 over everything that determines the page(s) a script renders"""
+    import bokeh
+
+    digest = hashlib.sha256()
+    for path in [script] + dependencies(script):
+        with open(path, 'rb') as f:
+            digest.update(os.path.relpath(path, ROOT_DIR).encode() + b'\0' + f.read() + b'\0')
+    digest.update(json.dumps(_config_values(), sort_keys=True).encode())
+    digest.update(f'bokeh {bokeh.__version__}'.encode())
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# rendering
+# ----------------------------------------------------------------------------------------------------------------------
+def render(script: str, output_dir: str) -> List[str]:
+    """
+    run one script headlessly, saving its page(s) into output_dir
+
+    show() calls made before the script has called output_file() are previews and are ignored
+
+    Returns
+    -------
+    outputs: List[str]
+        paths of the html files written
+    """
+    import bokeh.io
+    import bokeh.plotting
+    from bokeh.io.state import curstate
+
+    from pharmaplot import config
+
+    outputs = []
+
+    def save(obj, *args, **kwargs):
+        if curstate().file:
+            outputs.append(bokeh.io.save(obj))
+
+    config.html_output_dir = os.path.join(output_dir, '')
+    bokeh.io.reset_output()
+    saved_show = bokeh.plotting.show, bokeh.io.show
+    bokeh.plotting.show = bokeh.io.show = save
+    cwd = os.getcwd()
+    try:
+        # scripts are written to be run from inside the scripts directory
+        os.chdir(os.path.dirname(script))
+        runpy.run_path(script, run_name='__main__')
+    finally:
+        os.chdir(cwd)
+        bokeh.plotting.show, bokeh.io.show = saved_show
+    return [os.path.abspath(os.path.join(os.path.dirname(script), path)) for path in outputs]
+
+
+def _import_bokeh():
+    """worker initializer, so that the time of the first page a worker renders does not include importing bokeh"""
+    import bokeh.plotting  # noqa: F401
+
+
+def _render_timed(script: str, output_dir: str):
+    """render a script and compact the data arrays of its pages when config.optimize_payloads is set"""
+    from pharmaplot import config
+
+    start = time.perf_counter()
+    outputs = render(script, output_dir)
+    sizes = []
+    if config.optimize_payloads:
+        from pharmaplot.payload import optimize_file
+        for output in outputs:
+            report = optimize_file(output, encoding=config.payload_encoding)
+            sizes.append((report['before'], report['after']))
+    return outputs, sizes, time.perf_counter() - start
+
+
+def _load_manifest(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build(scripts: Sequence[str] = None, output_dir: str = None, workers: int = None, force: bool = False) -> list:
+    """
+    render every page whose inputs changed since the last build
+
+    Parameters
+    ----------
+    scripts: Sequence[str]
+        scripts to build; defaults to every scripts/*.py
+
+    output_dir: str
+        where the pages go; defaults to config.html_output_dir, resolved relative to the scripts directory as when the
+        scripts are run by hand
+
+    workers: int
+        number of worker processes; defaults to the number of cpus
+
+    force: bool
+        rebuild every page even if its inputs are unchanged
+
+    Returns
+    -------
+    report: list
+        one dict per script with its name, status ('built', 'cached' or 'failed'), outputs and seconds, and for
+        built pages the size in bytes before and after config.optimize_payloads. with config.shared_resources a last
+        entry with status 'shared' names the BokehJS bundle, its size and the number of pages using it
+    """
+    from pharmaplot import config
+
+    if scripts is None:
+        scripts = sorted(os.path.join(SCRIPTS_DIR, name) for name in os.listdir(SCRIPTS_DIR) if name.endswith('.py'))
+    scripts = [os.path.abspath(script) for script in scripts]
+    output_dir = os.path.abspath(os.path.join(SCRIPTS_DIR, output_dir or config.html_output_dir))
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = _load_manifest(output_dir)
+    hashes = {script: input_hash(script) for script in scripts}
+    report, stale = [], []
+    for script in scripts:
+        name = os.path.basename(script)
+        entry = manifest.get(name, {})
+        up_to_date = entry.get('hash') == hashes[script] and entry.get('outputs') and all(
+            os.path.exists(os.path.join(output_dir, output)) for output in entry['outputs'])
+        if up_to_date and not force:
+            report.append(dict(script=name, status='cached', outputs=entry['outputs'], seconds=0.))
+        else:
+            stale.append(script)
+
+    if stale:
+        from concurrent.futures import ProcessPoolExecutor
+        workers = min(workers or os.cpu_count() or 1, len(stale))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_import_bokeh) as pool:
+            futures = {script: pool.submit(_render_timed, script, output_dir) for script in stale}
+            for script, future in futures.items():
+                name = os.path.basename(script)
+                try:
+                    outputs, sizes, seconds = future.result()
+                except Exception as error:  # a broken script must not stop the rest of the site from building
+                    report.append(dict(script=name, status='failed', outputs=[], seconds=0., error=repr(error)))
+                    manifest.pop(name, None)
+                    continue
+                outputs = [os.path.relpath(output, output_dir) for output in outputs]
+                manifest[name] = dict(hash=hashes[script], outputs=outputs)
+                report.append(dict(script=name, status='built', outputs=outputs, seconds=seconds, bytes=sizes))
+
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    report.sort(key=lambda entry: entry['script'])
+
+    if config.shared_resources:
+        # relink every page of the site, not only the ones built now, so they all agree on one bundle
+        from pharmaplot.resources import link_site
+        start = time.perf_counter()
+        pages = sorted({os.path.join(output_dir, output) for entry in manifest.values() for output in entry['outputs']})
+        shared = link_site(output_dir, [page for page in pages if os.path.exists(page)])
+        if shared['bundle']:
+            report.append(dict(script='(BokehJS)', status='shared', outputs=[shared['bundle']],
+                               seconds=time.perf_counter() - start, pages=shared['pages'], size=shared['bytes']))
+    return report
+
+
+def format_report(report: list) -> str:
+    """the result of :func:`build` as a text table"""
+    lines = []
+    for entry in report:
+        detail = entry.get('error') or ', '.join(entry['outputs'])
+        if entry['status'] == 'shared':
+            detail += f' ({entry["size"]:,} bytes, used by {entry["pages"]} pages)'
+        if entry.get('bytes'):
+            detail += ''.join(f' ({before:,} -> {after:,} bytes)' for before, after in entry['bytes'])
+        lines.append(f'{entry["status"]:>7} {entry["seconds"]:6.2f}s  {entry["script"]:<32} {detail}')
+    built, cached, failed = (sum(entry['status'] == status for entry in report) for status in ('built', 'cached', 'failed'))
+    lines.append(f'{built} built, {cached} cached, {failed} failed')
+    return '\n'.join(lines)
+
@@ -0,0 +1,202 @@
+"""
+javascript code for bokeh CustomJS callbacks, generated from the model registry
+
+the scripts used to carry hand-typed copies of every equation in their callbacks; these helpers emit the registry's
+javascript kernels instead, so the interactive plots always compute exactly what pharmaplot.mm and
+pharmaplot.receptors compute
+
+slider drags fire a change event for every intermediate value, often several per animation frame. the generated
+callbacks therefore coalesce their updates: a change schedules one recomputation for the next frame, which reads the
+slider values current at that point and emits every data source once
+"""
+import hashlib
+import json
+from typing import Dict, Sequence, Tuple, Union
+
+from pharmaplot.models import get_model
+
+# a source is given by the name of its CustomJS argument, optionally with the x and y column names
+Source = Union[str, Tuple[str, str, str]]
+
+
+def _columns(source: Source) -> Tuple[str, str, str]:
+    if isinstance(source, str):
+        return source, 'x', 'y'
+    return source
+
+
+def js_kernels(*models) -> str:
+    """javascript function definitions for the given registered models (names or functions)"""
+    seen, kernels = set(), []
+    for model in models:
+        model = get_model(model)
+        if model.name not in seen:
+            seen.add(model.name)
+            kernels.append(model.js())
+    return '\n\n'.join(kernels)
+
+
+def coalesced(code: str, state: str) -> str:
+    """
+    wrap the body of a CustomJS callback so that it runs at most once per animation frame
+
+    Parameters
+    ----------
+    code: str
+        javascript body of the callback
+    state: str
+        name of a CustomJS argument (e.g. a data source) on which the pending frame is recorded
+
+    Returns
+    -------
+    code: str
+        javascript for CustomJS(code=...); where requestAnimationFrame is not available (e.g. outside a browser) the
+        body runs immediately
+    """
+    flag = f'__pharmaplot_frame_{hashlib.sha1(code.encode()).hexdigest()[:8]}'
+    body = '\n'.join(f'    {line}' if line else '' for line in code.splitlines())
+    return '\n'.join(['// updates coalesced to one per animation frame by pharmaplot.callbacks',
+                      'const update = () => {',
+                      body,
+                      '};',
+                      "if (typeof requestAnimationFrame === 'undefined') {",
+                      '    update();',
+                      f'}} else if (!{state}.{flag}) {{',
+                      f'    {state}.{flag} = true;',
+                      f'    requestAnimationFrame(() => {{ {state}.{flag} = false; update(); }});',
+                      '}'])
+
+
+def connect(callback, *widgets, throttled: bool = False):
+    """
+    run a callback when any of the widgets changes value
+
+    Parameters
+    ----------
+    callback: bokeh.models.CustomJS
+        the callback
+
+    widgets: bokeh.models.Widget
+        sliders, selects, ...
+
+    throttled: bool
+        update sliders only when they are released (their value_throttled property) rather than on every step of a
+        drag; for models too expensive to follow the drag smoothly
+    """
+    for widget in widgets:
+        throttle = throttled and 'value_throttled' in widget.properties()
+        widget.js_on_change('value_throttled' if throttle else 'value', callback)
+
+
+def callback_code(updates: Sequence[Tuple[Union[str, Dict[str, str]], Sequence[Source]]],
+                  params: Dict[str, str],
+                  select: str = None,
+                  extra: str = None,
+                  coalesce: bool = True) -> str:
+    """
+    body of a CustomJS callback that recomputes data sources with registered models
+
+    Parameters
+    ----------
+    updates: Sequence[Tuple[Union[str, Dict[str, str]], Sequence[Source]]]
+        (model, sources) pairs; model is a registered model name, or a dict mapping each option of a Select widget
+        to a model name; sources are CustomJS argument names, or (name, x column, y column) tuples
+
+    params: Dict[str, str]
+        model parameter name -> javascript expression giving its value, e.g. {'km': 'km.value'}
+
+    select: str
+        javascript expression for the selected option (e.g. 'inhibType.value') when dict models are used
+
+    extra: str
+        additional javascript (e.g. for derived columns) run after the model kernels, before the sources are emitted
+
+    coalesce: bool
+        recompute at most once per animation frame, see :func:`coalesced`
+
+    Returns
+    -------
+    code: str
+        javascript code for CustomJS(code=...)
+
+    Examples
+    --------
+    >>> code = callback_code([('michaelis_menten', ['LineSource', 'PointSource'])],
+    ...                      params=dict(vmax='vmax.value', km='km.value'))
+    """
+    models = []
+    for model, _ in updates:
+        models.extend(model.values() if isinstance(model, dict) else [model])
+
+    lines = ['// model kernels generated by pharmaplot.models',
+             js_kernels(*models),
+             '',
+             'const model_params = {' + ', '.join(f'{name}: {value}' for name, value in params.items()) + '};']
+
+    emitted = []
+    for n, (model, sources) in enumerate(updates):
+        if isinstance(model, dict):
+            if select is None:
+                raise ValueError('select must be given when a model is chosen from a dict')
+            options = ', '.join(f'"{option}": {get_model(name).name}' for option, name in model.items())
+            kernel = f'kernel{n}'
+            lines.append(f'const {kernel} = {{{options}}}[{select}];')
+        else:
+            kernel = get_model(model).name
+
+        for source in sources:
+            name, x, y = _columns(source)
+            lines.append(f'{kernel}({name}.data.{x}, {name}.data.{y}, model_params);')
+            if name not in emitted:
+                emitted.append(name)
+
+    if extra:
+        lines.append(extra)
+
+    lines.append('')
+    lines.extend(f'{name}.change.emit();' for name in emitted)
+    code = '\n'.join(lines)
+    return coalesced(code, emitted[0]) if coalesce and emitted else code
+
+
+def server_callback_code(model: str, grids: Dict[str, tuple], params: Dict[str, str], url: str = '') -> str:
+    """
+    body of a CustomJS callback that has the curves evaluated by a pharmaplot plot server (see pharmaplot.server)
+
+    Parameters
+    ----------
+    model: str
+        registered model name
+
+    grids: Dict[str, tuple]
+        CustomJS argument name of each source -> its x grid as (scale, start, end, num); the server returns the
+        source's 'y' column
+
+    params: Dict[str, str]
+        model parameter name -> javascript expression giving its value
+
+    url: str
+        address of the server; empty for the server the page was loaded from
+
+    Returns
+    -------
+    code: str
+        javascript for CustomJS(code=...); responses to requests superseded by a newer one are dropped
+    """
+    state = next(iter(grids))
+    request = dict(model=get_model(model).name, grids={name: list(grid) for name, grid in grids.items()})
+    lines = ['// curves evaluated by the pharmaplot plot server',
+             f'const request = {json.dumps(request)};',
+             'request.params = {' + ', '.join(f'{name}: {value}' for name, value in params.items()) + '};',
+             'const sources = {' + ', '.join(grids) + '};',
+             f'const sequence = {state}.__pharmaplot_sequence = ({state}.__pharmaplot_sequence || 0) + 1;',
+             f"fetch({json.dumps(url + '/curve')}, {{method: 'POST', body: JSON.stringify(request)}})",
+             '    .then((response) => response.json())',
+             '    .then((result) => {',
+             f'        if (sequence !== {state}.__pharmaplot_sequence) return;',
+             '        for (const [name, y] of Object.entries(result.y)) {',
+             '            sources[name].data.y = y.map((value) => value === null ? NaN : value);  // json has no nan',
+             '            sources[name].change.emit();',
+             '        }',
+             '    });']
+    return coalesced('\n'.join(lines), state)
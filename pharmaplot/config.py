@@ -1,3 +1,19 @@
 # paths and variables to be used across the project
 
 html_output_dir = '../html-outputs/'
+
+# slider-state lookup tables (see pharmaplot.lookup)
+use_lookup_tables = False
+lookup_payload_budget = 1_000_000  # bytes of (base64 encoded) table data per page
+lookup_max_error = 0.005  # maximum error relative to the range of the curves
+
+# compact data arrays of the pages written by `python -m pharmaplot build` (see pharmaplot.payload)
+optimize_payloads = True
+payload_encoding = 'float32'  # 'float64', 'float32' or 'uint16'
+
+# pages written by `python -m pharmaplot build` load BokehJS from one local, content-hashed bundle instead of the CDN
+# (see pharmaplot.resources)
+shared_resources = True
+
+# parsed plate-reader exports (see pharmaplot.ingest); None puts a .pharmaplot-cache directory next to each export
+ingest_cache_dir = None
@@ -0,0 +1,455 @@
+"""
+batched nonlinear least-squares fitting of the model functions
+
+many independent datasets (e.g. every compound on a screening plate) are stacked into one (N, M) array and fitted
+together with a vectorized Levenberg-Marquardt: every iteration updates all N parameter sets at once, so fitting
+thousands of curves costs a fixed number of array operations instead of N separate curve_fit calls
+"""
+import warnings
+from typing import Callable, Dict, NamedTuple, Sequence, Union
+
+import numpy as np
+
+from pharmaplot import mm, receptors
+from pharmaplot.models import Model, get_model
+
+# largest condition number of the (scaled) normal matrix for which standard errors are reported
+MAX_CONDITION = 1e10
+
+
+class FitResult(NamedTuple):
+    """
+    results of :func:`fit_batch`; every array has one row per dataset
+
+    Attributes
+    ----------
+    names: tuple
+        names of the fitted parameters, in column order
+
+    params: np.ndarray
+        best-fit parameters, shape (N, P)
+
+    stderr: np.ndarray
+        asymptotic standard errors of the parameters, shape (N, P); nan where they cannot be estimated
+
+    converged: np.ndarray
+        boolean convergence flag for each dataset, shape (N,)
+
+    iterations: np.ndarray
+        iterations used by each dataset, shape (N,)
+
+    sse: np.ndarray
+        weighted sum of squared residuals at the solution, shape (N,)
+    """
+    names: tuple
+    params: np.ndarray
+    stderr: np.ndarray
+    converged: np.ndarray
+    iterations: np.ndarray
+    sse: np.ndarray
+
+    def as_dict(self) -> Dict[str, np.ndarray]:
+        """parameter name -> best-fit values"""
+        return {name: self.params[:, i] for i, name in enumerate(self.names)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# initial guesses
+# ----------------------------------------------------------------------------------------------------------------------
+def _half_max_x(x: np.ndarray, y: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """x value of the point closest to half way between lo and hi, for every row"""
+    distance = np.abs(y - ((lo + hi) / 2)[:, np.newaxis])
+    distance[~np.isfinite(distance)] = np.inf
+    return np.take_along_axis(x, np.argmin(distance, axis=1)[:, np.newaxis], axis=1)[:, 0]
+
+
+def _nan_extremes(y):
+    """row-wise nanmax and nanmin; nan (without a warning) for rows with no observation at all"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmax(y, axis=1), np.nanmin(y, axis=1)
+
+
+def _guess_saturation(x, y):
+    top, _ = _nan_extremes(y)
+    return dict(scale=top, k=_half_max_x(x, y, np.zeros_like(top), top))
+
+
+def _guess_logistic(x, y):
+    top, bottom = _nan_extremes(y)
+    return dict(top=top, bottom=bottom, mid=_half_max_x(x, y, bottom, top))
+
+
+def initial_guess(model: Union[str, Callable, Model], x: np.ndarray, y: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    rough data-driven starting values for the parameters of a model, one per dataset
+
+    saturation models (michaelis-menten and specific binding) are seeded from whichever of the half-maximum heuristic
+    and the closed-form linearizations (:func:`lineweaver_burk_estimate`, :func:`eadie_hofstee_estimate`,
+    :func:`scatchard_estimate`) fits each dataset best
+
+    Parameters
+    ----------
+    model: Union[str, Callable, Model]
+        registered model
+
+    x, y: np.ndarray
+        data, shape (N, M)
+
+    Returns
+    -------
+    guess: Dict[str, np.ndarray]
+        parameter name -> array of shape (N,); parameters without a data-driven guess get their default value (or 1)
+    """
+    model = get_model(model)
+    n = y.shape[0]
+    guess = {name: np.full(n, float(model.defaults.get(name, 1.))) for name in model.parameters}
+
+    if model.name in ('michaelis_menten', 'mm_competitive', 'mm_noncompetitive', 'mm_uncompetitive'):
+        saturation = _guess_saturation(x, y)
+        seed = _best_seed(mm.michaelis_menten, x, y, [dict(vmax=saturation['scale'], km=saturation['k']),
+                                                      lineweaver_burk_estimate(x, y),
+                                                      eadie_hofstee_estimate(x, y)])
+        guess.update(seed)
+    elif model.name in ('specific_binding', 'specific_binding_hill'):
+        saturation = _guess_saturation(x, y)
+        seed = _best_seed(receptors.specific_binding, x, y, [dict(bmax=saturation['scale'], kd=saturation['k']),
+                                                             scatchard_estimate(x, y)])
+        guess.update(seed)
+    elif model.name == 'four_parameter_logistic_equation':
+        logistic = _guess_logistic(x, y)
+        guess.update(top=logistic['top'], bottom=logistic['bottom'], logec50=logistic['mid'])
+    elif model.name == 'competitive_binding':
+        logistic = _guess_logistic(x, y)
+        guess.update(total=logistic['top'], nonspecific=logistic['bottom'], pIC50=-logistic['mid'])
+    return guess
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# linearization seeds
+#
+# the plotting transforms double as closed-form estimators: each is a straight line whose slope and intercept give
+# the parameters, so a weighted least-squares line through every dataset of a batch is a handful of sums
+# ----------------------------------------------------------------------------------------------------------------------
+def _weighted_line(u: np.ndarray, t: np.ndarray, w: np.ndarray):
+    """slope and intercept of the weighted least-squares line t = slope * u + intercept for every row"""
+    valid = (w > 0) & np.isfinite(u) & np.isfinite(t)
+    w = np.where(valid, w, 0.)
+    u, t = np.where(valid, u, 0.), np.where(valid, t, 0.)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = w.sum(axis=1)
+        u_mean = (w * u).sum(axis=1) / total
+        t_mean = (w * t).sum(axis=1) / total
+        du = u - u_mean[:, np.newaxis]
+        slope = (w * du * (t - t_mean[:, np.newaxis])).sum(axis=1) / (w * du ** 2).sum(axis=1)
+    return slope, t_mean - slope * u_mean
+
+
+def _positive(*values: np.ndarray):
+    """values, with nan wherever any of them is not a finite positive number"""
+    ok = np.logical_and.reduce([np.isfinite(v) & (v > 0) for v in values])
+    return [np.where(ok, v, np.nan) for v in values]
+
+
+def _data_weights(x: np.ndarray, y: np.ndarray, weights: np.ndarray = None) -> np.ndarray:
+    w = np.broadcast_to(1. if weights is None else np.asarray(weights, dtype=float), y.shape)
+    return np.where(np.isfinite(x) & np.isfinite(y) & (x > 0) & (y > 0), w, 0.)
+
+
+def lineweaver_burk_estimate(substrate: np.ndarray, v: np.ndarray, weights: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    vmax and km of every dataset from a weighted straight line through its Lineweaver-Burk plot
+
+    1/v = (km / vmax) / [S] + 1 / vmax (see :func:`pharmaplot.mm.lineweaver_burk`). the regression is weighted by
+    v ** 4, which undoes the distortion of constant errors in v by the reciprocal transform
+
+    Parameters
+    ----------
+    substrate: np.ndarray
+        substrate concentrations, shape (M,) or (N, M)
+
+    v: np.ndarray
+        initial velocities, shape (N, M); nan or non-positive points are ignored
+
+    weights: np.ndarray
+        optional weights of the points on the original scale, broadcastable to (N, M)
+
+    Returns
+    -------
+    estimate: Dict[str, np.ndarray]
+        'vmax' and 'km', arrays of shape (N,); nan where the line gives no positive estimate
+    """
+    v = np.atleast_2d(np.asarray(v, dtype=float))
+    substrate = np.broadcast_to(np.asarray(substrate, dtype=float), v.shape)
+    w = _data_weights(substrate, v, weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept = _weighted_line(1 / substrate, 1 / v, w * np.where(w > 0, v, 0.) ** 4)
+        vmax = 1 / intercept
+    vmax, km = _positive(vmax, slope * vmax)
+    return dict(vmax=vmax, km=km)
+
+
+def eadie_hofstee_estimate(substrate: np.ndarray, v: np.ndarray, weights: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    vmax and km of every dataset from a weighted straight line through its Eadie-Hofstee plot, v = vmax - km v/[S]
+
+    arguments and return value as for :func:`lineweaver_burk_estimate`
+    """
+    v = np.atleast_2d(np.asarray(v, dtype=float))
+    substrate = np.broadcast_to(np.asarray(substrate, dtype=float), v.shape)
+    w = _data_weights(substrate, v, weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept = _weighted_line(v / substrate, v, w)
+    vmax, km = _positive(intercept, -slope)
+    return dict(vmax=vmax, km=km)
+
+
+def scatchard_estimate(l: np.ndarray, b: np.ndarray, weights: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    bmax and kd of every dataset from a weighted straight line through its Scatchard plot
+
+    B/F = bmax / kd - B / kd (see :func:`pharmaplot.receptors.scatchard`); the regression is weighted by F ** 2,
+    which undoes the distortion of constant errors in B by the division
+
+    Parameters
+    ----------
+    l: np.ndarray
+        free ligand concentrations, shape (M,) or (N, M)
+
+    b: np.ndarray
+        specific binding, shape (N, M); nan or non-positive points are ignored
+
+    weights: np.ndarray
+        optional weights of the points on the original scale, broadcastable to (N, M)
+
+    Returns
+    -------
+    estimate: Dict[str, np.ndarray]
+        'bmax' and 'kd', arrays of shape (N,); nan where the line gives no positive estimate
+    """
+    b = np.atleast_2d(np.asarray(b, dtype=float))
+    l = np.broadcast_to(np.asarray(l, dtype=float), b.shape)
+    w = _data_weights(l, b, weights)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept = _weighted_line(b, b / l, w * np.where(w > 0, l, 0.) ** 2)
+        kd = -1 / slope
+    kd, bmax = _positive(kd, intercept * kd)
+    return dict(bmax=bmax, kd=kd)
+
+
+def _best_seed(function: Callable, x: np.ndarray, y: np.ndarray, candidates: Sequence[dict]) -> Dict[str, np.ndarray]:
+    """for every dataset, the candidate parameter set with the smallest sum of squares under `function`"""
+    sse = []
+    for candidate in candidates:
+        with np.errstate(all='ignore'):
+            residual = y - function(x, **{name: value[:, np.newaxis] for name, value in candidate.items()})
+        total = np.nansum(residual ** 2, axis=1)
+        sse.append(np.where(np.isfinite(total) & np.isfinite(list(candidate.values())).all(axis=0), total, np.inf))
+    best = np.argmin(sse, axis=0)
+    return {name: np.choose(best, [candidate[name] for candidate in candidates]) for name in candidates[0]}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# batched levenberg-marquardt
+# ----------------------------------------------------------------------------------------------------------------------
+def _evaluate(model: Model, x: np.ndarray, names: Sequence[str], params: np.ndarray, fixed: dict) -> np.ndarray:
+    """model values for every dataset; params has shape (N, P) and x shape (N, M)"""
+    kwargs = {name: params[:, i:i + 1] for i, name in enumerate(names)}
+    kwargs.update(fixed)
+    with np.errstate(all='ignore'):
+        return model.function(x, **kwargs)
+
+
+def _sum_of_squares(model: Model, x: np.ndarray, y: np.ndarray, w: np.ndarray, names: Sequence[str],
+                    params: np.ndarray, fixed: dict) -> np.ndarray:
+    """weighted sum of squared residuals of every dataset; inf where the model is not finite"""
+    residual = y - _evaluate(model, x, names, params, fixed)
+    sse = np.sum(np.where(w > 0, w * residual ** 2, 0.), axis=1)
+    return np.where(np.isfinite(sse), sse, np.inf)
+
+
+def _jacobian(model: Model, x: np.ndarray, names: Sequence[str], params: np.ndarray, fixed: dict):
+    """
+    jacobian of the model with respect to the fitted parameters; analytic when the model has one registered,
+    forward differences otherwise
+
+    Returns
+    -------
+    jac, f0: tuple
+        jac = jacobian, shape (N, M, P); f0 = model values, shape (N, M)
+    """
+    if model.jacobian is not None:
+        kwargs = {name: params[:, i:i + 1] for i, name in enumerate(names)}
+        kwargs.update(fixed)
+        with np.errstate(all='ignore'):
+            f0, partials = model.jacobian(x, **kwargs)
+        return partials[..., [model.parameters.index(name) for name in names]], f0
+
+    f0 = _evaluate(model, x, names, params, fixed)
+    jac = np.empty(f0.shape + (len(names),))
+    for i in range(len(names)):
+        step = np.sqrt(np.finfo(float).eps) * np.maximum(np.abs(params[:, i]), 1.)
+        shifted = params.copy()
+        shifted[:, i] += step
+        jac[..., i] = (_evaluate(model, x, names, shifted, fixed) - f0) / step[:, np.newaxis]
+    return jac, f0
+
+
+def fit_batch(model: Union[str, Callable, Model],
+              x: np.ndarray,
+              y: np.ndarray,
+              p0: Dict[str, Union[float, np.ndarray]] = None,
+              fixed: Dict[str, Union[float, np.ndarray]] = None,
+              weights: np.ndarray = None,
+              max_iter: int = 50,
+              tol: float = 1e-8) -> FitResult:
+    """
+    fit one model to N independent datasets at once with a vectorized Levenberg-Marquardt
+
+    Parameters
+    ----------
+    model: Union[str, Callable, Model]
+        registered model, e.g. 'four_parameter_logistic_equation' or mm.michaelis_menten
+
+    x: np.ndarray
+        independent variable, shape (M,) when shared by all datasets or (N, M)
+
+    y: np.ndarray
+        observations, shape (N, M); nan marks missing points
+
+    p0: Dict[str, Union[float, np.ndarray]]
+        starting values (scalar or one per dataset) for any of the fitted parameters; the rest are guessed from the
+        data with :func:`initial_guess`
+
+    fixed: Dict[str, Union[float, np.ndarray]]
+        parameters held constant during the fit (scalar or one per dataset), e.g. dict(conc_i=0) or dict(bottom=0)
+
+    weights: np.ndarray
+        optional weights for the squared residuals, broadcastable to (N, M)
+
+    max_iter: int
+        fixed upper bound on the number of iterations
+
+    tol: float
+        relative change in the sum of squares (and parameters) below which a dataset counts as converged
+
+    Returns
+    -------
+    result: FitResult
+        best-fit parameters, standard errors, convergence flags, iteration counts and sums of squares, as arrays
+    """
+    model = get_model(model)
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    n, m = y.shape
+    x = np.broadcast_to(np.asarray(x, dtype=float), (n, m))
+
+    fixed = {name: np.broadcast_to(np.asarray(value, dtype=float), (n,))[:, np.newaxis]
+             for name, value in (fixed or {}).items()}
+    names = tuple(name for name in model.parameters if name not in fixed)
+
+    # missing points get zero weight, and finite placeholder values so they cannot poison the sums
+    w = np.broadcast_to(1. if weights is None else np.asarray(weights, dtype=float), (n, m))
+    w = np.where(np.isfinite(y) & np.isfinite(x), w, 0.)
+    valid = w > 0
+    x = np.where(valid, x, 1.)
+    y_observed = np.where(valid, y, np.nan)
+    y = np.where(valid, y, 0.)
+
+    guess = initial_guess(model, np.where(valid, x, np.nan), y_observed)
+    guess.update(p0 or {})
+    params = np.column_stack([np.broadcast_to(np.asarray(guess[name], dtype=float), (n,)) for name in names])
+
+    sse = _sum_of_squares(model, x, y, w, names, params, fixed)
+    damping = np.full(n, 1e-3)
+    converged = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=int)
+
+    for _ in range(max_iter):
+        active = np.flatnonzero(~converged)
+        if not active.size:
+            break
+        iterations[active] += 1
+
+        # damped normal equations for every dataset still being fitted
+        xa, ya, wa, pa, fa = x[active], y[active], w[active], params[active], _rows(fixed, active)
+        jac, f0 = _jacobian(model, xa, names, pa, fa)
+        wj = jac * wa[..., np.newaxis]
+        jtj = np.einsum('nmk,nml->nkl', wj, jac)
+        gradient = np.einsum('nmk,nm->nk', wj, ya - f0)
+        diagonal = np.diagonal(jtj, axis1=1, axis2=2)
+        damped = jtj + _diag(damping[active, np.newaxis] * (diagonal + np.finfo(float).eps))
+        step = _solve(damped, gradient)
+
+        trial = pa + step
+        trial_sse = _sum_of_squares(model, xa, ya, wa, names, trial, fa)
+        improved = trial_sse < sse[active]
+        small_change = np.abs(sse[active] - trial_sse) <= tol * np.maximum(sse[active], np.finfo(float).tiny)
+        small_step = np.all(np.abs(step) <= tol * np.maximum(np.abs(pa), 1.), axis=1)
+
+        # accept improving steps and relax the damping, otherwise reject them and damp harder. only an accepted step
+        # can end a fit: a rejected one (or one zeroed by _solve for a non-finite system) says nothing about the optimum
+        params[active[improved]] = trial[improved]
+        sse[active[improved]] = trial_sse[improved]
+        damping[active] = np.where(improved, damping[active] / 10, damping[active] * 10)
+        converged[active] = (improved & (small_change | small_step)) | (sse[active] == 0)
+
+    # a fit with non-finite parameters, or fewer points than parameters, has not converged whatever its steps did
+    converged &= np.isfinite(params).all(axis=1) & np.isfinite(sse) & (valid.sum(axis=1) >= len(names))
+
+    # asymptotic standard errors from the jacobian at the solution; nan where the parameters are not determined
+    jac, _ = _jacobian(model, x, names, params, fixed)
+    jtj = np.einsum('nmk,nml->nkl', jac * w[..., np.newaxis], jac)
+    dof = valid.sum(axis=1) - len(names)
+    variance = np.where(dof > 0, sse / np.maximum(dof, 1), np.nan)
+    with np.errstate(invalid='ignore'):
+        stderr = np.sqrt(np.diagonal(_covariance(jtj), axis1=1, axis2=2) * variance[:, np.newaxis])
+
+    return FitResult(names=names, params=params, stderr=stderr, converged=converged, iterations=iterations, sse=sse)
+
+
+def _rows(fixed: dict, rows: np.ndarray) -> dict:
+    """the values of the fixed parameters for a subset of the datasets"""
+    return {name: value[rows] for name, value in fixed.items()}
+
+
+def _diag(values: np.ndarray) -> np.ndarray:
+    """stack of diagonal matrices, shape (N, P, P), from values of shape (N, P)"""
+    return values[..., np.newaxis] * np.eye(values.shape[-1])
+
+
+def _solve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """batched solution of a @ x = b, falling back to the pseudo-inverse for singular systems"""
+    a = np.where(np.isfinite(a), a, 0.)
+    b = np.where(np.isfinite(b), b, 0.)
+    try:
+        return np.linalg.solve(a, b[..., np.newaxis])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.einsum('nkl,nl->nk', np.linalg.pinv(a), b)
+
+
+def _covariance(jtj: np.ndarray) -> np.ndarray:
+    """
+    batched inverse of the normal matrices, nan for those that are singular or worse conditioned than
+    MAX_CONDITION once the parameters are scaled to unit diagonal (so that the units of the parameters do not count)
+    """
+    jtj = np.where(np.isfinite(jtj), jtj, 0.)
+    diagonal = np.diagonal(jtj, axis1=1, axis2=2)
+    determined = np.all(diagonal > 0, axis=1)
+    scale = 1 / np.sqrt(np.where(diagonal > 0, diagonal, 1.))
+    scaled = jtj * scale[:, :, np.newaxis] * scale[:, np.newaxis, :]
+    singular_values = np.linalg.svd(scaled, compute_uv=False)
+    determined &= singular_values[:, -1] * MAX_CONDITION > singular_values[:, 0]
+    covariance = np.full_like(jtj, np.nan)
+    if determined.any():
+        inverse = _inverse(scaled[determined])
+        covariance[determined] = inverse * scale[determined, :, np.newaxis] * scale[determined, np.newaxis, :]
+    return covariance
+
+
+def _inverse(a: np.ndarray) -> np.ndarray:
+    """batched matrix inverse, falling back to the pseudo-inverse for singular matrices"""
+    a = np.where(np.isfinite(a), a, 0.)
+    try:
+        return np.linalg.inv(a)
+    except np.linalg.LinAlgError:
+        return np.linalg.pinv(a)
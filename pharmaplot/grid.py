@@ -0,0 +1,238 @@
+"""
+broadcast evaluation of the model functions over whole grids of parameter values
+
+instead of looping over lists of parameters (e.g. a ki_list) and calling a model once per curve, every parameter can
+be passed as an array and the full cartesian ("product") or element-wise ("zip") set of curves is evaluated in a few
+vectorized passes written directly into a single output buffer. with workers > 1, large grids are split into
+contiguous ranges of cache-sized blocks evaluated by a pool of threads (numpy releases the GIL inside the ufuncs of the
+generated kernels), each writing its own part of the shared output buffer
+"""
+import functools
+import inspect
+import os
+from typing import Callable, Union
+
+import numpy as np
+
+from pharmaplot.models import get_model
+
+GRID_MODES = ('product', 'zip')
+
+# number of elements per block when a kernel needs scratch space; keeps temporaries cache-sized
+CHUNK_SIZE = 2 ** 16
+
+# outputs smaller than this many elements per worker are not worth splitting across threads
+PARALLEL_MIN_SIZE = 2 ** 18
+
+# ranges of blocks per worker, so that threads finishing early can take over work
+TASKS_PER_WORKER = 4
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# grid layout
+# ----------------------------------------------------------------------------------------------------------------------
+def _parameter_names(model: Callable) -> list:
+    """names of the model parameters, i.e. every argument after the independent variable"""
+    return list(inspect.signature(model).parameters)[1:]
+
+
+def _broadcast_parameters(model: Callable, mode: str, dtype, params: dict):
+    """
+    reshape parameter arrays so they broadcast against each other and against a trailing x axis
+
+    Returns
+    -------
+    shaped, grid_shape: tuple
+        shaped = dict of parameter name -> array ready for broadcasting (x axis excluded)
+        grid_shape = shape of the parameter axes of the grid
+    """
+    if mode not in GRID_MODES:
+        raise ValueError(f'mode must be one of {GRID_MODES}, not {mode!r}')
+
+    names = _parameter_names(model)
+    unknown = set(params) - set(names)
+    if unknown:
+        raise TypeError(f'{model.__name__}() got unexpected parameter(s): {", ".join(sorted(unknown))}')
+
+    defaults = {name: p.default for name, p in inspect.signature(model).parameters.items()
+                if p.default is not inspect.Parameter.empty}
+    missing = [name for name in names if name not in params and name not in defaults]
+    if missing:
+        raise TypeError(f'{model.__name__}() missing parameter(s): {", ".join(missing)}')
+
+    values = {name: np.asarray(params.get(name, defaults.get(name)), dtype=dtype) for name in names}
+    for name, value in values.items():
+        if value.ndim > 1:
+            raise ValueError(f'parameter {name!r} must be a scalar or 1-D array')
+
+    # array parameters define the grid axes, in the order they were passed in
+    axes = [name for name in params if values[name].ndim == 1]
+
+    if mode == 'product':
+        grid_shape = tuple(values[name].size for name in axes)
+        shaped = {}
+        for name, value in values.items():
+            if name in axes:
+                shape = [1] * len(axes)
+                shape[axes.index(name)] = value.size
+                value = value.reshape(shape)
+            shaped[name] = value
+        return shaped, grid_shape
+
+    sizes = {values[name].size for name in axes}
+    if len(sizes) > 1:
+        raise ValueError('in zip mode every array parameter must have the same length')
+    grid_shape = (sizes.pop(),) if sizes else ()
+    return values, grid_shape
+
+
+def grid_parameters(model: Callable, mode: str = 'product', dtype=np.float64, **params) -> dict:
+    """
+    the parameter values belonging to each curve of a grid evaluated with :func:`evaluate_grid`
+
+    Parameters
+    ----------
+    model: Callable
+        model function from pharmaplot.mm or pharmaplot.receptors
+
+    mode: str
+        'product' or 'zip', see :func:`evaluate_grid`
+
+    dtype: np.dtype
+        float32 or float64
+
+    params:
+        scalar or 1-D array for each model parameter
+
+    Returns
+    -------
+    grid_params: dict
+        parameter name -> array with the shape of the grid (without the x axis)
+    """
+    shaped, grid_shape = _broadcast_parameters(model, mode, dtype, params)
+    if mode == 'zip':
+        shaped = {name: value.reshape(-1) if value.ndim else value for name, value in shaped.items()}
+    return {name: np.broadcast_to(value, grid_shape) for name, value in shaped.items()}
+
+
+def evaluate_grid(model: Callable,
+                  x: Union[float, np.ndarray],
+                  mode: str = 'product',
+                  out: np.ndarray = None,
+                  dtype=np.float64,
+                  workers: int = 1,
+                  **params) -> np.ndarray:
+    """
+    evaluate a model over every combination of parameter values in one broadcast call
+
+    Parameters
+    ----------
+    model: Callable
+        model function from pharmaplot.mm or pharmaplot.receptors, e.g. mm.mm_competitive
+
+    x: Union[float, np.ndarray]
+        1-D array of the independent variable (substrate, ligand, log concentration, ...)
+
+    mode: str
+        'product' evaluates the cartesian product of all array parameters, giving one grid axis per array parameter
+        in the order they are passed; 'zip' pairs the array parameters element-wise, giving a single grid axis
+
+    out: np.ndarray
+        optional preallocated output buffer with shape grid_shape + x.shape and the requested dtype
+
+    dtype: np.dtype
+        float32 or float64; x and all parameters are cast to this type
+
+    workers: int
+        number of threads evaluating a large grid (or a long x) in parallel; None uses every cpu. outputs of fewer
+        than PARALLEL_MIN_SIZE elements per thread use fewer threads, and arbitrary (unregistered) functions one
+
+    params:
+        scalar or 1-D array for each model parameter; parameters with defaults may be omitted
+
+    Returns
+    -------
+    out: np.ndarray
+        model values, shape grid_shape + x.shape
+
+    Examples
+    --------
+    >>> v = evaluate_grid(mm.mm_competitive, np.logspace(-1, 2, 100), vmax=100., km=10.,
+    ...                   ki=[0.1, 1, 10, 100], conc_i=[0, 0.1, 1, 10, 100])
+    >>> v.shape
+    (4, 5, 100)
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError('dtype must be float32 or float64')
+
+    shaped, grid_shape = _broadcast_parameters(model, mode, dtype, params)
+    x = np.asarray(x, dtype=dtype)
+    if x.ndim > 1:
+        raise ValueError('x must be a scalar or 1-D array')
+
+    shape = grid_shape + x.shape
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape or out.dtype != dtype:
+        raise ValueError(f'out must have shape {shape} and dtype {dtype}, got {out.shape} and {out.dtype}')
+
+    # trailing axis for x, parameters gain a trailing length-1 axis
+    if x.ndim:
+        shaped = {name: value[..., np.newaxis] if value.ndim else value for name, value in shaped.items()}
+
+    try:
+        registered = get_model(model)
+    except KeyError:
+        # arbitrary functions are still broadcast in one call, but may create temporaries
+        out[...] = model(x, **shaped)
+        return out
+
+    _run_kernel(registered, x, [shaped[name] for name in registered.parameters], out, workers)
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def _thread_pool(workers: int):
+    """one pool per number of workers, kept for the life of the process"""
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pharmaplot-grid')
+
+
+def _run_kernel(model, x: np.ndarray, params: list, out: np.ndarray, workers: int = 1):
+    """
+    run a generated in-place kernel, walking the leading axis of `out` in blocks so scratch buffers stay small, and
+    spreading contiguous ranges of blocks over a thread pool when workers > 1
+    """
+    leading = out.shape[0] if out.ndim else 1
+    workers = min(workers or os.cpu_count() or 1, max(1, out.size // PARALLEL_MIN_SIZE), leading)
+    if workers <= 1 and (not model.scratch or out.size <= CHUNK_SIZE):
+        model.kernel(x, *params, out=out)
+        return
+
+    # 1-D outputs are split along x itself; otherwise whole rows of the grid are processed together
+    rows = max(1, CHUNK_SIZE // (out[0].size if out.ndim > 1 else 1))
+    if workers <= 1:
+        _run_blocks(model, x, params, out, rows, 0, out.shape[0])
+        return
+
+    # every task gets a contiguous range of whole blocks, and the ranges are spread evenly over the tasks
+    blocks = -(-out.shape[0] // rows)
+    tasks = min(blocks, workers * TASKS_PER_WORKER)
+    bounds = [min(out.shape[0], (blocks * i // tasks) * rows) for i in range(tasks + 1)]
+    pool = _thread_pool(workers)
+    for future in [pool.submit(_run_blocks, model, x, params, out, rows, start, stop)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]:
+        future.result()
+
+
+def _run_blocks(model, x: np.ndarray, params: list, out: np.ndarray, rows: int, first: int, last: int):
+    """evaluate out[first:last] a block of `rows` leading rows at a time, with scratch buffers of one block"""
+    # a scalar x with one grid axis also gives a 1-D output, split along the parameters only
+    split_x = out.ndim == 1 and x.ndim == 1
+    buffers = [np.empty((rows,) + out.shape[1:], dtype=out.dtype) for _ in range(model.scratch)]
+    for start in range(first, last, rows):
+        stop = min(start + rows, last)
+        block_params = [p[start:stop] if p.ndim == out.ndim and p.shape[0] > 1 else p for p in params]
+        block_x = x[start:stop] if split_x else x
+        model.kernel(block_x, *block_params, out=out[start:stop], scratch=[b[:stop - start] for b in buffers])
@@ -0,0 +1,305 @@
+"""
+chunked ingestion of plate-reader exports into a memory-mappable columnar cache
+
+exports (csv, tsv or xlsx) are parsed in chunks of rows with pandas, concentrations are converted to molar in one
+vectorized step per chunk, and the columns are written to a cache directory named after the sha256 of the export:
+
+    <cache_dir>/<sha256>/plate.npy, compound.npy      int32 codes into the names in meta.json
+    <cache_dir>/<sha256>/conc.npy, response.npy       float64, concentration in M
+    <cache_dir>/<sha256>/meta.json                    plate and compound names, number of rows, format version
+
+the .npy files are opened memory-mapped, so analysing the same export again skips parsing entirely and only reads the
+pages it touches. besides the columns `plate`, `compound` and `response`, an export needs the concentration in one of
+these forms:
+
+- `log_conc`: log10 of the molar concentration (the format of pharmaplot.pipeline)
+- `conc` and a `unit` column (M, mM, uM, µM, nM, pM, fM)
+- `conc` with the unit in the header, e.g. `conc_nM`, `conc (uM)` or `conc [mM]`
+
+control wells may leave the concentration empty
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+from typing import Dict, Iterator, NamedTuple, Sequence, Union
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# rows parsed at a time
+CHUNK_SIZE = 1_000_000
+
+UNITS = {'M': 1., 'mM': 1e-3, 'uM': 1e-6, 'µM': 1e-6, 'μM': 1e-6, 'nM': 1e-9, 'pM': 1e-12, 'fM': 1e-15}
+
+_CONC_HEADER = re.compile(r'^conc(?:entration)?\s*[_(\[]\s*(\w+)\s*[)\]]?$', re.I)
+
+
+class Columns(NamedTuple):
+    """
+    the parsed rows of an export
+
+    Attributes
+    ----------
+    plate, compound: np.ndarray
+        int32 codes into plates and compounds
+
+    conc, response: np.ndarray
+        float64 concentration in M (nan where empty) and response
+
+    plates, compounds: list
+        names of the codes
+    """
+    plate: np.ndarray
+    compound: np.ndarray
+    conc: np.ndarray
+    response: np.ndarray
+    plates: list
+    compounds: list
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# reading
+# ----------------------------------------------------------------------------------------------------------------------
+def file_hash(path: str, block_size: int = 2 ** 23) -> str:
+    """sha256 of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _xlsx_chunks(path: str, chunksize: int):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError('reading xlsx exports requires openpyxl') from None
+    import pandas as pd
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(name) for name in next(rows)]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunksize:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_chunks(path: str, chunksize: int = CHUNK_SIZE) -> Iterator:
+    """pandas DataFrames of up to chunksize rows of an export (csv, tsv/tab or xlsx, by extension)"""
+    if path.endswith('.xlsx'):
+        yield from _xlsx_chunks(path, chunksize)
+        return
+    import pandas as pd
+
+    sep = '\t' if path.endswith(('.tsv', '.tab')) else ','
+    with pd.read_csv(path, sep=sep, chunksize=chunksize, dtype={'plate': str, 'compound': str}) as reader:
+        yield from reader
+
+
+def _numbers(column) -> np.ndarray:
+    """float64 values of a chunk column, nan where a field is blank or not a number (e.g. a failed well)"""
+    import pandas as pd
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
+
+
+def molar(chunk) -> np.ndarray:
+    """
+    the concentrations of a chunk in M, converted in one vectorized step
+
+    Parameters
+    ----------
+    chunk: pandas.DataFrame
+        rows of an export with log_conc, conc and unit, or conc_<unit> columns
+
+    Returns
+    -------
+    conc: np.ndarray
+        float64 concentrations, nan where empty or not a number
+    """
+    columns = {str(name).strip(): name for name in chunk.columns}
+    if 'log_conc' in columns:
+        return 10 ** _numbers(chunk[columns['log_conc']])
+    if 'conc' in columns and 'unit' in columns:
+        conc = _numbers(chunk[columns['conc']])
+        units, inverse = np.unique(chunk[columns['unit']].fillna('M').astype(str).str.strip().to_numpy(),
+                                   return_inverse=True)
+        unknown = [unit for unit in units if unit not in UNITS]
+        if unknown:
+            raise ValueError(f'unknown concentration unit(s): {", ".join(unknown)}')
+        return conc * np.array([UNITS[unit] for unit in units])[inverse]
+    for name, column in columns.items():
+        match = _CONC_HEADER.match(name)
+        if match:
+            if match.group(1) not in UNITS:
+                raise ValueError(f'unknown concentration unit in column {name!r}')
+            return _numbers(chunk[column]) * UNITS[match.group(1)]
+    raise ValueError('an export needs a log_conc column, conc and unit columns, or a conc_<unit> column')
+
+
+class _Codes:
+    """codes of names across chunks, in order of first appearance"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+
+    def encode(self, values) -> np.ndarray:
+        import pandas as pd
+
+        codes, uniques = pd.factorize(values.astype(str))
+        table = np.array([self.index.setdefault(name, len(self.index)) for name in uniques], dtype=np.int32)
+        return table[codes]
+
+    @property
+    def names(self) -> list:
+        return list(self.index)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# cache
+# ----------------------------------------------------------------------------------------------------------------------
+_COLUMNS = (('plate', np.int32), ('compound', np.int32), ('conc', np.float64), ('response', np.float64))
+
+
+def _write_cache(path: str, directory: str, chunksize: int):
+    """parse an export into a new cache directory; columns are streamed to disk chunk by chunk"""
+    tmp = f'{directory}.tmp-{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    plates, compounds, rows = _Codes(), _Codes(), 0
+    raw = {name: open(os.path.join(tmp, f'{name}.raw'), 'wb') for name, _ in _COLUMNS}
+    try:
+        for chunk in read_chunks(path, chunksize):
+            values = dict(plate=plates.encode(chunk['plate']), compound=compounds.encode(chunk['compound']),
+                          conc=molar(chunk), response=_numbers(chunk['response']))
+            for name, dtype in _COLUMNS:
+                np.ascontiguousarray(values[name], dtype=dtype).tofile(raw[name])
+            rows += len(chunk)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    finally:
+        for f in raw.values():
+            f.close()
+
+    # the row count is only known at the end, so the .npy headers are written now and the data copied behind them
+    for name, dtype in _COLUMNS:
+        with open(os.path.join(tmp, f'{name}.npy'), 'wb') as out, open(os.path.join(tmp, f'{name}.raw'), 'rb') as f:
+            np.lib.format.write_array_header_1_0(out, dict(descr=np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                            fortran_order=False, shape=(rows,)))
+            shutil.copyfileobj(f, out, 2 ** 23)
+        os.remove(os.path.join(tmp, f'{name}.raw'))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(dict(version=FORMAT_VERSION, source=os.path.basename(path), rows=rows, plates=plates.names,
+                       compounds=compounds.names), f)
+    try:
+        os.replace(tmp, directory)
+    except OSError:  # another process cached the same export first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _load_cache(directory: str):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != FORMAT_VERSION:
+        return None
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name, _ in _COLUMNS}
+    return Columns(**arrays, plates=meta['plates'], compounds=meta['compounds'])
+
+
+def ingest(path: str, cache_dir: str = None, chunksize: int = CHUNK_SIZE) -> Columns:
+    """
+    the columns of an export, parsed once and then read memory-mapped from the cache
+
+    Parameters
+    ----------
+    path: str
+        csv, tsv or xlsx export, see the module docstring for the columns
+
+    cache_dir: str
+        where parsed exports are cached; defaults to config.ingest_cache_dir, or a .pharmaplot-cache directory next
+        to the export when that is None
+
+    chunksize: int
+        rows parsed at a time, which bounds the memory used for parsing
+
+    Returns
+    -------
+    columns: Columns
+        memory-mapped columns of every row
+    """
+    from pharmaplot import config
+
+    cache_dir = cache_dir or config.ingest_cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                                     '.pharmaplot-cache')
+    directory = os.path.join(os.path.expanduser(cache_dir), file_hash(path))
+    columns = _load_cache(directory)
+    if columns is None:
+        shutil.rmtree(directory, ignore_errors=True)
+        _write_cache(path, directory, chunksize)
+        columns = _load_cache(directory)
+    return columns
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# plates
+# ----------------------------------------------------------------------------------------------------------------------
+def iter_plates(columns: Columns, positive: str = 'POS', negative: str = 'NEG') -> Iterator:
+    """
+    the plates of ingested columns as pharmaplot.pipeline.Plate objects, one at a time
+
+    as with pharmaplot.pipeline.read_plates, the rows of a plate are expected to be contiguous and blank or failed
+    wells are skipped and counted; x is log10 of the molar concentration
+    """
+    from pharmaplot.pipeline import Plate
+
+    codes = {name: code for code, name in enumerate(columns.compounds)}
+    controls = [codes.get(positive, -1), codes.get(negative, -1)]
+    plate = np.asarray(columns.plate)
+    bounds = np.concatenate([[0], np.flatnonzero(plate[1:] != plate[:-1]) + 1, [plate.size]])
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        compound = np.asarray(columns.compound[start:end])
+        response = np.asarray(columns.response[start:end])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_all = np.log10(columns.conc[start:end])
+        control = np.isin(compound, controls)
+        usable = np.isfinite(response) & (control | np.isfinite(x_all))
+        wells = ~control & usable
+
+        # compounds in order of first appearance, and the position of every well within its compound
+        names, first, inverse, counts = np.unique(compound[wells], return_index=True, return_inverse=True,
+                                                  return_counts=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.size)
+        row = rank[inverse]
+        sort = np.argsort(row, kind='stable')
+        position = np.empty(row.size, dtype=np.int64)
+        position[sort] = np.arange(row.size) - np.repeat(np.cumsum(counts[order]) - counts[order], counts[order])
+
+        x = np.full((names.size, counts.max(initial=0)), np.nan)
+        y = np.full_like(x, np.nan)
+        x[row, position], y[row, position] = x_all[wells], response[wells]
+        yield Plate(columns.plates[plate[start]], [columns.compounds[code] for code in names[order]], x, y,
+                    response[(compound == controls[0]) & usable], response[(compound == controls[1]) & usable],
+                    int(usable.size - usable.sum()))
+
+
+def read_plates(paths: Union[str, Sequence[str]], positive: str = 'POS', negative: str = 'NEG',
+                cache_dir: str = None, chunksize: int = CHUNK_SIZE) -> Iterator:
+    """like pharmaplot.pipeline.read_plates, through the columnar cache"""
+    for path in [paths] if isinstance(paths, str) else paths:
+        yield from iter_plates(ingest(path, cache_dir, chunksize), positive, negative)
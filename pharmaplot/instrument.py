@@ -0,0 +1,312 @@
+"""
+opt-in instrumentation of the model functions and of the fitting, pipeline and build stages
+
+while instrumentation is off nothing is wrapped, so it costs nothing. turning it on rebinds every model function of
+pharmaplot.mm and pharmaplot.receptors (and their jacobians), and the stages listed in STAGES, to wrappers recording
+call counts, the number of array elements passed in, wall time and the bytes of the arrays returned - also where they
+were imported by name into other pharmaplot modules or registered as a model. turning it off restores the originals.
+with memory=True the peak memory allocated during each call is traced too, which slows the calls down
+
+either use the context manager::
+
+    with instrument('profile.json') as profile:
+        run_pipeline(...)
+    print(profile.format())
+
+or set the environment variable before starting python; the profile is written when the process exits::
+
+    PHARMAPLOT_PROFILE=profile.json python -m pharmaplot pipeline ...
+    PHARMAPLOT_PROFILE=profile.folded PHARMAPLOT_PROFILE_MEMORY=1 python -m pharmaplot build -j 1
+
+profiles are written as json, or with a .folded / .collapsed / .txt extension as collapsed stacks (one
+`outer;inner;function microseconds` line per call path, self time only) for flamegraph.pl, speedscope or inferno.
+only the calls of the current process are recorded, so run stages that otherwise use worker processes with one worker
+"""
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, List
+
+import numpy as np
+
+ENVIRONMENT_VARIABLE = 'PHARMAPLOT_PROFILE'
+MEMORY_VARIABLE = 'PHARMAPLOT_PROFILE_MEMORY'
+
+# the fitting, pipeline and build stages that are instrumented besides the model functions
+STAGES = {
+    'pharmaplot.fit': ('fit_batch',),
+    'pharmaplot.grid': ('evaluate_grid',),
+    'pharmaplot.sweep': ('sweep',),
+    'pharmaplot.pipeline': ('process_plate', 'run_pipeline'),
+    'pharmaplot.ingest': ('ingest',),
+    'pharmaplot.store': ('fit_stored',),
+    'pharmaplot.build': ('build', 'render', 'input_hash'),
+    'pharmaplot.payload': ('optimize_file',),
+    'pharmaplot.resources': ('link_site',),
+}
+
+_COLLAPSED_EXTENSIONS = ('.folded', '.collapsed', '.txt')
+
+
+class Profile:
+    """
+    the calls recorded while instrumentation was on
+
+    Attributes
+    ----------
+    functions: Dict[str, dict]
+        per function: calls, elements (total elements of the first array argument), max_elements, seconds (inclusive
+        wall time), result_bytes (total bytes of the arrays returned) and, with memory tracing, peak_bytes (largest
+        peak allocation of one call)
+
+    stacks: Dict[tuple, float]
+        self time in seconds of every call path, a tuple of function names from the outermost instrumented call
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.functions: Dict[str, dict] = {}
+        self.stacks: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def _open(self) -> List[list]:
+        """this thread's open calls: [path, start time, time spent in instrumented callees, start memory, peak]"""
+        try:
+            return self._local.open
+        except AttributeError:
+            self._local.open = []
+            return self._local.open
+
+    def _enter(self, name: str):
+        calls = self._open
+        path = (calls[-1][0] if calls else ()) + (name,)
+        start_memory = peak = 0
+        if self.memory:
+            import tracemalloc
+
+            start_memory, peak = tracemalloc.get_traced_memory()
+            for call in calls:
+                call[4] = max(call[4], peak)
+            tracemalloc.reset_peak()
+            peak = start_memory
+        calls.append([path, time.perf_counter(), 0., start_memory, peak])
+
+    def _exit(self, name: str, args: tuple, result):
+        end = time.perf_counter()
+        calls = self._open
+        path, start, inner, start_memory, peak = calls.pop()
+        seconds = end - start
+        if calls:
+            calls[-1][2] += seconds
+        if self.memory:
+            import tracemalloc
+
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if calls:
+                calls[-1][4] = max(calls[-1][4], peak)
+        elements = next((arg.size for arg in args if isinstance(arg, np.ndarray)), 0)
+        result_bytes = sum(value.nbytes for value in (result if isinstance(result, tuple) else (result,))
+                           if isinstance(value, np.ndarray))
+
+        with self._lock:
+            self.stacks[path] = self.stacks.get(path, 0.) + seconds - inner
+            record = self.functions.get(name)
+            if record is None:
+                record = self.functions[name] = dict(calls=0, elements=0, max_elements=0, seconds=0., result_bytes=0)
+                if self.memory:
+                    record['peak_bytes'] = 0
+            record['calls'] += 1
+            record['elements'] += elements
+            record['max_elements'] = max(record['max_elements'], elements)
+            record['seconds'] += seconds
+            record['result_bytes'] += result_bytes
+            if self.memory:
+                record['peak_bytes'] = max(record['peak_bytes'], peak - start_memory)
+
+    def to_dict(self) -> dict:
+        """the profile as json-compatible data"""
+        return dict(memory=self.memory, functions=self.functions,
+                    stacks={';'.join(path): seconds for path, seconds in self.stacks.items()})
+
+    def collapsed(self) -> str:
+        """collapsed stacks for flame graphs: one `outer;inner;function microseconds` line per call path"""
+        return ''.join(f'{";".join(path)} {max(round(seconds * 1e6), 0)}\n'
+                       for path, seconds in sorted(self.stacks.items()))
+
+    def write(self, path: str):
+        """write the profile as collapsed stacks (.folded, .collapsed or .txt) or as json (anything else)"""
+        with open(path, 'w') as f:
+            if path.endswith(_COLLAPSED_EXTENSIONS):
+                f.write(self.collapsed())
+            else:
+                json.dump(self.to_dict(), f, indent=1)
+
+    def format(self) -> str:
+        """the functions as a text table, slowest first"""
+        lines = [f'{"function":<36} {"calls":>8} {"elements":>12} {"seconds":>9} {"result MB":>10}'
+                 + (f' {"peak MB":>9}' if self.memory else '')]
+        for name, record in sorted(self.functions.items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f'{name:<36} {record["calls"]:>8} {record["elements"]:>12} {record["seconds"]:>9.4f} '
+                         f'{record["result_bytes"] / 1e6:>10.2f}'
+                         + (f' {record["peak_bytes"] / 1e6:>9.2f}' if self.memory else ''))
+        return '\n'.join(lines)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# switching on and off
+# ----------------------------------------------------------------------------------------------------------------------
+_active = None  # (profile, [(namespace, name, original)] of the rebound functions, whether tracemalloc was started)
+
+
+def _wrap(function: Callable, name: str, profile: Profile) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profile._enter(name)
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            profile._exit(name, args, result)
+    return wrapper
+
+
+def _targets() -> Dict[Callable, str]:
+    """the functions to instrument, with the name they are recorded under"""
+    import importlib
+
+    from pharmaplot import mm, receptors
+
+    targets = {}
+    for module in (mm, receptors):
+        for name, function in vars(module).items():
+            if callable(function) and getattr(function, '__module__', None) == module.__name__ and name[0] != '_':
+                targets[function] = name
+    for module_name, names in STAGES.items():
+        module = importlib.import_module(module_name)
+        targets.update((getattr(module, name), name) for name in names)
+    return targets
+
+
+def enable(memory: bool = False) -> Profile:
+    """
+    start recording into a new profile
+
+    Parameters
+    ----------
+    memory: bool
+        also trace the peak memory allocated during every call (with tracemalloc, which slows the calls down)
+
+    Returns
+    -------
+    profile: Profile
+        the profile the calls are recorded into
+    """
+    global _active
+    if _active is not None:
+        raise RuntimeError('instrumentation is already enabled')
+    from pharmaplot.models import MODELS
+
+    profile = Profile(memory)
+    # by id, as not everything a module namespace holds is hashable
+    wrappers = {id(function): (function, _wrap(function, name, profile)) for function, name in _targets().items()}
+
+    def wrapper_of(value):
+        original, wrapper = wrappers.get(id(value), (None, None))
+        return wrapper if original is value else None
+
+    # rebind the functions wherever pharmaplot (or a script run as __main__) holds them
+    rebound = []
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not (module_name.split('.')[0] == 'pharmaplot' or module_name == '__main__'):
+            continue
+        namespace = vars(module)
+        for name, value in list(namespace.items()):
+            wrapper = wrapper_of(value)
+            if wrapper is not None:
+                rebound.append((namespace, name, value))
+                namespace[name] = wrapper
+    for model in MODELS.values():
+        for attribute in ('function', 'jacobian'):
+            value = getattr(model, attribute)
+            wrapper = wrapper_of(value)
+            if wrapper is not None:
+                rebound.append((vars(model), attribute, value))
+                setattr(model, attribute, wrapper)
+
+    started = False
+    if memory:
+        import tracemalloc
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+    _active = profile, rebound, started
+    return profile
+
+
+def disable() -> Profile:
+    """stop recording, restoring the original functions, and return the profile"""
+    global _active
+    if _active is None:
+        raise RuntimeError('instrumentation is not enabled')
+    profile, rebound, started = _active
+    for namespace, name, original in reversed(rebound):
+        namespace[name] = original
+    if started:
+        import tracemalloc
+
+        tracemalloc.stop()
+    _active = None
+    return profile
+
+
+def enabled() -> bool:
+    """whether instrumentation is on"""
+    return _active is not None
+
+
+@contextlib.contextmanager
+def instrument(output: str = None, memory: bool = False) -> Iterator[Profile]:
+    """
+    record the calls made inside the with block
+
+    Parameters
+    ----------
+    output: str
+        file the profile is written to on leaving the block; json, or collapsed stacks with a .folded, .collapsed or
+        .txt extension
+
+    memory: bool
+        also trace the peak memory allocated during every call
+    """
+    profile = enable(memory)
+    try:
+        yield profile
+    finally:
+        disable()
+        if output:
+            profile.write(output)
+
+
+def enable_from_environment():
+    """turn instrumentation on when PHARMAPLOT_PROFILE names an output file, writing it when the process exits"""
+    output = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not output or enabled():
+        return
+    import atexit
+
+    profile = enable(memory=os.environ.get(MEMORY_VARIABLE, '') not in ('', '0'))
+
+    def write():
+        if _active is not None and _active[0] is profile:
+            disable()
+        profile.write(output)
+
+    atexit.register(write)
@@ -0,0 +1,272 @@
+"""
+precomputed slider-state lookup tables for CustomJS callbacks
+
+in lookup mode the curves for every reachable slider state (or every n-th state along each slider) are computed in
+python, quantized to 8 or 16 bits and shipped in the page as a binary column. the browser callback then only finds
+the row for the current slider state and copies it into the plotted sources, so slider latency no longer depends on
+the model or on how slow the student's machine is
+
+if no table fits within the payload budget and error tolerance, the generated callback falls back to computing the
+curves live with the kernels from pharmaplot.models
+"""
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+from pharmaplot.callbacks import callback_code, coalesced
+from pharmaplot.config import lookup_max_error, lookup_payload_budget
+from pharmaplot.grid import evaluate_grid
+from pharmaplot.models import get_model, js_expression
+
+# table configurations that are tried, from most to least exact
+STRIDES = (1, 2, 4, 8)
+BITS = (16, 8)
+
+
+def slider_values(slider, stride: int = 1) -> np.ndarray:
+    """every value a bokeh Slider can take (start, start + step, ... end), keeping every `stride`-th one"""
+    n = int(round((slider.end - slider.start) / slider.step)) + 1
+    return slider.start + slider.step * np.arange(0, n, stride)
+
+
+def keeps_slider_values(slider, stride: int) -> bool:
+    """whether every `stride`-th state of a slider still includes its start, its starting value and its end"""
+    return all(int(round((value - slider.start) / slider.step)) % stride == 0 for value in (slider.value, slider.end))
+
+
+def _evaluate_states(models: list, option: np.ndarray, states: Dict[str, np.ndarray], params: Dict[str, str],
+                     xs: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    evaluate the curves of many slider states
+
+    Parameters
+    ----------
+    models: list
+        one registered model per select option (a single model when there is no select widget)
+
+    option: np.ndarray
+        index into models for each state
+
+    states: Dict[str, np.ndarray]
+        slider name -> slider value for each state
+
+    params: Dict[str, str]
+        model parameter -> python expression in the slider names
+
+    xs: Sequence[np.ndarray]
+        x values of each source
+
+    Returns
+    -------
+    curves: np.ndarray
+        shape (number of states, total number of x values); the sources are concatenated along the second axis
+    """
+    n = option.size
+    values = {name: np.broadcast_to(np.asarray(eval(expression, {'np': np, '__builtins__': {}}, states), float), (n,))
+              for name, expression in params.items()}
+    curves = np.empty((n, sum(x.size for x in xs)))
+
+    for index, model in enumerate(models):
+        rows = np.flatnonzero(option == index)
+        if not rows.size:
+            continue
+        model_params = {name: values[name][rows] for name in model.parameters}
+        start = 0
+        for x in xs:
+            curves[rows, start:start + x.size] = evaluate_grid(model.function, x, mode='zip', **model_params)
+            start += x.size
+    return curves
+
+
+def _quantize(curves: np.ndarray, bits: int):
+    """uniform quantization of all curves to unsigned integers; returns codes, offset and scale"""
+    lo, hi = float(np.nanmin(curves)), float(np.nanmax(curves))
+    scale = (hi - lo) / (2 ** bits - 1) or 1.
+    codes = np.rint((curves - lo) / scale).astype(np.uint16 if bits == 16 else np.uint8)
+    return codes, lo, scale
+
+
+def _axes(sliders: dict, select_options: list, stride: int):
+    """table axes: (name, values) for the select widget and every slider"""
+    axes = [(None, np.arange(len(select_options)))] if select_options else []
+    axes += [(name, slider_values(slider, stride)) for name, slider in sliders.items()]
+    return axes
+
+
+def _state_index(axes: list, sliders: dict, samples: Dict[str, np.ndarray], option: np.ndarray, stride: int):
+    """row of the table (built with `stride`) holding the state nearest to each sampled slider state"""
+    index = np.zeros(option.size, dtype=np.int64)
+    for name, values in axes:
+        if name is None:
+            position = option
+        else:
+            slider = sliders[name]
+            position = np.clip(np.rint((samples[name] - slider.start) / (slider.step * stride)), 0, values.size - 1)
+        index = index * values.size + position.astype(np.int64)
+    return index
+
+
+def build_lookup(updates: Sequence[Tuple[Union[str, Dict[str, str]], Sequence[str]]],
+                 xs: Dict[str, np.ndarray],
+                 sliders: dict,
+                 params: Dict[str, str],
+                 select: str = None,
+                 budget: int = None,
+                 max_error: float = None,
+                 snap_sliders: bool = False,
+                 samples: int = 1000,
+                 seed: int = 0):
+    """
+    build a CustomJS callback that looks curves up from a precomputed table, or computes them live when no table fits
+
+    Parameters
+    ----------
+    updates: Sequence[Tuple[Union[str, Dict[str, str]], Sequence[str]]]
+        (model, sources) pairs as for pharmaplot.callbacks.callback_code; sources are CustomJS argument names whose
+        'y' column is updated
+
+    xs: Dict[str, np.ndarray]
+        source name -> the source's 'x' column
+
+    sliders: dict
+        CustomJS argument name -> bokeh Slider
+
+    params: Dict[str, str]
+        model parameter -> python expression in the slider names giving its value, e.g. {'kd': '10 ** kd'}
+
+    select: str
+        CustomJS argument name of the Select widget when dict models are used
+
+    budget: int
+        maximum payload size in bytes (base64 encoded); defaults to config.lookup_payload_budget
+
+    max_error: float
+        maximum tolerated error relative to the range of the curves; defaults to config.lookup_max_error
+
+    snap_sliders: bool
+        when True, the step of each slider is multiplied by the stride of the chosen table, so that the curve shown
+        always belongs to the slider state shown; when False, slider states between table entries are shown with the
+        nearest entry's curve. either way only strides keeping every slider's start, starting value and end in the
+        table are tried, and the error of a table is measured against the original slider steps
+
+    samples: int
+        number of random reachable slider states used to measure the error of each table
+
+    seed: int
+        seed for drawing the sample states
+
+    Returns
+    -------
+    code, args, report: tuple
+        code = javascript for CustomJS(code=...)
+        args = extra CustomJS arguments (the table source) to pass along with the existing ones
+        report = list of dicts with the stride, bits, payload bytes and max relative error of each table tried (or
+        why it was skipped), and whether it was chosen
+    """
+    budget = lookup_payload_budget if budget is None else budget
+    max_error = lookup_max_error if max_error is None else max_error
+
+    if len(updates) != 1:
+        raise ValueError('lookup tables support a single (model, sources) update')
+    model, sources = updates[0]
+    options = list(model) if isinstance(model, dict) else []
+    models = [get_model(m) for m in (model.values() if isinstance(model, dict) else [model])]
+    if options and select is None:
+        raise ValueError('select must be given when a model is chosen from a dict')
+    x_list = [np.asarray(xs[source], dtype=float) for source in sources]
+    row = sum(x.size for x in x_list)
+
+    # exact curves for a random sample of states reachable with the original slider steps, to measure the error of
+    # each table against
+    rng = np.random.default_rng(seed)
+    sample_states = {name: rng.choice(slider_values(slider), size=samples) for name, slider in sliders.items()}
+    sample_option = rng.integers(0, max(len(options), 1), size=samples)
+    exact = _evaluate_states(models, sample_option, sample_states, params, x_list)
+    y_range = float(np.nanmax(exact) - np.nanmin(exact)) or 1.
+
+    report, best = [], None
+    for stride in STRIDES:
+        axes = _axes(sliders, options, stride)
+        n_states = int(np.prod([values.size for _, values in axes]))
+        curves = None
+        # the starting state, and the ends of the sliders, must stay exactly where they are
+        kept = all(keeps_slider_values(slider, stride) for slider in sliders.values())
+        for bits in BITS:
+            payload = 4 * ((n_states * row * bits // 8 + 2) // 3)  # base64 encoded
+            entry = dict(stride=stride, bits=bits, states=n_states, bytes=payload, error=None, chosen=False,
+                         skipped=None if kept else 'misses a slider value')
+            report.append(entry)
+            if payload > budget:
+                entry['skipped'] = entry['skipped'] or 'over budget'
+            if entry['skipped']:
+                continue
+
+            if curves is None:
+                grids = np.meshgrid(*[values for _, values in axes], indexing='ij')
+                table_option = grids[0].ravel().astype(np.int64) if options else np.zeros(n_states, np.int64)
+                table_states = {name: grid.ravel() for (name, _), grid in zip(axes, grids) if name is not None}
+                curves = _evaluate_states(models, table_option, table_states, params, x_list)
+
+            codes, lo, scale = _quantize(curves, bits)
+            lookup = lo + scale * codes[_state_index(axes, sliders, sample_states, sample_option, stride)]
+            entry['error'] = float(np.nanmax(np.abs(lookup - exact))) / y_range
+            # prefer the finest slider steps when snapping, then the smallest error, then the smallest payload
+            rank = (stride if snap_sliders else 0, entry['error'], payload)
+            if entry['error'] <= max_error and (best is None or rank < best[0]):
+                best = (rank, entry, axes, codes, lo, scale)
+
+    if best is None:
+        code = callback_code(updates, params={name: js_expression(expression, lambda n: f'{n}.value')
+                                              for name, expression in params.items()},
+                             select=f'{select}.value' if select else None)
+        return code, {}, report
+
+    _, entry, axes, codes, lo, scale = best
+    entry['chosen'] = True
+    code = _lookup_code(axes, sliders, options, select, sources, x_list, lo, scale, entry['stride'])
+    if snap_sliders:
+        for slider in sliders.values():
+            slider.step = slider.step * entry['stride']
+
+    from bokeh.models import ColumnDataSource
+    return code, dict(LookupTable=ColumnDataSource(data=dict(codes=codes.ravel()))), report
+
+
+def _lookup_code(axes, sliders, options, select, sources, xs, lo, scale, stride) -> str:
+    """javascript that copies the table row for the current slider state into the sources"""
+    row = sum(x.size for x in xs)
+    lines = ['// slider-state lookup table generated by pharmaplot.lookup',
+             'const codes = LookupTable.data.codes;',
+             'let state = 0;']
+    for name, values in axes:
+        if name is None:
+            option_index = ', '.join(f'"{option}": {i}' for i, option in enumerate(options))
+            lines.append(f'state = state * {values.size} + {{{option_index}}}[{select}.value];')
+        else:
+            slider = sliders[name]
+            position = f'Math.round(({name}.value - {slider.start!r}) / {slider.step * stride!r})'
+            lines.append(f'state = state * {values.size} + Math.min({values.size - 1}, Math.max(0, {position}));')
+    lines.append(f'const base = state * {row};')
+
+    start = 0
+    for source, x in zip(sources, xs):
+        lines.append(f'for (let i = 0, y = {source}.data.y; i < {x.size}; i++) {{')
+        lines.append(f'    y[i] = {lo!r} + {scale!r} * codes[base + {start} + i];')
+        lines.append('}')
+        start += x.size
+    lines.append('')
+    lines.extend(f'{source}.change.emit();' for source in sources)
+    return coalesced('\n'.join(lines), sources[0])
+
+
+def format_report(report: list) -> str:
+    """the size vs. error tradeoff of the tables tried by :func:`build_lookup` as a text table"""
+    lines = [f'{"stride":>6} {"bits":>4} {"states":>10} {"bytes":>12} {"max error":>10}']
+    for entry in report:
+        error = entry['skipped'] if entry['error'] is None else f'{entry["error"]:.2e}'
+        chosen = '  <- chosen' if entry['chosen'] else ''
+        lines.append(f'{entry["stride"]:>6} {entry["bits"]:>4} {entry["states"]:>10} {entry["bytes"]:>12} '
+                     f'{error:>10}{chosen}')
+    if not any(entry['chosen'] for entry in report):
+        lines.append('no table fits the payload budget and error tolerance; curves are computed live')
+    return '\n'.join(lines)
@@ -97,3 +97,125 @@ def lwb_uncompetitive(inverse_substrate: float, vmax: float = 1., km: float = 5.
     calculate 1/v0 based on substrate for uncompetitive inhibitors
     """
     return (km/vmax)*inverse_substrate +((1+(conc_i/ki))/vmax)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# analytic jacobians
+#
+# each function returns the model value together with its partial derivatives with respect to every parameter (in
+# signature order, stacked along a new last axis), sharing intermediates such as the denominator between them
+# ----------------------------------------------------------------------------------------------------------------------
+def _value_and_jacobian(value, *partials):
+    """the value and its partials broadcast to one shape, the partials stacked along a new last axis (also used by
+    pharmaplot.receptors)"""
+    value, *partials = np.broadcast_arrays(value, *partials)
+    return value, np.stack(partials, axis=-1)
+
+
+def michaelis_menten_jacobian(substrate: np.ndarray, vmax: float, km: float):
+    """
+    initial velocity according to the Michaelis-Menten equation and its partial derivatives
+
+    Parameters
+    ----------
+    substrate: float
+        substrate concentration
+
+    vmax: float
+        maximum velocity
+
+    km: float
+        Michaelis-Menten constant
+
+    Returns
+    -------
+    initial_velocity, jacobian: tuple
+        initial_velocity = v0, as from michaelis_menten
+        jacobian = [dv0/dvmax, dv0/dkm] stacked along the last axis
+    """
+    denominator = km + substrate
+    fraction = substrate / denominator
+    initial_velocity = vmax * fraction
+    return _value_and_jacobian(initial_velocity, fraction, -initial_velocity / denominator)
+
+
+def mm_competitive_jacobian(substrate: np.ndarray, vmax: float = 1., km: float = 5., ki: float = 5.,
+                            conc_i: float = 5):
+    """
+    initial velocity for competitive inhibitors and its partials with respect to vmax, km, ki and conc_i
+    """
+    alpha = 1 + (conc_i / ki)
+    denominator = (km * alpha) + substrate
+    fraction = substrate / denominator
+    v = vmax * fraction
+    d_alpha = -v * km / denominator
+    return _value_and_jacobian(v, fraction, -v * alpha / denominator, d_alpha * -conc_i / ki ** 2, d_alpha / ki)
+
+
+def mm_noncompetitive_jacobian(substrate: np.ndarray, vmax: float = 1., km: float = 5., ki: float = 5.,
+                               conc_i: float = 5):
+    """
+    initial velocity for noncompetitive inhibitors and its partials with respect to vmax, km, ki and conc_i
+    """
+    alpha = 1 + (conc_i / ki)
+    saturation = km + substrate
+    fraction = substrate / (alpha * saturation)
+    v = vmax * fraction
+    d_alpha = -v / alpha
+    return _value_and_jacobian(v, fraction, -v / saturation, d_alpha * -conc_i / ki ** 2, d_alpha / ki)
+
+
+def mm_uncompetitive_jacobian(substrate: np.ndarray, vmax: float = 1., km: float = 5., ki: float = 5.,
+                              conc_i: float = 5.):
+    """
+    initial velocity for uncompetitive inhibitors and its partials with respect to vmax, km, ki and conc_i
+    """
+    alpha = 1 + (conc_i / ki)
+    denominator = km + (substrate * alpha)
+    fraction = substrate / denominator
+    v = vmax * fraction
+    d_alpha = -v * substrate / denominator
+    return _value_and_jacobian(v, fraction, -v / denominator, d_alpha * -conc_i / ki ** 2, d_alpha / ki)
+
+
+def lineweaver_burk_jacobian(inverse_substrate: np.ndarray, vmax: float, km: float):
+    """
+    1/v0 according to the Lineweaver-Burk transformation and its partials with respect to vmax and km
+    """
+    inverse_initial_velocity = ((km / vmax) * inverse_substrate) + (1 / vmax)
+    return _value_and_jacobian(inverse_initial_velocity, -inverse_initial_velocity / vmax, inverse_substrate / vmax)
+
+
+def lwb_competitive_jacobian(inverse_substrate: float, vmax: float = 1., km: float = 5.,
+                             ki: float = 5., conc_i: float = 5):
+    """
+    1/v0 for competitive inhibitors and its partials with respect to vmax, km, ki and conc_i
+    """
+    alpha = 1 + (conc_i / ki)
+    slope_term = inverse_substrate / vmax
+    y = (km * alpha * slope_term) + (1 / vmax)
+    d_alpha = km * slope_term
+    return _value_and_jacobian(y, -y / vmax, alpha * slope_term, d_alpha * -conc_i / ki ** 2, d_alpha / ki)
+
+
+def lwb_noncompetitive_jacobian(inverse_substrate: float, vmax: float = 1., km: float = 5.,
+                                ki: float = 5., conc_i: float = 5):
+    """
+    1/v0 for noncompetitive inhibitors and its partials with respect to vmax, km, ki and conc_i
+    """
+    alpha = 1 + (conc_i / ki)
+    d_alpha = ((km * inverse_substrate) + 1) / vmax
+    y = alpha * d_alpha
+    return _value_and_jacobian(y, -y / vmax, alpha * inverse_substrate / vmax, d_alpha * -conc_i / ki ** 2,
+                               d_alpha / ki)
+
+
+def lwb_uncompetitive_jacobian(inverse_substrate: float, vmax: float = 1., km: float = 5.,
+                               ki: float = 5., conc_i: float = 5):
+    """
+    1/v0 for uncompetitive inhibitors and its partials with respect to vmax, km, ki and conc_i
+    """
+    alpha = 1 + (conc_i / ki)
+    y = (km / vmax) * inverse_substrate + (alpha / vmax)
+    d_alpha = 1 / vmax
+    return _value_and_jacobian(y, -y / vmax, inverse_substrate / vmax, d_alpha * -conc_i / ki ** 2, d_alpha / ki)
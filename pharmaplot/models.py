@@ -0,0 +1,408 @@
+"""
+registry of model equations shared by the numpy code and the javascript callbacks
+
+every equation is written exactly once, as the return expression of its function in pharmaplot.mm or
+pharmaplot.receptors. the registry reads that expression and generates from it
+
+    - an in-place numpy kernel that evaluates into a preallocated output buffer (used by pharmaplot.grid)
+    - a javascript kernel for bokeh CustomJS callbacks (used by pharmaplot.callbacks)
+
+in both kernels every subexpression that does not depend on the independent variable (e.g. km*(1+(conc_i/ki))) is
+hoisted out of the per-point work and computed once per parameter set
+"""
+import ast
+import inspect
+import textwrap
+from typing import Callable, Union
+
+from pharmaplot import mm, receptors
+
+# numpy functions allowed inside model equations, with their javascript equivalent
+FUNCTIONS = {
+    'power': ('np.power', 'Math.pow'),
+    'exp': ('np.exp', 'Math.exp'),
+    'log': ('np.log', 'Math.log'),
+    'log10': ('np.log10', 'Math.log10'),
+    'sqrt': ('np.sqrt', 'Math.sqrt'),
+    'minimum': ('np.minimum', 'Math.min'),
+    'maximum': ('np.maximum', 'Math.max'),
+    'sign': ('np.sign', 'Math.sign'),
+}
+
+BINARY_OPERATORS = {
+    ast.Add: ('np.add', '+'),
+    ast.Sub: ('np.subtract', '-'),
+    ast.Mult: ('np.multiply', '*'),
+    ast.Div: ('np.divide', '/'),
+    ast.Pow: ('np.power', None),
+}
+
+
+def _equation(func: Callable) -> ast.expr:
+    """
+    return expression of a model function, with any intermediate assignments substituted in and the numeric
+    constants of its module (e.g. receptors.LN10) inlined
+
+    only straight-line bodies of the form `name = <expr>` ... `return <expr>` are supported
+    """
+    tree = ast.parse(textwrap.dedent(inspect.getsource(func)))
+    body = tree.body[0].body
+    arguments = {arg.arg for arg in tree.body[0].args.args}
+    assigned = {}
+
+    class Substitute(ast.NodeTransformer):
+        def visit_Name(self, node):
+            if node.id in assigned:
+                return assigned[node.id]
+            constant = func.__globals__.get(node.id)
+            if node.id not in arguments and isinstance(constant, (int, float)) and not isinstance(constant, bool):
+                return ast.Constant(value=float(constant))
+            return node
+
+        def visit_Attribute(self, node):
+            # np.power -> power
+            if isinstance(node.value, ast.Name) and node.value.id in ('np', 'numpy'):
+                return ast.Name(id=node.attr, ctx=ast.Load())
+            return self.generic_visit(node)
+
+    for statement in body:
+        if isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant):
+            continue  # docstring
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1 \
+                and isinstance(statement.targets[0], ast.Name):
+            assigned[statement.targets[0].id] = Substitute().visit(statement.value)
+        elif isinstance(statement, ast.Return):
+            return Substitute().visit(statement.value)
+        else:
+            break
+    raise ValueError(f'{func.__name__} is not a single-expression model and cannot be registered')
+
+
+def js_expression(node: Union[str, ast.AST], rename: Callable[[str], str] = str) -> str:
+    """
+    translate a (numpy) python expression into javascript
+
+    Parameters
+    ----------
+    node: Union[str, ast.AST]
+        python expression, as source code or ast
+
+    rename: Callable[[str], str]
+        maps each variable name in the expression to the javascript expression that replaces it
+
+    Returns
+    -------
+    js: str
+        equivalent javascript expression
+    """
+    if isinstance(node, str):
+        node = ast.parse(node, mode='eval').body
+    if isinstance(node, ast.Name):
+        return rename(node.id)
+    if isinstance(node, ast.Constant):
+        return repr(node.value)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return f'(-{js_expression(node.operand, rename)})'
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left = js_expression(node.left, rename)
+        right = js_expression(node.right, rename)
+        if isinstance(node.op, ast.Pow):
+            return f'Math.pow({left}, {right})'
+        return f'({left} {BINARY_OPERATORS[type(node.op)][1]} {right})'
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+        args = ', '.join(js_expression(arg, rename) for arg in node.args)
+        return f'{FUNCTIONS[node.func.id][1]}({args})'
+    raise ValueError(f'unsupported expression {ast.unparse(node)!r}')
+
+
+class Model:
+    """
+    a registered model equation
+
+    Parameters
+    ----------
+    function: Callable
+        the numpy model function; its first argument is the independent variable and every other argument is a
+        scalar parameter
+
+    jacobian: Callable
+        optional function with the same signature returning (value, partials), the partial derivatives with respect
+        to every parameter being stacked along the last axis in signature order
+    """
+
+    def __init__(self, function: Callable, jacobian: Callable = None):
+        signature = inspect.signature(function)
+        names = list(signature.parameters)
+
+        self.function = function
+        self.jacobian = jacobian
+        self.name = function.__name__
+        self.variable = names[0]
+        self.parameters = tuple(names[1:])
+        self.defaults = {name: p.default for name, p in signature.parameters.items()
+                         if p.default is not inspect.Parameter.empty}
+
+        self._equation = None
+        self._kernel = None
+        self._kernel_source = None
+        self._scratch = None
+
+    def __repr__(self):
+        return f'Model({self.name}({self.variable}, {", ".join(self.parameters)}))'
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # equation analysis
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def equation(self) -> ast.expr:
+        """ast of the model equation"""
+        if self._equation is None:
+            equation = _equation(self.function)
+            for node in ast.walk(equation):
+                if isinstance(node, ast.Name) and node.id not in self.parameters and node.id != self.variable \
+                        and node.id not in FUNCTIONS:
+                    raise ValueError(f'{self.name}: unknown name {node.id!r} in model equation')
+                if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name)
+                                                   or node.func.id not in FUNCTIONS):
+                    raise ValueError(f'{self.name}: unsupported call {ast.unparse(node)!r} in model equation')
+            self._equation = equation
+        return self._equation
+
+    def _depends_on_variable(self, node: ast.AST) -> bool:
+        return any(isinstance(n, ast.Name) and n.id == self.variable for n in ast.walk(node))
+
+    def _hoist(self):
+        """
+        split the equation into loop-invariant terms and the per-point expression
+
+        Returns
+        -------
+        hoisted, equation: tuple
+            hoisted = list of (name, ast) for every invariant term, in evaluation order
+            equation = per-point ast in which the invariant terms are replaced by their names
+        """
+        hoisted = {}
+        model = self
+
+        class Hoist(ast.NodeTransformer):
+            def generic_visit(self, node):
+                if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Call)) and not model._depends_on_variable(node):
+                    key = ast.dump(node)
+                    if key not in hoisted:
+                        hoisted[key] = (f't{len(hoisted)}', node)
+                    return ast.Name(id=hoisted[key][0], ctx=ast.Load())
+                return super().generic_visit(node)
+
+        equation = Hoist().visit(ast.parse(ast.unparse(self.equation), mode='eval').body)
+        return list(hoisted.values()), equation
+
+    @staticmethod
+    def _share(equation: ast.AST):
+        """
+        compute repeated per-point subexpressions (e.g. power(x, n) in the hill equation) once
+
+        Returns
+        -------
+        shared, equation: tuple
+            shared = list of (name, ast) for every repeated subexpression, in evaluation order (later ones may refer
+            to earlier ones); equation = the per-point ast in which they are replaced by their names
+        """
+        counts = {}
+
+        def count(node):
+            # the inside of a repeated subexpression only counts once, as it is computed once
+            key = ast.dump(node)
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] == 1:
+                for child in ast.iter_child_nodes(node):
+                    count(child)
+
+        count(equation)
+        shared = {}
+
+        class Share(ast.NodeTransformer):
+            def generic_visit(self, node):
+                # top down, so that the largest repeated subexpressions are shared (and the ones repeated within
+                # them too, computed first)
+                key = ast.dump(node)
+                if counts.get(key, 0) > 1 and isinstance(node, (ast.BinOp, ast.Call)) and node is not equation:
+                    if key not in shared:
+                        node = super().generic_visit(node)
+                        shared[key] = (f'u{len(shared)}', node)
+                    return ast.Name(id=shared[key][0], ctx=ast.Load())
+                return super().generic_visit(node)
+
+        equation = Share().visit(equation)
+        return list(shared.values()), equation
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # numpy kernel
+    # ------------------------------------------------------------------------------------------------------------------
+    def _build_kernel(self):
+        hoisted, equation = self._hoist()
+        shared, equation = self._share(equation)
+        lines = [f'{name} = {ast.unparse(node)}' for name, node in hoisted]
+        scratch = []
+
+        def operand(node, out, depth):
+            """evaluate node (into `out` if needed) and return the expression referring to its value"""
+            if isinstance(node, (ast.Name, ast.Constant)):
+                return ast.unparse(node)
+            if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+                lines.append(f'np.negative({operand(node.operand, out, depth)}, out={out})')
+                return out
+            if isinstance(node, ast.BinOp):
+                ufunc, left, right = BINARY_OPERATORS[type(node.op)][0], node.left, node.right
+                args = [left, right]
+            elif isinstance(node, ast.Call):
+                ufunc, args = FUNCTIONS[node.func.id][0], node.args
+            else:
+                raise ValueError(f'{self.name}: unsupported expression {ast.unparse(node)!r}')
+
+            # the first compound argument reuses `out`, any further ones need a scratch buffer
+            refs, target = [], out
+            for arg in args:
+                if isinstance(arg, (ast.Name, ast.Constant)):
+                    refs.append(ast.unparse(arg))
+                    continue
+                if target is None:
+                    if len(scratch) <= depth:
+                        scratch.append(f'scratch[{len(scratch)}]')
+                    target = scratch[depth]
+                    depth += 1
+                refs.append(operand(arg, target, depth))
+                target = None
+            lines.append(f'{ufunc}({", ".join(refs)}, out={out})')
+            return out
+
+        # every repeated subexpression is kept in a buffer of its own, after the temporaries
+        for name, node in shared:
+            result = operand(node, name, 0)
+            if result != name:
+                lines.append(f'{name}[...] = {result}')
+        result = operand(equation, 'out', 0)
+        if shared:
+            names = ', '.join(name for name, _ in shared)
+            lines.insert(len(hoisted), f'{names}, = scratch[{len(scratch)}:{len(scratch) + len(shared)}]')
+        if result != 'out':
+            lines.append(f'out[...] = {result}')
+
+        signature = ', '.join((self.variable,) + self.parameters)
+        body = '\n'.join(f'    {line}' for line in lines)
+        source = (f'def {self.name}({signature}, out, scratch=None):\n'
+                  f'    if scratch is None:\n'
+                  f'        scratch = [np.empty_like(out) for _ in range({len(scratch) + len(shared)})]\n'
+                  f'{body}\n'
+                  f'    return out\n')
+
+        import numpy as np
+        namespace = {'np': np, **{name: getattr(np, name) for name in FUNCTIONS}}
+        exec(compile(source, f'<pharmaplot.models kernel {self.name}>', 'exec'), namespace)
+        self._kernel = namespace[self.name]
+        self._kernel_source = source
+        self._scratch = len(scratch) + len(shared)
+
+    @property
+    def kernel(self) -> Callable:
+        """
+        in-place numpy kernel: kernel(x, *params, out, scratch=None) -> out
+
+        parameters may be arrays that broadcast against x; `scratch` is an optional list of :attr:`scratch` buffers
+        with the shape and dtype of `out`
+        """
+        if self._kernel is None:
+            self._build_kernel()
+        return self._kernel
+
+    @property
+    def kernel_source(self) -> str:
+        """generated python source of :attr:`kernel`"""
+        if self._kernel_source is None:
+            self._build_kernel()
+        return self._kernel_source
+
+    @property
+    def scratch(self) -> int:
+        """number of full-size scratch buffers :attr:`kernel` needs besides `out`"""
+        if self._scratch is None:
+            self._build_kernel()
+        return self._scratch
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # javascript kernel
+    # ------------------------------------------------------------------------------------------------------------------
+    def _js_expression(self, node: ast.AST, point: str) -> str:
+        return js_expression(node, lambda name: point if name == self.variable else name)
+
+    def js(self) -> str:
+        """
+        javascript kernel for CustomJS callbacks
+
+        the generated function has the signature `name(x, y, p)`: it reads the model parameters from the object `p`,
+        computes the loop-invariant terms once, and writes the model values for every element of the array `x`
+        directly into the (typed) array `y`
+        """
+        hoisted, equation = self._hoist()
+
+        shared, equation = self._share(equation)
+
+        lines = [f'function {self.name}(x, y, p) {{']
+        if self.parameters:
+            lines.append('    const ' + ', '.join(f'{name} = p.{name}' for name in self.parameters) + ';')
+        for name, node in hoisted:
+            lines.append(f'    const {name} = {self._js_expression(node, "xi")};')
+        lines.append('    for (let i = 0, n = x.length; i < n; i++) {')
+        lines.append('        const xi = x[i];')
+        for name, node in shared:
+            lines.append(f'        const {name} = {self._js_expression(node, "xi")};')
+        lines.append(f'        y[i] = {self._js_expression(equation, "xi")};')
+        lines.append('    }')
+        lines.append('}')
+        return '\n'.join(lines)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# registry
+# ----------------------------------------------------------------------------------------------------------------------
+MODELS = {}
+
+
+def register(function: Callable, jacobian: Callable = None) -> Model:
+    """add a model function (and optionally its analytic jacobian) to the registry and return its :class:`Model`"""
+    model = Model(function, jacobian)
+    MODELS[model.name] = model
+    return model
+
+
+def _unwrapped(function: Callable) -> Callable:
+    return getattr(function, '__wrapped__', function)
+
+
+def get_model(model: Union[str, Callable, Model]) -> Model:
+    """look up a registered model by name or by its function"""
+    if isinstance(model, Model):
+        return model
+    name = model if isinstance(model, str) else getattr(model, '__name__', None)
+    # compared unwrapped, as pharmaplot.instrument may have wrapped either reference
+    if name not in MODELS or (callable(model) and _unwrapped(MODELS[name].function) is not _unwrapped(model)):
+        raise KeyError(f'{model!r} is not a registered model')
+    return MODELS[name]
+
+
+for _function, _jacobian in ((mm.michaelis_menten, mm.michaelis_menten_jacobian),
+                             (mm.mm_competitive, mm.mm_competitive_jacobian),
+                             (mm.mm_noncompetitive, mm.mm_noncompetitive_jacobian),
+                             (mm.mm_uncompetitive, mm.mm_uncompetitive_jacobian),
+                             (mm.lineweaver_burk, mm.lineweaver_burk_jacobian),
+                             (mm.lwb_competitive, mm.lwb_competitive_jacobian),
+                             (mm.lwb_noncompetitive, mm.lwb_noncompetitive_jacobian),
+                             (mm.lwb_uncompetitive, mm.lwb_uncompetitive_jacobian),
+                             (receptors.specific_binding, receptors.specific_binding_jacobian),
+                             (receptors.specific_binding_hill, receptors.specific_binding_hill_jacobian),
+                             (receptors.competitive_binding, receptors.competitive_binding_jacobian),
+                             (receptors.four_parameter_logistic_equation,
+                              receptors.four_parameter_logistic_equation_jacobian)):
+    register(_function, _jacobian)
@@ -0,0 +1,282 @@
+"""
+smaller standalone html pages: deduplicated, derived and compactly encoded data arrays
+
+a saved bokeh page carries every ColumnDataSource column as a base64 float64 array, and the pages repeat the same
+arrays many times: the live sources and the faded baseline copies share their x (and initial y) values, and columns
+such as x_log or B/F are plain functions of other columns. :func:`optimize_html` rewrites a saved page so that
+
+- every distinct array is shipped once, however many sources use it
+- columns equal to log10 of another column, or to the ratio of two others, are recomputed in the browser
+- float arrays are stored as float32, or quantized to 16 bits where that is accurate enough
+
+the compacted arrays live in their own json script tag, and a small script placed before bokeh's embed code expands
+them back into the document json, so bokeh and the CustomJS callbacks see exactly the columns they always did
+"""
+import base64
+import html
+import itertools
+import json
+import re
+from typing import Dict, List
+
+import numpy as np
+
+ENCODINGS = ('float64', 'float32', 'uint16')
+
+# maximum error of a quantized array, relative to its range
+QUANTIZE_TOLERANCE = 1e-4
+
+PLACEHOLDER = '__pharmaplot_array_{}__'
+TABLE_ID = 'pharmaplot-arrays'
+
+_DOCS_JSON = re.compile(r'(<script type="application/json" id="([^"]+)">\s*)(.*?)(\s*</script>)', re.S)
+
+_DECODER = """<script type="text/javascript">
+(function() {
+    // expand the arrays compacted by pharmaplot.payload back into the bokeh document json
+    const table = JSON.parse(document.getElementById('%(table_id)s').textContent);
+    const decoded = {};
+    function bytes(text) {
+        const raw = atob(text), out = new Uint8Array(raw.length);
+        for (let i = 0; i < raw.length; i++) out[i] = raw.charCodeAt(i);
+        return out.buffer;
+    }
+    function encode(array) {
+        const raw = new Uint8Array(array.buffer, array.byteOffset, array.byteLength);
+        let text = '';
+        for (let i = 0; i < raw.length; i++) text += String.fromCharCode(raw[i]);
+        return btoa(text);
+    }
+    function values(k) {
+        if (decoded[k] !== undefined) return decoded[k];
+        const entry = table[k];
+        let out;
+        if (entry.f === 'log10') {
+            out = Float64Array.from(values(entry.a[0]), Math.log10);
+        } else if (entry.f === 'divide') {
+            const num = values(entry.a[0]), den = values(entry.a[1]);
+            out = Float64Array.from(num, (v, i) => v / den[i]);
+        } else if (entry.t === 'uint16') {
+            out = Float64Array.from(new Uint16Array(bytes(entry.b)), (v) => entry.lo + entry.sc * v);
+        } else {
+            out = new (entry.t === 'float32' ? Float32Array : Float64Array)(bytes(entry.b));
+        }
+        return decoded[k] = out;
+    }
+    function ndarray(k) {
+        const entry = table[k];
+        if (entry.t === 'float32' || entry.t === 'float64') {
+            return {__ndarray__: entry.b, dtype: entry.t, order: 'little', shape: entry.s};
+        }
+        const array = values(k);
+        return {__ndarray__: encode(array), dtype: 'float64', order: 'little', shape: [array.length]};
+    }
+    const docs = document.getElementById('%(docs_id)s');
+    docs.textContent = docs.textContent.replace(/"__pharmaplot_array_(\\d+)__"/g,
+                                                (match, k) => JSON.stringify(ndarray(+k)));
+})();
+</script>"""
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# arrays in the document json
+# ----------------------------------------------------------------------------------------------------------------------
+def _float_arrays(node, found: list):
+    """(container dict, key, values) of every float ndarray in the document json"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if isinstance(value, dict) and '__ndarray__' in value:
+                if value.get('dtype') in ('float32', 'float64') and value.get('order', 'little') == 'little':
+                    values = np.frombuffer(base64.b64decode(value['__ndarray__']), dtype=value['dtype'])
+                    found.append((node, key, values.reshape(value.get('shape', values.shape))))
+            else:
+                _float_arrays(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _float_arrays(value, found)
+    return found
+
+
+def _key(values: np.ndarray) -> tuple:
+    return values.dtype.str, values.shape, values.tobytes()
+
+
+def _same(a: np.ndarray, b: np.ndarray) -> bool:
+    with np.errstate(all='ignore'):
+        return a.shape == b.shape and a.size > 1 and bool(np.allclose(a, b, rtol=1e-9, atol=0., equal_nan=True))
+
+
+def _derivation(values: np.ndarray, siblings: Dict[str, np.ndarray], function: str):
+    """(function, operand names) if values are log10 of, or ('divide') the ratio of, sibling columns, else None"""
+    if function == 'log10':
+        for name, other in siblings.items():
+            if other.shape == values.shape and np.all(other > 0) and _same(values, np.log10(other)):
+                return 'log10', [name]
+        return None
+    for numerator, a in siblings.items():
+        for denominator, b in siblings.items():
+            if numerator != denominator and a.shape == b.shape == values.shape and np.all(b != 0):
+                if _same(values, a / b):
+                    return 'divide', [numerator, denominator]
+    return None
+
+
+def _quantizable(values: np.ndarray) -> bool:
+    """whether 16-bit uniform quantization keeps the array within tolerance; arrays spanning decades are not"""
+    if values.size < 2 or not np.all(np.isfinite(values)):
+        return False
+    lo, hi = float(values.min()), float(values.max())
+    if lo > 0 and hi / lo > 1e3:
+        return False
+    scale = (hi - lo) / 65535 or 1.
+    error = np.abs(lo + scale * np.rint((values - lo) / scale) - values).max()
+    return error <= QUANTIZE_TOLERANCE * max(hi - lo, abs(hi), abs(lo))
+
+
+def _entry(values: np.ndarray, encoding: str) -> dict:
+    if encoding == 'uint16' and _quantizable(values):
+        lo, hi = float(values.min()), float(values.max())
+        scale = (hi - lo) / 65535 or 1.
+        codes = np.rint((values - lo) / scale).astype('<u2')
+        return dict(b=base64.b64encode(codes.tobytes()).decode(), t='uint16', lo=lo, sc=scale, s=list(values.shape))
+    dtype = '<f8' if encoding == 'float64' else '<f4'
+    return dict(b=base64.b64encode(values.astype(dtype).tobytes()).decode(), t='float64' if encoding == 'float64'
+                else 'float32', s=list(values.shape))
+
+
+def compact_arrays(docs: dict, encoding: str = 'float32', derive: bool = True) -> List[dict]:
+    """
+    replace the float arrays of a bokeh document json (in place) by placeholders into a table of distinct arrays
+
+    Parameters
+    ----------
+    docs: dict
+        parsed document json of a standalone page
+
+    encoding: str
+        'float64' (lossless), 'float32' or 'uint16' (falls back to float32 for arrays it cannot represent)
+
+    derive: bool
+        recompute columns that are log10 of, or the ratio of, sibling columns in the browser
+
+    Returns
+    -------
+    table: List[dict]
+        the array table; entries hold encoded data (b, t, s, and lo, sc when quantized) or a derivation (f, a)
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'encoding must be one of {ENCODINGS}, not {encoding!r}')
+
+    # group columns by the data dict they belong to, so derived columns can refer to their siblings
+    containers = {}
+    for container, name, values in _float_arrays(docs, []):
+        containers.setdefault(id(container), (container, {}))[1][name] = values
+
+    # find the derived columns first, so that copies of them elsewhere in the document are derived as well. operands
+    # are never derived themselves, which keeps the derivations free of cycles. log10 columns are looked for before
+    # ratios: otherwise x could be taken for y / (y / x), leaving log10(x) nothing to be derived from
+    derivations, operand_keys = {}, set()
+    if derive:
+        for wanted, (_, columns) in itertools.product(('log10', 'divide'), containers.values()):
+            for name, values in columns.items():
+                key = _key(values)
+                if key in derivations or key in operand_keys:
+                    continue
+                siblings = {other: array for other, array in columns.items()
+                            if other != name and _key(array) not in derivations}
+                derivation = _derivation(values, siblings, wanted)
+                if derivation:
+                    function, operands = derivation
+                    derivations[key] = (function, [columns[operand] for operand in operands])
+                    operand_keys.update(_key(columns[operand]) for operand in operands)
+
+    table, index = [], {}
+
+    def stored(values: np.ndarray) -> int:
+        key = _key(values)
+        if key not in index:
+            if key in derivations:
+                function, operands = derivations[key]
+                entry = dict(f=function, a=[stored(operand) for operand in operands])
+            else:
+                entry = _entry(values, encoding)
+            index[key] = len(table)
+            table.append(entry)
+        return index[key]
+
+    for container, columns in containers.values():
+        for name, values in columns.items():
+            container[name] = PLACEHOLDER.format(stored(values))
+    return table
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# pages
+# ----------------------------------------------------------------------------------------------------------------------
+def optimize_html(page: str, encoding: str = 'float32', derive: bool = True):
+    """
+    compact the data arrays of a standalone bokeh page
+
+    Parameters
+    ----------
+    page: str
+        html of a page saved with bokeh's save() or output_file()/show()
+
+    encoding: str
+        'float64', 'float32' or 'uint16', see :func:`compact_arrays`
+
+    derive: bool
+        recompute derived columns in the browser
+
+    Returns
+    -------
+    page, report: tuple
+        page = the optimized html (unchanged if it has no arrays, was optimized before, or would not get smaller)
+        report = dict with the size in bytes before and after, and the number of arrays, distinct arrays and derived
+        columns
+    """
+    report = dict(before=len(page.encode()), after=len(page.encode()), arrays=0, stored=0, derived=0)
+    match = _DOCS_JSON.search(page)
+    if match is None or TABLE_ID in page:
+        return page, report
+
+    docs = json.loads(html.unescape(match.group(3)))
+    table = compact_arrays(docs, encoding, derive)
+    if not table:
+        return page, report
+
+    docs_json = html.escape(json.dumps(docs, separators=(',', ':'), ensure_ascii=False), quote=False)
+    table_json = html.escape(json.dumps(table, separators=(',', ':')), quote=False)
+    decoder = '\n'.join(line.strip() for line in _DECODER.splitlines() if not line.strip().startswith('//'))
+    replacement = (f'{match.group(1)}{docs_json}{match.group(4)}\n'
+                   f'<script type="application/json" id="{TABLE_ID}">{table_json}</script>\n'
+                   + decoder % dict(table_id=TABLE_ID, docs_id=match.group(2)))
+    optimized = page[:match.start()] + replacement + page[match.end():]
+    if len(optimized.encode()) >= report['before']:
+        return page, report
+
+    report.update(after=len(optimized.encode()), arrays=docs_json.count('__pharmaplot_array_'),
+                  stored=sum('b' in entry for entry in table), derived=sum('f' in entry for entry in table))
+    return optimized, report
+
+
+def optimize_file(path: str, encoding: str = 'float32', derive: bool = True) -> dict:
+    """optimize a saved page in place; returns the report of :func:`optimize_html` with the path added"""
+    with open(path, encoding='utf-8') as f:
+        page, report = optimize_html(f.read(), encoding, derive)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return dict(report, path=path)
+
+
+def format_report(reports: List[dict]) -> str:
+    """bytes before and after for every optimized page, as a text table"""
+    lines = []
+    for report in reports:
+        saved = 1 - report['after'] / report['before'] if report['before'] else 0.
+        lines.append(f'{report["before"]:>10,} -> {report["after"]:>10,} bytes ({saved:6.1%} smaller)  '
+                     f'{report["arrays"]:>3} arrays, {report["stored"]:>3} stored, {report["derived"]:>2} derived  '
+                     f'{report.get("path", "")}')
+    before, after = sum(r['before'] for r in reports), sum(r['after'] for r in reports)
+    lines.append(f'{before:>10,} -> {after:>10,} bytes in total')
+    return '\n'.join(lines)
@@ -0,0 +1,338 @@
+"""
+multi-plate dose-response pipeline: plate QC and four parameter logistic fits for a whole screening campaign
+
+plate-reader exports are read as a stream, one plate at a time, so memory use depends on the size of a plate and the
+number of plates in flight rather than on the size of the campaign. every plate is QC'd (Z'-factor and signal window
+from its control wells) and all of its compounds are fitted together with :func:`pharmaplot.fit.fit_batch` in a pool
+of worker processes. results are appended to csv tables as soon as each plate is done
+
+input files are csv (or tsv, by extension) with a header and one row per well::
+
+    plate,compound,log_conc,response
+    P0001,CPD-1,-9.0,98.2
+    ...
+    P0001,POS,,101.4
+    P0001,NEG,,2.3
+
+the rows of a plate must be contiguous, as in a plate-reader export. wells whose compound is the positive or negative
+control name are used for QC only. blank or failed wells (a response or compound concentration that is empty or not a
+finite number) are skipped, and counted in the QC table
+"""
+import csv
+import functools
+import itertools
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Sequence, Union
+
+import numpy as np
+
+from pharmaplot.fit import fit_batch
+
+MODEL = 'four_parameter_logistic_equation'
+
+RESULT_COLUMNS = ('plate', 'compound', 'top', 'bottom', 'hillslope', 'logec50', 'top_stderr', 'bottom_stderr',
+                  'hillslope_stderr', 'logec50_stderr', 'converged', 'iterations', 'sse')
+QC_COLUMNS = ('plate', 'compounds', 'skipped_wells', 'positive_mean', 'negative_mean', 'z_prime', 'signal_window')
+
+
+class Plate(NamedTuple):
+    """
+    the data of one plate
+
+    Attributes
+    ----------
+    name: str
+        plate identifier
+
+    compounds: list
+        compound names, one per row of x and y
+
+    x, y: np.ndarray
+        log concentrations and responses, shape (compounds, max points per compound), padded with nan
+
+    positive, negative: np.ndarray
+        responses of the positive and negative control wells
+
+    skipped: int
+        number of blank or failed wells left out of x, y and the controls
+    """
+    name: str
+    compounds: list
+    x: np.ndarray
+    y: np.ndarray
+    positive: np.ndarray
+    negative: np.ndarray
+    skipped: int = 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# input
+# ----------------------------------------------------------------------------------------------------------------------
+def _rows(paths: Iterable[str]) -> Iterator[dict]:
+    for path in paths:
+        with open(path, newline='') as f:
+            yield from csv.DictReader(f, delimiter='\t' if path.endswith(('.tsv', '.tab')) else ',')
+
+
+def _number(text: str) -> float:
+    """the value of a csv field, nan when it is blank or not a number"""
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _plate(name: str, rows: Iterable[dict], positive: str, negative: str) -> Plate:
+    wells, controls, skipped = {}, {positive: [], negative: []}, 0
+    for row in rows:
+        compound, response = row['compound'], _number(row['response'])
+        if compound in controls:
+            point = (response,)
+        else:
+            point = (_number(row['log_conc']), response)
+        if not np.isfinite(point).all():
+            skipped += 1
+        elif compound in controls:
+            controls[compound].append(response)
+        else:
+            wells.setdefault(compound, []).append(point)
+
+    compounds = list(wells)
+    width = max((len(points) for points in wells.values()), default=0)
+    x = np.full((len(compounds), width), np.nan)
+    y = np.full((len(compounds), width), np.nan)
+    for i, points in enumerate(wells.values()):
+        x[i, :len(points)], y[i, :len(points)] = zip(*points)
+    return Plate(name, compounds, x, y, np.array(controls[positive]), np.array(controls[negative]), skipped)
+
+
+def read_plates(paths: Union[str, Sequence[str]], positive: str = 'POS', negative: str = 'NEG') -> Iterator[Plate]:
+    """
+    stream the plates of one or more plate-reader exports, one :class:`Plate` at a time
+
+    Parameters
+    ----------
+    paths: Union[str, Sequence[str]]
+        csv/tsv files, read in order
+
+    positive, negative: str
+        compound names of the positive (maximum signal) and negative (minimum signal) control wells
+    """
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    for name, rows in itertools.groupby(_rows(paths), key=lambda row: row['plate']):
+        yield _plate(name, rows, positive, negative)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# QC and fitting
+# ----------------------------------------------------------------------------------------------------------------------
+def plate_qc(positive: np.ndarray, negative: np.ndarray) -> Dict[str, float]:
+    """
+    Z'-factor and signal window of a plate from its control wells
+
+    Z' = 1 - 3 (sd_pos + sd_neg) / |mean_pos - mean_neg|, and the signal window is
+    (|mean_pos - mean_neg| - 3 (sd_pos + sd_neg)) / sd_pos; both are nan when there are fewer than two wells of
+    either control
+
+    Parameters
+    ----------
+    positive, negative: np.ndarray
+        responses of the positive and negative control wells
+
+    Returns
+    -------
+    qc: Dict[str, float]
+        positive_mean, negative_mean, z_prime and signal_window
+    """
+    positive, negative = np.asarray(positive, dtype=float), np.asarray(negative, dtype=float)
+    qc = dict(positive_mean=np.nan, negative_mean=np.nan, z_prime=np.nan, signal_window=np.nan)
+    if positive.size:
+        qc['positive_mean'] = float(positive.mean())
+    if negative.size:
+        qc['negative_mean'] = float(negative.mean())
+    if positive.size < 2 or negative.size < 2:
+        return qc
+
+    spread = 3 * (positive.std(ddof=1) + negative.std(ddof=1))
+    separation = abs(qc['positive_mean'] - qc['negative_mean'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        qc['z_prime'] = float(1 - spread / np.float64(separation))
+        qc['signal_window'] = float((separation - spread) / np.float64(positive.std(ddof=1)))
+    return qc
+
+
+@functools.lru_cache(maxsize=None)
+def _worker_store(path: str):
+    """one connection to the results store per worker process, kept open for every plate it fits"""
+    from pharmaplot.store import FitStore
+    return FitStore(path)
+
+
+def process_plate(plate: Plate, store=None):
+    """
+    QC and fit one plate; runs in the worker processes
+
+    Parameters
+    ----------
+    plate: Plate
+        the plate
+
+    store: Union[str, pharmaplot.store.FitStore]
+        results store, or the path of one; compounds whose data were fitted before are taken from it instead
+
+    Returns
+    -------
+    qc_row, result_rows: tuple
+        one row for the QC table and one row per compound for the results table
+    """
+    qc_row = dict(plate=plate.name, compounds=len(plate.compounds), skipped_wells=plate.skipped,
+                  **plate_qc(plate.positive, plate.negative))
+    if not plate.compounds:
+        return qc_row, []
+
+    if store is None:
+        fit, fitted = fit_batch(MODEL, plate.x, plate.y), None
+    else:
+        from pharmaplot.store import fit_stored
+        fit, fitted = fit_stored(_worker_store(store) if isinstance(store, str) else store, MODEL, plate.x, plate.y,
+                                 labels=[(plate.name, compound) for compound in plate.compounds])
+    qc_row['fitted'] = len(plate.compounds) if fitted is None else int(fitted.sum())
+    result_rows = []
+    for i, compound in enumerate(plate.compounds):
+        row = dict(plate=plate.name, compound=compound)
+        row.update(zip(fit.names, fit.params[i]))
+        row.update((f'{name}_stderr', value) for name, value in zip(fit.names, fit.stderr[i]))
+        row.update(converged=bool(fit.converged[i]), iterations=int(fit.iterations[i]), sse=fit.sse[i])
+        result_rows.append(row)
+    return qc_row, result_rows
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# output
+# ----------------------------------------------------------------------------------------------------------------------
+class _Table:
+    """csv table that rows are appended to; the header is written only when the file is new or empty"""
+
+    def __init__(self, path: str, columns: Sequence[str]):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        if new:
+            self.writer.writeheader()
+
+    def append(self, rows: List[dict]):
+        self.writer.writerows({key: f'{value:.6g}' if isinstance(value, float) else value
+                               for key, value in row.items()} for row in rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run_pipeline(paths: Union[str, Sequence[str]],
+                 output: str,
+                 qc_output: str = None,
+                 workers: int = None,
+                 max_in_flight: int = None,
+                 positive: str = 'POS',
+                 negative: str = 'NEG',
+                 cache_dir: str = None,
+                 store: str = None) -> Dict[str, float]:
+    """
+    QC and fit every plate of a campaign, appending the results to csv tables
+
+    Parameters
+    ----------
+    paths: Union[str, Sequence[str]]
+        plate-reader exports, see the module docstring for the format
+
+    output: str
+        csv file the fit results are appended to, one row per compound
+
+    qc_output: str
+        csv file the plate QC is appended to, one row per plate; defaults to output with a '.qc.csv' suffix
+
+    workers: int
+        number of worker processes; defaults to the number of cpus. with 1 the plates are processed in this process
+
+    max_in_flight: int
+        maximum number of plates read but not yet written, which bounds the memory use; defaults to 2 * workers
+
+    positive, negative: str
+        compound names of the control wells
+
+    cache_dir: str
+        read the exports through the columnar cache of pharmaplot.ingest in this directory, which also accepts
+        concentrations with units and xlsx exports; by default the csv rows are parsed on every run
+
+    store: str
+        keep the fits in this pharmaplot.store database, so that a re-run only fits compounds whose data are new or
+        changed
+
+    Returns
+    -------
+    summary: Dict[str, float]
+        number of plates and compounds, how many compounds were fitted (rather than taken from the store), how many
+        fits converged, how many plates passed QC (Z' >= 0.5) and how many blank or failed wells were skipped, the
+        elapsed time in seconds and the throughput
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    qc_output = qc_output or os.path.splitext(output)[0] + '.qc.csv'
+    if cache_dir is None:
+        plates = read_plates(paths, positive, negative)
+    else:
+        from pharmaplot import ingest
+        plates = ingest.read_plates(paths, positive, negative, cache_dir)
+    summary = dict(plates=0, compounds=0, fitted=0, converged=0, passed_qc=0, skipped_wells=0)
+
+    results, qc = _Table(output, RESULT_COLUMNS), _Table(qc_output, QC_COLUMNS)
+    start = time.perf_counter()
+
+    def write(qc_row, result_rows):
+        summary['fitted'] += qc_row.pop('fitted', 0)
+        qc.append([qc_row])
+        results.append(result_rows)
+        summary['plates'] += 1
+        summary['compounds'] += len(result_rows)
+        summary['converged'] += sum(row['converged'] for row in result_rows)
+        summary['passed_qc'] += bool(qc_row['z_prime'] >= 0.5)
+        summary['skipped_wells'] += qc_row['skipped_wells']
+
+    try:
+        if workers == 1:
+            if store is not None:
+                from pharmaplot.store import FitStore
+                store = FitStore(store)
+            for plate in plates:
+                write(*process_plate(plate, store))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # plates are submitted in order and written in order, never more than max_in_flight at a time
+                in_flight = deque()
+                for plate in plates:
+                    in_flight.append(pool.submit(process_plate, plate, store))
+                    if len(in_flight) >= max_in_flight:
+                        write(*in_flight.popleft().result())
+                while in_flight:
+                    write(*in_flight.popleft().result())
+    finally:
+        results.close()
+        qc.close()
+        if store is not None and not isinstance(store, str):
+            store.close()
+
+    summary['seconds'] = time.perf_counter() - start
+    summary['plates_per_second'] = summary['plates'] / summary['seconds'] if summary['seconds'] else np.inf
+    return summary
+
+
+def format_summary(summary: Dict[str, float]) -> str:
+    """one-paragraph text summary of a :func:`run_pipeline` run"""
+    skipped = f', {summary["skipped_wells"]} blank or failed wells skipped' if summary.get('skipped_wells') else ''
+    return (f'{summary["plates"]} plates ({summary["passed_qc"]} with Z\' >= 0.5), {summary["compounds"]} compounds '
+            f'({summary["fitted"]} fitted, {summary["converged"]} fits converged{skipped}) in '
+            f'{summary["seconds"]:.2f} s ({summary["plates_per_second"]:.1f} plates/s)')
@@ -1,9 +1,23 @@
 """
 equations for receptor theory topics
 """
+import numpy as np
 from numpy import array, power
 from typing import Union
 
+from pharmaplot.mm import _value_and_jacobian
+
+# ln(10), for 10**z = e**(LN10*z)
+LN10 = 2.302585092994046
+
+# largest exponent passed to np.exp (and largest power in the hill equation, e**MAX_EXPONENT): e**80 still fits in
+# float32, and 1/(1 + e**80) is below 1e-34
+MAX_EXPONENT = 80.
+
+# concentrations below this are raised to it inside the hill equation: far below any physical concentration, yet
+# kd/MIN_CONCENTRATION still fits in float32 for any kd below 1e8
+MIN_CONCENTRATION = 1e-30
+
 
 def specific_binding(l: Union[float, array], bmax: float, kd: float):
     """
@@ -30,7 +44,8 @@ def specific_binding(l: Union[float, array], bmax: float, kd: float):
 
 def scatchard(l: Union[float, array], bmax: float, kd: float):
     """
-    scatchard transformation of specific binding isotherm; calculates B/F and B
+    scatchard transformation of specific binding isotherm; calculates B/F and B. pharmaplot.transforms gives the
+    binding curve together with this and its other transforms from one evaluation
 
     Parameters
     ----------
@@ -78,7 +93,12 @@ def specific_binding_hill(l: Union[float, array], bmax: float, kd: float, hill_c
         theoretical specific binding
 
     """
-    return ((l**hill_coef)*bmax)/((l**hill_coef) + (kd**hill_coef))
+    # l**n / (l**n + kd**n) as 1/(1 + (kd/l)**n), so that molar concentrations raised to steep hill coefficients
+    # neither underflow (0/0 in float32) nor overflow. l is kept above kd*e**(-MAX_EXPONENT/n), which bounds the power
+    # by e**MAX_EXPONENT while changing the result by less than 1e-34 of bmax, and above MIN_CONCENTRATION, as that
+    # bound underflows for low hill coefficients; l = 0 is never divided by, and sign(l) makes the curve 0 there
+    ratio = kd/np.maximum(l, kd*np.exp(-MAX_EXPONENT/hill_coef) + MIN_CONCENTRATION)
+    return bmax/(1 + power(ratio, hill_coef))*np.sign(l)
 
 
 def competitive_binding(log_inhibitor: Union[float, array],
@@ -111,7 +131,10 @@ def competitive_binding(log_inhibitor: Union[float, array],
     specific binding of radioligand + unlabeled competitior
 
     """
-    return nonspecific + (total - nonspecific)/(1 + power(10, nH*(pIC50 + log_inhibitor)))
+    # 1/(1 + 10**z) as 1/(1 + e**t) with t = ln(10)*z clamped at MAX_EXPONENT, which changes the result by less than
+    # 1e-34 of the span where it applies
+    t = np.minimum((pIC50 + log_inhibitor)*(LN10*nH), MAX_EXPONENT)
+    return nonspecific + (total - nonspecific)/(1 + np.exp(t))
 
 
 def four_parameter_logistic_equation(log_cpnd: Union[float, array],
@@ -121,7 +144,91 @@ def four_parameter_logistic_equation(log_cpnd: Union[float, array],
                                      logec50: float):
     """
     four parameter logistic equation set up to take in log cpnd data
+
+    the logistic 1/(1 + 10**z) is evaluated as 1/(1 + e**t) with t = ln(10)*z clamped at MAX_EXPONENT, so that steep
+    slopes and wide concentration ranges cannot overflow (e**80 still fits in float32; the clamp changes the response
+    by less than 1e-34 of the span). float32 inputs stay float32
     """
-    response = bottom + ((top - bottom) / (1 + 10 ** ((logec50 - log_cpnd) * hillslope)))
+    t = np.minimum((logec50 - log_cpnd) * (LN10 * hillslope), MAX_EXPONENT)
+    response = bottom + (top - bottom) / (1 + np.exp(t))
 
     return response
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# analytic jacobians, returned as in pharmaplot.mm
+# ----------------------------------------------------------------------------------------------------------------------
+def _logistic(t):
+    """1/(1 + e**t) without overflow, as in competitive_binding and four_parameter_logistic_equation"""
+    return 1 / (1 + np.exp(np.minimum(t, MAX_EXPONENT)))
+
+
+def specific_binding_jacobian(l: Union[float, array], bmax: float, kd: float):
+    """
+    specific binding isotherm and its partial derivatives
+
+    Parameters
+    ----------
+    l: Union[float, array]
+        free ligand concentration
+
+    bmax: float
+        maximum specific binding
+
+    kd: float
+        dissociation equilibrium constant
+
+    Returns
+    -------
+    specific_binding, jacobian: tuple
+        specific_binding = theoretical specific binding
+        jacobian = [dB/dbmax, dB/dkd] stacked along the last axis
+    """
+    denominator = l + kd
+    occupancy = l / denominator
+    b = bmax * occupancy
+    return _value_and_jacobian(b, occupancy, -b / denominator)
+
+
+def specific_binding_hill_jacobian(l: Union[float, array], bmax: float, kd: float, hill_coef: float):
+    """
+    specific binding with hill slope and its partials with respect to bmax, kd and hill_coef
+    """
+    ratio = kd / np.maximum(l, kd * np.exp(-MAX_EXPONENT / hill_coef) + MIN_CONCENTRATION)
+    occupancy = 1 / (1 + power(ratio, hill_coef)) * np.sign(l)
+    b = bmax * occupancy
+    free_fraction = b * (1 - occupancy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d_hill = np.where(l > 0, free_fraction * (np.log(l) - np.log(kd)), 0.)
+    return _value_and_jacobian(b, occupancy, -free_fraction * hill_coef / kd, d_hill)
+
+
+def competitive_binding_jacobian(log_inhibitor: Union[float, array],
+                                 nonspecific: float,
+                                 total: float,
+                                 pIC50: float,
+                                 nH: float):
+    """
+    competitive binding curve and its partials with respect to nonspecific, total, pIC50 and nH
+    """
+    fraction = _logistic((pIC50 + log_inhibitor) * (LN10 * nH))
+    span = total - nonspecific
+    # d(fraction)/d(exponent), shared by the pIC50 and nH partials
+    d_exponent = -span * LN10 * fraction * (1 - fraction)
+    return _value_and_jacobian(nonspecific + span * fraction, 1 - fraction, fraction, d_exponent * nH,
+                               d_exponent * (pIC50 + log_inhibitor))
+
+
+def four_parameter_logistic_equation_jacobian(log_cpnd: Union[float, array],
+                                              top: float,
+                                              bottom: float,
+                                              hillslope: float,
+                                              logec50: float):
+    """
+    four parameter logistic equation and its partials with respect to top, bottom, hillslope and logec50
+    """
+    fraction = _logistic((logec50 - log_cpnd) * (LN10 * hillslope))
+    span = top - bottom
+    d_exponent = -span * LN10 * fraction * (1 - fraction)
+    return _value_and_jacobian(bottom + span * fraction, fraction, 1 - fraction, d_exponent * (logec50 - log_cpnd),
+                               d_exponent * hillslope)
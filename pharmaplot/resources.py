@@ -0,0 +1,121 @@
+"""
+one shared, content-hashed BokehJS bundle for a whole site of generated pages
+
+standalone pages load BokehJS from the CDN, one script per component, and every page names them again. in site mode
+the components used by any page are concatenated into a single local file whose name carries the bokeh version and a
+hash of its content (e.g. static/bokeh-2.4.3.0123456789ab.min.js), and every page's CDN script tags are replaced by
+one tag referring to it. browsers then fetch the runtime once for the whole site and can cache it indefinitely, and
+the pages work without network access
+"""
+import glob
+import hashlib
+import os
+import re
+from typing import List, Sequence, Tuple
+
+STATIC_DIR = 'static'
+
+# bokeh's own load order
+COMPONENTS = ('bokeh', 'bokeh-gl', 'bokeh-widgets', 'bokeh-tables', 'bokeh-mathjax')
+
+_CDN_SCRIPT = re.compile(r'[ \t]*<script type="text/javascript" src="[^"]*?/(bokeh(?:-[a-z]+)?)-\d[^"/]*?\.min\.js"'
+                         r'[^>]*></script>\n?')
+_BUNDLE_SCRIPT = re.compile(r'[ \t]*<script type="text/javascript" src="[^"]*" data-bokeh-components="([^"]*)">'
+                            r'</script>\n?')
+_SOURCE_MAP = re.compile(r'^//# sourceMappingURL=.*$', re.M)
+
+
+def page_components(page: str) -> List[str]:
+    """the BokehJS components a page loads, from its CDN script tags or its bundle tag"""
+    components = _CDN_SCRIPT.findall(page)
+    for listed in _BUNDLE_SCRIPT.findall(page):
+        components.extend(listed.split())
+    return [component for component in COMPONENTS if component in components]
+
+
+def bundle(components: Sequence[str]) -> Tuple[str, bytes]:
+    """file name and content of the concatenated, content-hashed BokehJS bundle for the given components"""
+    import bokeh
+    from bokeh.util.paths import bokehjsdir
+
+    parts = []
+    for component in COMPONENTS:
+        if component in components:
+            with open(os.path.join(bokehjsdir(), 'js', f'{component}.min.js'), encoding='utf-8') as f:
+                # the source maps are not shipped, so drop the references to them
+                parts.append(_SOURCE_MAP.sub('', f.read()).rstrip() + '\n')
+    content = ''.join(parts).encode()
+    return f'bokeh-{bokeh.__version__}.{hashlib.sha256(content).hexdigest()[:12]}.min.js', content
+
+
+def write_bundle(output_dir: str, components: Sequence[str]) -> str:
+    """
+    write the BokehJS bundle for the given components into output_dir (if not already there)
+
+    Returns
+    -------
+    path: str
+        path of the bundle relative to output_dir
+    """
+    name, content = bundle(components)
+    path = os.path.join(STATIC_DIR, name)
+    full_path = os.path.join(output_dir, path)
+    if not os.path.exists(full_path):
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(full_path + '.tmp', full_path)
+    return path
+
+
+def link_page(page: str, src: str, components: Sequence[str]) -> str:
+    """replace a page's BokehJS script tags (CDN or an earlier bundle) by a single tag for the bundle at src"""
+    tag = f'    <script type="text/javascript" src="{src}" data-bokeh-components="{" ".join(components)}"></script>\n'
+    first = min([m.start() for m in _CDN_SCRIPT.finditer(page)] + [m.start() for m in _BUNDLE_SCRIPT.finditer(page)],
+                default=None)
+    if first is None:
+        return page
+    stripped = _BUNDLE_SCRIPT.sub('', _CDN_SCRIPT.sub('', page[first:]))
+    return page[:first] + tag + stripped
+
+
+def link_site(output_dir: str, pages: Sequence[str]) -> dict:
+    """
+    make every page load BokehJS from one shared bundle in output_dir, and remove bundles no page uses any more
+
+    Parameters
+    ----------
+    output_dir: str
+        site directory; the bundle goes into its static/ subdirectory
+
+    pages: Sequence[str]
+        html files of the site
+
+    Returns
+    -------
+    report: dict
+        bundle path (relative to output_dir), its size in bytes, its components and the number of pages linked
+    """
+    texts = {}
+    for page in pages:
+        with open(page, encoding='utf-8') as f:
+            texts[page] = f.read()
+    components = sorted({c for text in texts.values() for c in page_components(text)}, key=COMPONENTS.index)
+    if not components:
+        return dict(bundle=None, bytes=0, components=[], pages=0)
+
+    path = write_bundle(output_dir, components)
+    linked = 0
+    for page, text in texts.items():
+        src = os.path.relpath(os.path.join(output_dir, path), os.path.dirname(os.path.abspath(page)))
+        new = link_page(text, src.replace(os.sep, '/'), components)
+        if new != text:
+            with open(page, 'w', encoding='utf-8') as f:
+                f.write(new)
+        linked += new != text or path in text
+
+    for stale in glob.glob(os.path.join(output_dir, STATIC_DIR, 'bokeh-*.min.js')):
+        if os.path.basename(stale) != os.path.basename(path):
+            os.remove(stale)
+    size = os.path.getsize(os.path.join(output_dir, path))
+    return dict(bundle=path, bytes=size, components=components, pages=linked)
@@ -0,0 +1,260 @@
+"""
+adaptive sampling of model curves: the fewest x values for which the drawn polyline stays within a pixel tolerance
+
+a curve drawn through n points is a polyline, so uniform grids waste points where the curve is flat and are too coarse
+where it is steep (e.g. dose response curves with high hill coefficients). :func:`adaptive_x` estimates from a fine
+pilot grid how far apart the points may be everywhere for the polyline to stay within a tolerance of the curve, in
+screen pixels of the figure, and spreads the points accordingly in the sampling scale (log or linear, as the x entry of
+a spec). every interval is then checked against the curve and split where it still leaves the tolerance. all the
+curves of a parameter range are sampled at once (see :func:`parameter_sets`), so one x grid serves every slider state
+of a page::
+
+    x = adaptive_x(receptors.four_parameter_logistic_equation, -9, -3, scale='linear', y_range=(-5, 205),
+                   **parameter_sets(sliders, dict(top='top', bottom='bottom', hillslope='hill', logec50='-ec50')))
+
+the curves are evaluated with the kernels of :func:`pharmaplot.grid.evaluate_grid`; :func:`adaptive_curves` also
+returns them, for batch rendering of many curves (e.g. fitted dose responses) on one shared grid
+"""
+import itertools
+from typing import Callable, Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+from pharmaplot.grid import evaluate_grid
+
+# largest distance in pixels between the drawn polyline and the curve
+TOLERANCE = 0.5
+
+# points of the pilot grid the spacing of the curves is estimated from, and the most points returned
+PILOT_POINTS = 1024
+MAX_POINTS = 2000
+
+# slider states sampled from the range of a page's sliders by default
+MAX_SETS = 500
+
+# curves whose pilot values are processed at a time
+_BLOCK = 256
+
+# positions within an interval where the curve is compared with the chord; more than the midpoint, so that a
+# transition centred in the interval (where the midpoint lies on the chord) is not missed
+_PROBES = np.array([0.25, 0.5, 0.75])
+
+
+def _halton(n: int, dimensions: int) -> np.ndarray:
+    """the first n points of the halton sequence in [0, 1) ** dimensions, shape (n, dimensions)"""
+    primes = [p for p in range(2, 1000) if all(p % q for q in range(2, int(p ** 0.5) + 1))][:dimensions]
+    points = np.zeros((n, dimensions))
+    for dimension, base in enumerate(primes):
+        index, fraction = np.arange(1, n + 1), 1.
+        while index.any():
+            fraction /= base
+            points[:, dimension] += fraction * (index % base)
+            index //= base
+    return points
+
+
+def parameter_sets(sliders: dict, params: Dict[str, str], samples: int = MAX_SETS) -> Dict[str, np.ndarray]:
+    """
+    model parameter values over the range of a set of sliders, for :func:`adaptive_x` (as zip mode arrays)
+
+    the slider states are every combination of the start, starting value and end of the sliders, and `samples` states
+    spread evenly over the whole range (a halton sequence), so that every slider takes many distinct values
+
+    Parameters
+    ----------
+    sliders: dict
+        slider name -> slider, a dict with start, end and value (as in a spec) or a bokeh Slider
+
+    params: Dict[str, str]
+        model parameter -> python expression in the slider names, or a constant
+
+    samples: int
+        number of states spread over the range. the tolerance of :func:`adaptive_x` holds for the sampled states, and
+        may be exceeded a little between them
+
+    Returns
+    -------
+    params: Dict[str, np.ndarray]
+        one array of values per model parameter, all of the same length
+    """
+    def field(slider, key):
+        return slider[key] if isinstance(slider, dict) else getattr(slider, key)
+
+    bounds = np.array([[field(slider, 'start'), field(slider, 'end')] for slider in sliders.values()]).reshape(-1, 2)
+    corners = list(itertools.product(*([field(slider, key) for key in ('start', 'value', 'end')]
+                                       for slider in sliders.values())))
+    corners = np.array(corners, dtype=float).reshape(len(corners), len(sliders))
+    spread = bounds[:, 0] + _halton(samples, len(sliders)) * (bounds[:, 1] - bounds[:, 0])
+    states = dict(zip(sliders, np.concatenate([corners, spread]).T))
+    size = corners.shape[0] + samples
+    return {name: np.broadcast_to(np.asarray(eval(str(expression), {'np': np, '__builtins__': {}}, states), float),
+                                  (size,)) for name, expression in params.items()}
+
+
+def _distance(u: np.ndarray, y: np.ndarray, uq: np.ndarray, yq: np.ndarray) -> np.ndarray:
+    """
+    distance in pixels of the probes (uq, yq) from the chords of their intervals
+
+    u, y have the screen coordinates of the interval ends with shape (curves, intervals, 2); uq, yq those of the probes
+    with shape (curves, intervals, probes). undefined values (e.g. a pole) count as within the tolerance
+    """
+    du, dy = (u[..., 1] - u[..., 0])[..., None], (y[..., 1] - y[..., 0])[..., None]
+    cross = du * (yq - y[..., :1]) - dy * (uq - u[..., :1])
+    length = np.hypot(du, dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = np.where(length > 0, np.abs(cross) / length, np.hypot(uq - u[..., :1], yq - y[..., :1]))
+    return np.nan_to_num(distance, nan=0.)
+
+
+def adaptive_curves(model: Callable,
+                    start: float,
+                    end: float,
+                    scale: str = 'log',
+                    tolerance: float = TOLERANCE,
+                    width: float = 600,
+                    height: float = 400,
+                    x_range: Sequence[float] = None,
+                    y_range: Sequence[float] = None,
+                    log_axis: bool = False,
+                    pilot: int = PILOT_POINTS,
+                    max_points: int = MAX_POINTS,
+                    mode: str = 'zip',
+                    dtype=np.float64,
+                    **params) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    sample a model over [start, end] with as few points as the pixel tolerance allows
+
+    Parameters
+    ----------
+    model: Callable
+        model function from pharmaplot.mm or pharmaplot.receptors, e.g. receptors.specific_binding_hill
+
+    start, end: float
+        the sampled range; exponents of 10 for scale 'log' (as for np.logspace), x values for scale 'linear'
+
+    scale: str
+        'log' or 'linear', the spacing of the starting grid and of the splits
+
+    tolerance: float
+        largest distance in pixels between the polyline through the points and any of the curves
+
+    width, height: float
+        size of the plot area in pixels
+
+    x_range, y_range: Sequence[float]
+        the axis ranges of the figure; by default the sampled range and the range of the curves. parts of the curves
+        outside x_range, or far above or below y_range, are not refined
+
+    log_axis: bool
+        whether the curves are drawn against log10(x) (a log x axis) rather than x
+
+    pilot, max_points: int
+        points of the pilot grid the spacing is estimated from (features narrower than its step may be missed), and
+        the most points returned
+
+    mode, dtype, params:
+        as for :func:`pharmaplot.grid.evaluate_grid`; every curve of the parameter grid is kept within the tolerance
+
+    Returns
+    -------
+    x, curves: tuple
+        x = the sorted sample points; curves = the model values, shape grid_shape + x.shape
+    """
+    if scale not in ('log', 'linear'):
+        raise ValueError(f"scale must be 'log' or 'linear', not {scale!r}")
+
+    def to_x(s):
+        return 10 ** s if scale == 'log' else s
+
+    def to_u(x):
+        return np.log10(x) if log_axis else x
+
+    def evaluate(s):
+        with np.errstate(all='ignore'):
+            values = evaluate_grid(model, to_x(s), mode=mode, dtype=dtype, **params)
+        return values.reshape(-1, s.size).astype(np.float64), values.shape[:-1]
+
+    # a fine pilot grid gives the range of the curves and the spacing they need
+    pilot_s = np.linspace(start, end, pilot)
+    pilot_curves, grid_shape = evaluate(pilot_s)
+
+    x_lo, x_hi = sorted(x_range or (to_u(to_x(start)), to_u(to_x(end))))
+    if y_range is None:
+        finite = pilot_curves[np.isfinite(pilot_curves)]
+        y_range = (finite.min(), finite.max()) if finite.size else (0., 1.)
+    y_lo, y_hi = min(y_range), max(y_range)
+    x_scale = width / (abs(x_hi - x_lo) or 1.)
+    y_scale = height / ((y_hi - y_lo) or 1.)
+    # curves far above or below the visible range only need to leave the plot in the right direction
+    margin = y_hi - y_lo or 1.
+
+    def screen(s, y):
+        with np.errstate(all='ignore'):
+            return to_u(to_x(s)) * x_scale, y * y_scale
+
+    # a chord of length h (in s) leaves the curve by about h**2 * |P''| / 8 pixels, P'' being the part of the second
+    # derivative of the screen position normal to the curve. the points are spread so that every interval just meets
+    # the tolerance for the curve needing the finest spacing there (the second differences of the pilot grid are
+    # P'' * step**2, so a pilot step needs sqrt(second difference / (8 * tolerance)) intervals)
+    u, _ = screen(pilot_s, pilot_curves[:1])
+    visible = (u >= x_lo * x_scale) & (u <= x_hi * x_scale) if x_range is not None else np.ones(u.shape, bool)
+    bend = np.zeros(pilot)
+    for block in range(0, pilot_curves.shape[0], _BLOCK):
+        _, y = screen(pilot_s, pilot_curves[block:block + _BLOCK])
+        chord_u, chord_y = u[2:] - u[:-2], y[:, 2:] - y[:, :-2]
+        second_u, second_y = u[2:] - 2 * u[1:-1] + u[:-2], y[:, 2:] - 2 * y[:, 1:-1] + y[:, :-2]
+        with np.errstate(all='ignore'):
+            normal = np.abs(chord_u * second_y - chord_y * second_u) / np.hypot(chord_u, chord_y)
+        normal[(y[:, 1:-1] > (y_hi + margin) * y_scale) | (y[:, 1:-1] < (y_lo - margin) * y_scale)] = 0.
+        bend[1:-1] = np.maximum(bend[1:-1], np.nan_to_num(normal, nan=0., posinf=0.).max(axis=0))
+    bend[0], bend[-1] = bend[1], bend[-2]
+    need = np.sqrt(np.where(visible, bend, 0.) / (8 * tolerance))
+    cumulative = np.concatenate([[0.], np.cumsum((need[:-1] + need[1:]) / 2)])
+    intervals = min(max(int(np.ceil(cumulative[-1])), 1), max_points - 1)
+    s = np.interp(np.linspace(0., cumulative[-1], intervals + 1), cumulative, pilot_s) if cumulative[-1] else \
+        np.array([start, end], dtype=float)
+    s[0], s[-1] = start, end
+    curves, _ = evaluate(s)
+
+    # then every interval is checked, and split where the estimate fell short
+    pending = np.arange(s.size - 1)
+    while pending.size and s.size < max_points:
+        left, right = s[pending], s[pending + 1]
+        probes = left[:, None] + (right - left)[:, None] * _PROBES
+        values, _ = evaluate(probes.ravel())
+        values = values.reshape(-1, *probes.shape)
+
+        u, y = screen(np.stack([left, right], axis=-1), np.stack([curves[:, pending], curves[:, pending + 1]], -1))
+        uq, yq = screen(probes, values)
+        distance = _distance(np.broadcast_to(u, y.shape), y, np.broadcast_to(uq, yq.shape), yq)
+        lowest = np.minimum(y.min(axis=-1), yq.min(axis=-1))
+        highest = np.maximum(y.max(axis=-1), yq.max(axis=-1))
+        hidden = (lowest > (y_hi + margin) * y_scale) | (highest < (y_lo - margin) * y_scale)
+        split = ((distance > tolerance).any(axis=-1) & ~hidden).any(axis=0)
+        split &= right - left > abs(end - start) * 1e-12
+        if x_range is not None:
+            # intervals wholly outside the visible x range are never drawn
+            ends = np.sort(u, axis=-1)
+            split &= (ends[:, 1] >= x_lo * x_scale) & (ends[:, 0] <= x_hi * x_scale)
+        split[np.cumsum(split) > max_points - s.size] = False
+        if not split.any():
+            break
+
+        # the midpoints of the intervals that are split, and the curves there, are merged into the sorted grid
+        position = pending[split] + 1
+        s = np.insert(s, position, probes[split, 1])
+        curves = np.insert(curves, position, values[:, split, 1], axis=1)
+        new = position + np.arange(position.size)
+        pending = np.unique(np.concatenate([new - 1, new]))
+
+    return to_x(s), curves.reshape(grid_shape + s.shape)
+
+
+def adaptive_x(model: Union[Callable, Sequence[Callable]], start: float, end: float, scale: str = 'log',
+               **kwargs) -> np.ndarray:
+    """
+    the sample points of :func:`adaptive_curves`, for line sources whose curves are recomputed (e.g. in the browser)
+    as the parameters change; for a sequence of models sharing a source, the union of their sample points
+    """
+    models = model if isinstance(model, (list, tuple)) else [model]
+    return np.unique(np.concatenate([adaptive_curves(model, start, end, scale, **kwargs)[0] for model in models]))
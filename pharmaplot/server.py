@@ -0,0 +1,392 @@
+"""
+local plot server: the spec-defined pages with their curves evaluated in python
+
+in server mode the pages built by pharmaplot.spec post their parameter values to the server on every slider change
+and draw the curves it returns, so models too heavy for the browser can be served to a whole class. curves are
+memoized in a bounded LRU cache keyed by (model, parameters, x grid), and identical requests arriving while a curve is
+being computed wait for that computation instead of repeating it. everything, BokehJS included, is served locally::
+
+    python -m pharmaplot serve                     # the pages of every scripts/*.py that defines a SPEC
+    python -m pharmaplot loadtest --clients 300    # simulated students dragging sliders, p50/p99 latency
+
+endpoints: GET / (index), GET /<page>.html, GET /static/<bundle>.js, POST /curve, GET /stats
+"""
+import glob
+import html
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from pharmaplot.models import get_model
+
+# largest x grid a client may ask for
+MAX_GRID_POINTS = 100_000
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# curve cache
+# ----------------------------------------------------------------------------------------------------------------------
+def evaluate_curve(model: str, params: Dict[str, float], grid: Sequence) -> np.ndarray:
+    """
+    one model curve over an x grid
+
+    Parameters
+    ----------
+    model: str
+        registered model name
+
+    params: Dict[str, float]
+        parameter values; parameters with defaults may be left out
+
+    grid: Sequence
+        (scale, start, end, num) as in a spec's x entry, scale being 'log' or 'linear'
+    """
+    model = get_model(model)
+    scale, start, end, num = grid
+    if (scale not in ('log', 'linear') or not 0 < int(num) <= MAX_GRID_POINTS
+            or not math.isfinite(float(start)) or not math.isfinite(float(end))):
+        raise ValueError(f'invalid x grid {list(grid)!r}')
+    unknown = set(params) - set(model.parameters)
+    if unknown:
+        raise ValueError(f'{model.name} has no parameter(s): {", ".join(sorted(unknown))}')
+    # the grids come from clients, so they are built here rather than in the (unbounded) cache of spec._x_values;
+    # the curves themselves are kept in the bounded CurveCache
+    x = (np.logspace if scale == 'log' else np.linspace)(float(start), float(end), num=int(num))
+    with np.errstate(all='ignore'):
+        return model.function(x, **{name: float(value) for name, value in params.items()})
+
+
+def json_values(values: Union[float, np.ndarray]) -> Union[float, list]:
+    """an array (or number) as a list (or float) for json, with null for nan and infinities, which json cannot
+    represent"""
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    if finite.all():
+        return values.tolist()
+    return np.where(finite, values, None).tolist()
+
+
+class _Pending:
+    """a curve being computed, which identical requests wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CurveCache:
+    """
+    thread-safe LRU cache of model curves with request coalescing
+
+    Parameters
+    ----------
+    maxsize: int
+        maximum number of curves kept; the least recently used are evicted first
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = self.misses = self.coalesced = 0
+        self._curves = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._curves)
+
+    def get(self, model: str, params: Dict[str, float], grid: Sequence) -> np.ndarray:
+        """the curve of :func:`evaluate_curve`, from the cache, from a computation in flight, or computed now"""
+        key = (model, tuple(sorted((name, float(value)) for name, value in params.items())), tuple(grid))
+        with self._lock:
+            if key in self._curves:
+                self.hits += 1
+                self._curves.move_to_end(key)
+                return self._curves[key]
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                self.misses += 1
+                pending = self._pending[key] = _Pending()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = evaluate_curve(model, params, grid)
+            pending.value.setflags(write=False)
+            with self._lock:
+                self._curves[key] = pending.value
+                while len(self._curves) > self.maxsize:
+                    self._curves.popitem(last=False)
+            return pending.value
+        except Exception as error:
+            pending.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """size of the cache and how many requests were hits, misses or coalesced with a computation in flight"""
+        return dict(size=len(self._curves), maxsize=self.maxsize, hits=self.hits, misses=self.misses,
+                    coalesced=self.coalesced)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# server
+# ----------------------------------------------------------------------------------------------------------------------
+def server_pages(specs: Sequence[dict]) -> Tuple[Dict[str, str], Dict[str, bytes]]:
+    """
+    server-mode html of every spec (and variant)
+
+    Returns
+    -------
+    pages, static: tuple
+        pages = file name -> html; static = url path -> content of the one BokehJS bundle the pages load
+    """
+    from bokeh.embed import file_html
+    from bokeh.resources import CDN
+
+    from pharmaplot.resources import COMPONENTS, bundle, link_page, page_components
+    from pharmaplot.spec import build_layout, expand
+
+    pages = {}
+    for spec in specs:
+        for full in expand(spec):
+            title = full['output'].get('title', full['figure'].get('title', ''))
+            pages[full['output']['filename']] = file_html(build_layout(full, server=''), CDN, title)
+
+    used = {component for page in pages.values() for component in page_components(page)}
+    components = [component for component in COMPONENTS if component in used]
+    name, content = bundle(components)
+    pages = {filename: link_page(page, f'/static/{name}', components) for filename, page in pages.items()}
+    return pages, {f'/static/{name}': content}
+
+
+def script_specs(scripts: Sequence[str] = None) -> List[dict]:
+    """the SPECs of the given page scripts (default: every scripts/*.py), skipping scripts that define none"""
+    from pharmaplot.build import SCRIPTS_DIR
+    from pharmaplot.spec import script_spec
+
+    specs = []
+    for script in sorted(glob.glob(f'{SCRIPTS_DIR}/*.py')) if scripts is None else scripts:
+        try:
+            specs.append(script_spec(script))
+        except ValueError:
+            pass
+    return specs
+
+
+def _http_server(plot_server: 'PlotServer', host: str, port: int):
+    """the threading http server answering for plot_server; http.server is imported here as it pulls in ssl"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            if plot_server.verbose:
+                super().log_message(format, *args)
+
+        def _send(self, status: int, content: bytes, content_type: str, cache: bool = False):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(content)))
+            # the bundle name carries a hash of its content, so it never changes
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable' if cache else 'no-cache')
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _json(self, status: int, value):
+            self._send(status, json.dumps(value, allow_nan=False).encode(), 'application/json')
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/':
+                links = ''.join(f'<li><a href="/{name}">{html.escape(name)}</a></li>' for name in plot_server.pages)
+                self._send(200, f'<!DOCTYPE html><html><body><ul>{links}</ul></body></html>'.encode(), 'text/html')
+            elif path.lstrip('/') in plot_server.pages:
+                self._send(200, plot_server.pages[path.lstrip('/')].encode(), 'text/html; charset=utf-8')
+            elif path in plot_server.static:
+                self._send(200, plot_server.static[path], 'text/javascript', cache=True)
+            elif path == '/stats':
+                self._json(200, plot_server.cache.stats())
+            else:
+                self._json(404, dict(error=f'no such page: {path}'))
+
+        def do_POST(self):
+            if self.path != '/curve':
+                self._json(404, dict(error=f'no such endpoint: {self.path}'))
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not isinstance(request, dict) or not all(isinstance(request.get(name), dict)
+                                                            for name in ('params', 'grids')):
+                    raise ValueError('the request must be a json object with params and grids objects')
+                y = {name: json_values(plot_server.cache.get(request['model'], request['params'], grid))
+                     for name, grid in request['grids'].items()}
+            except (KeyError, TypeError, ValueError) as error:
+                self._json(400, dict(error=str(error)))
+                return
+            self._json(200, dict(y=y))
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        # a class of students connecting at once must not overflow the listen backlog
+        request_queue_size = 1024
+
+    return Server((host, port), Handler)
+
+
+class PlotServer:
+    """
+    http server for the server-mode pages of a set of specs
+
+    Parameters
+    ----------
+    specs: Sequence[dict]
+        the pages to serve; defaults to the SPEC of every page script that has one
+
+    host, port: str, int
+        address to listen on; port 0 picks a free port (see url)
+
+    cache_size: int
+        maximum number of curves in the LRU cache
+
+    verbose: bool
+        log every request
+    """
+
+    def __init__(self, specs: Sequence[dict] = None, host: str = '127.0.0.1', port: int = 8000,
+                 cache_size: int = 4096, verbose: bool = False):
+        self.pages, self.static = server_pages(script_specs() if specs is None else specs)
+        self.cache = CurveCache(cache_size)
+        self.verbose = verbose
+        self.httpd = _http_server(self, host, port)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+    def server_close(self):
+        self.httpd.server_close()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# load test
+# ----------------------------------------------------------------------------------------------------------------------
+def _slider_requests(spec: dict, updates: int, rng: np.random.Generator) -> List[bytes]:
+    """the /curve requests a student sends while dragging one slider of a page across part of its range"""
+    from pharmaplot.spec import DEFAULTS, line_points, merge
+
+    spec = merge(DEFAULTS, spec)
+    x = spec['x']
+    grids = {'LineSource': [x['scale'], x['start'], x['end'], line_points(x)]}
+    if x['points']:
+        grids['PointSource'] = [x['scale'], x['start'], x['end'], x['points']]
+    values = {name: slider['value'] for name, slider in spec['sliders'].items()}
+    name = rng.choice(list(spec['sliders']))
+    slider = spec['sliders'][name]
+    steps = np.arange(slider['start'], slider['end'] + slider['step'] / 2, slider['step'])
+    first = rng.integers(0, max(len(steps) - updates, 1))
+
+    requests = []
+    for value in steps[first:first + updates]:
+        values[name] = float(value)
+        params = {param: float(eval(str(expression), {'np': np, '__builtins__': {}}, values))
+                  for param, expression in spec['params'].items()}
+        requests.append(json.dumps(dict(model=spec['model'], params=params, grids=grids)).encode())
+    return requests
+
+
+def load_test(url: str, specs: Sequence[dict], clients: int = 100, updates: int = 20, seed: int = 0) -> dict:
+    """
+    simulate students dragging sliders of the served pages, all at the same time
+
+    every client picks a page and a slider and sends the requests of a drag across `updates` slider steps, one after
+    the other, as a page in server mode does
+
+    Parameters
+    ----------
+    url: str
+        address of a running :class:`PlotServer`
+
+    specs: Sequence[dict]
+        the specs the server serves
+
+    clients: int
+        number of concurrent clients
+
+    updates: int
+        slider steps per client
+
+    seed: int
+        seed for the choice of pages, sliders and starting positions
+
+    Returns
+    -------
+    report: dict
+        number of requests and errors, update latency percentiles in milliseconds (p50, p90, p99, max), requests per
+        second, and the server's cache statistics
+    """
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    rng = np.random.default_rng(seed)
+    workloads = [_slider_requests(specs[rng.integers(len(specs))], updates, rng) for _ in range(clients)]
+    start_barrier = threading.Barrier(clients)
+
+    def client(requests):
+        latencies, errors = [], 0
+        start_barrier.wait()
+        for body in requests:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(f'{url}/curve', data=body), timeout=60) as r:
+                    r.read()
+            except OSError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, workloads))
+    seconds = time.perf_counter() - start
+
+    latencies = 1000 * np.array([latency for result in results for latency in result[0]])
+    with urllib.request.urlopen(f'{url}/stats') as r:
+        stats = json.load(r)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if latencies.size else (np.nan,) * 3
+    return dict(clients=clients, requests=int(latencies.size), errors=sum(result[1] for result in results),
+                seconds=seconds, requests_per_second=latencies.size / seconds, p50_ms=float(p50), p90_ms=float(p90),
+                p99_ms=float(p99), max_ms=float(latencies.max()) if latencies.size else np.nan, cache=stats)
+
+
+def format_load_test(report: dict) -> str:
+    """the result of :func:`load_test` as text"""
+    cache = report['cache']
+    return (f'{report["clients"]} clients, {report["requests"]} updates ({report["errors"]} errors) in '
+            f'{report["seconds"]:.2f} s, {report["requests_per_second"]:.0f} updates/s\n'
+            f'latency p50 {report["p50_ms"]:.1f} ms, p90 {report["p90_ms"]:.1f} ms, p99 {report["p99_ms"]:.1f} ms, '
+            f'max {report["max_ms"]:.1f} ms\n'
+            f'cache: {cache["hits"]} hits, {cache["misses"]} misses, {cache["coalesced"]} coalesced, '
+            f'{cache["size"]}/{cache["maxsize"]} curves')
@@ -0,0 +1,312 @@
+"""
+declarative specification of the interactive single-model plots, and the factory that builds them
+
+most pages are the same figure: a model curve (and optionally sampled points) over a log- or linearly-spaced x range,
+a faded copy of the starting curve, a label, axis lines, and one slider per adjustable parameter driving a CustomJS
+callback. a spec is a plain dict (or a yaml/json file) describing just the parts that differ::
+
+    model: four_parameter_logistic_equation
+    x: {start: -9, end: -3, scale: linear, points: 16}
+    params: {top: top, bottom: bottom, hillslope: hill, logec50: -ec50}
+    sliders:
+      top: {start: 0, end: 200, value: 100, step: 5, title: Top Response (%)}
+      ...
+    figure: {title: Dose Response Curve, x_axis_label: log[agonist (M)], y_range: [-5, 205]}
+    label: {x: -6.5, y: 105, text: Top=100, Bottom=0, pEC50=6, Hill=1}
+    output: {filename: 10-receptors-dr.html, title: Dose Response}
+
+params are python expressions in the slider names (as for pharmaplot.lookup.build_lookup), or constants. with
+`throttle: true` the curves follow the sliders only when they are released, for models too expensive to track a
+drag. the curve is sampled adaptively (see pharmaplot.sampling), with the fewest x values that keep it within
+`x.tolerance` pixels of the true curve over the range of the sliders, unless `x.line` gives a number of evenly spaced
+points; pages whose curves a plot server evaluates use FIXED_LINE_POINTS, as the server recomputes the x values from
+the range. a spec may carry a list of `variants`, partial specs merged over the rest, so that many versions of a page
+(per course, per language, ...) are rendered from one file in a single process
+"""
+import ast
+import copy
+import json
+from functools import lru_cache
+from typing import List, Sequence, Union
+
+import numpy as np
+
+from pharmaplot import config
+from pharmaplot.callbacks import callback_code, connect, server_callback_code
+from pharmaplot.models import get_model, js_expression
+from pharmaplot.sampling import TOLERANCE
+
+DEFAULTS = {
+    'x': {'scale': 'log', 'line': 'adaptive', 'tolerance': TOLERANCE, 'points': 0, 'log_axis': False},
+    'params': {},
+    'sliders': {},
+    'figure': {'plot_width': 600, 'plot_height': 400},
+    'label': None,
+    'baseline': True,
+    'axis_lines': True,
+    'lookup': None,
+    'throttle': False,
+    'output': {},
+}
+
+# the sources are always passed to the callback under these names
+LINE_SOURCE, POINT_SOURCE = 'LineSource', 'PointSource'
+
+# evenly spaced curve points of adaptive lines where the x values cannot be shipped with the page, and the most points
+# of an adaptive line
+FIXED_LINE_POINTS = 100
+MAX_LINE_POINTS = 1000
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# specs
+# ----------------------------------------------------------------------------------------------------------------------
+def merge(base: dict, *overrides: dict) -> dict:
+    """deep copy of base with every override merged over it in turn; nested dicts are merged key by key"""
+    merged = copy.deepcopy(base)
+    for override in overrides:
+        for key, value in (override or {}).items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = merge(merged[key], value)
+            else:
+                merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def expand(spec: dict) -> List[dict]:
+    """the full specs described by a spec: itself, or one per entry of its `variants` list"""
+    variants = spec.get('variants')
+    base = {key: value for key, value in spec.items() if key != 'variants'}
+    return [merge(DEFAULTS, base, variant) for variant in (variants or [{}])]
+
+
+def load_spec(path: str) -> List[dict]:
+    """read a spec (or a list of specs) from a yaml or json file and expand its variants"""
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            loaded = yaml.safe_load(f)
+        else:
+            loaded = json.load(f)
+    return [full for spec in (loaded if isinstance(loaded, list) else [loaded]) for full in expand(spec)]
+
+
+def script_spec(path: str) -> dict:
+    """the SPEC a page script assigns (as a literal or with dict()), read without running the script"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and [getattr(target, 'id', None) for target in node.targets] == ['SPEC']:
+            return eval(compile(ast.Expression(node.value), path, 'eval'), {'__builtins__': {}, 'dict': dict})
+    raise ValueError(f'{path} does not define a SPEC')
+
+
+def validate(spec: dict):
+    """raise ValueError if a (full) spec cannot be built"""
+    model = get_model(spec['model'])
+    missing = [name for name in model.parameters if name not in spec['params'] and name not in model.defaults]
+    if missing:
+        raise ValueError(f'spec for {model.name} has no value for parameter(s): {", ".join(missing)}')
+    unknown = set(spec['params']) - set(model.parameters)
+    if unknown:
+        raise ValueError(f'{model.name} has no parameter(s): {", ".join(sorted(unknown))}')
+    for name, slider in spec['sliders'].items():
+        absent = {'start', 'end', 'value', 'step'} - set(slider)
+        if absent:
+            raise ValueError(f'slider {name!r} is missing {", ".join(sorted(absent))}')
+    if spec['x']['scale'] not in ('log', 'linear'):
+        raise ValueError(f"x scale must be 'log' or 'linear', not {spec['x']['scale']!r}")
+    line = spec['x']['line']
+    if line != 'adaptive' and not (isinstance(line, int) and line > 1):
+        raise ValueError(f"x line must be 'adaptive' or a number of points, not {line!r}")
+
+
+def line_points(x_spec: dict) -> int:
+    """number of evenly spaced points of the curve of an x entry, FIXED_LINE_POINTS for an adaptive one"""
+    return FIXED_LINE_POINTS if x_spec['line'] == 'adaptive' else x_spec['line']
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# shared components
+#
+# variants of a page differ in titles and labels far more often than in data, so the arrays and the callback code
+# are computed once per distinct input and reused
+# ----------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=None)
+def _x_values(scale: str, start: float, end: float, num: int, sampling: tuple = None) -> np.ndarray:
+    """num evenly spaced x values, or with `sampling` (see _sampling) at most num adaptively sampled ones"""
+    if sampling is None:
+        x = (np.logspace if scale == 'log' else np.linspace)(start, end, num=num)
+    else:
+        from pharmaplot.sampling import adaptive_x, parameter_sets
+
+        model, params, sliders, tolerance, width, height, x_range, y_range, log_axis = sampling
+        sliders = {name: dict(start=low, end=high, value=value) for name, (low, high, value) in sliders}
+        x = adaptive_x(get_model(model).function, start, end, scale, tolerance=tolerance, width=width, height=height,
+                       x_range=x_range, y_range=y_range, log_axis=log_axis, max_points=num,
+                       **parameter_sets(sliders, dict(params)))
+    x.setflags(write=False)
+    return x
+
+
+def _sampling(spec: dict) -> tuple:
+    """the inputs of the adaptive sampling of a spec's curve, as a hashable tuple"""
+    figure, x_spec = spec['figure'], spec['x']
+
+    def axis_range(name):
+        return tuple(figure[name]) if figure.get(name) is not None else None
+
+    sliders = spec['sliders'].items()
+    return (spec['model'], tuple((name, str(expression)) for name, expression in spec['params'].items()),
+            tuple((name, (slider['start'], slider['end'], slider['value'])) for name, slider in sliders),
+            x_spec['tolerance'], figure['plot_width'], figure['plot_height'], axis_range('x_range'),
+            axis_range('y_range'), x_spec['log_axis'] or figure.get('x_axis_type') == 'log')
+
+
+@lru_cache(maxsize=None)
+def _curve(model: str, x_key: tuple, params: tuple) -> np.ndarray:
+    y = get_model(model).function(_x_values(*x_key), **dict(params))
+    y.setflags(write=False)
+    return y
+
+
+@lru_cache(maxsize=None)
+def _live_code(model: str, params: tuple, sources: tuple) -> str:
+    return callback_code([(model, list(sources))],
+                         params={name: js_expression(expression, lambda n: f'{n}.value') for name, expression in params})
+
+
+def _initial_values(spec: dict) -> tuple:
+    """model parameter values at the sliders' starting positions, as a hashable tuple"""
+    values = {name: slider['value'] for name, slider in spec['sliders'].items()}
+    return tuple((name, float(eval(str(expression), {'np': np, '__builtins__': {}}, values)))
+                 for name, expression in spec['params'].items())
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# factory
+# ----------------------------------------------------------------------------------------------------------------------
+def build_layout(spec: dict, server: str = None, report: list = None):
+    """
+    build the bokeh layout (figure and sliders, wired to a CustomJS callback) described by a spec
+
+    Parameters
+    ----------
+    spec: dict
+        a spec as described in the module docstring; missing entries are taken from DEFAULTS
+
+    server: str
+        address of a pharmaplot plot server (see pharmaplot.server) that evaluates the curves instead of the browser;
+        '' for the server the page is loaded from. by default the curves are computed in the browser
+
+    report: list
+        when lookup tables are built, the entries of their size vs. error report (see pharmaplot.lookup.build_lookup)
+        are appended to this list, e.g. for pharmaplot.lookup.format_report
+
+    Returns
+    -------
+    layout: bokeh.models.LayoutDOM
+        row of the figure and a column of the sliders
+    """
+    from bokeh.layouts import column, row
+    from bokeh.models import ColumnDataSource, CustomJS, Label, Slider, Span
+    from bokeh.plotting import figure
+
+    spec = merge(DEFAULTS, spec)
+    validate(spec)
+    model, x_spec = spec['model'], spec['x']
+    params = _initial_values(spec)
+    x_column = 'x_log' if x_spec['log_axis'] else 'x'
+
+    # sources: the curve, optionally sampled points
+    if x_spec['line'] == 'adaptive' and server is None:
+        keys = {LINE_SOURCE: (x_spec['scale'], x_spec['start'], x_spec['end'], MAX_LINE_POINTS, _sampling(spec))}
+    else:
+        keys = {LINE_SOURCE: (x_spec['scale'], x_spec['start'], x_spec['end'], line_points(x_spec))}
+    if x_spec['points']:
+        keys[POINT_SOURCE] = (x_spec['scale'], x_spec['start'], x_spec['end'], x_spec['points'])
+    data = {}
+    for name, key in keys.items():
+        data[name] = dict(x=_x_values(*key), y=_curve(model, key, params))
+        if x_spec['log_axis']:
+            data[name]['x_log'] = np.log10(data[name]['x'])
+    sources = {name: ColumnDataSource(data={k: np.array(v) for k, v in columns.items()})
+               for name, columns in data.items()}
+
+    plot = figure(**{key: tuple(value) if isinstance(value, list) else value for key, value in spec['figure'].items()})
+    plot.line(x_column, 'y', source=sources[LINE_SOURCE], line_width=3, line_alpha=0.6, color='black')
+    if POINT_SOURCE in sources:
+        plot.circle(x_column, 'y', source=sources[POINT_SOURCE], size=10, color='black')
+
+    # static copy of the starting curve and annotations
+    if spec['baseline']:
+        plot.line(data[LINE_SOURCE][x_column], data[LINE_SOURCE]['y'], line_width=5, color='blue', line_alpha=0.3)
+        if POINT_SOURCE in data:
+            plot.circle(data[POINT_SOURCE][x_column], data[POINT_SOURCE]['y'], size=10, color='blue', line_alpha=0.3)
+    if spec['label']:
+        plot.add_layout(Label(text_color='blue', text_alpha=0.5, **spec['label']))
+    if spec['axis_lines']:
+        plot.renderers.extend([Span(location=0, dimension=dimension, line_color='black', line_width=1, line_alpha=0.3)
+                               for dimension in ('height', 'width')])
+
+    # sliders and callback
+    sliders = {name: Slider(**slider) for name, slider in spec['sliders'].items()}
+    use_lookup = config.use_lookup_tables if spec['lookup'] is None else spec['lookup']
+    if server is not None:
+        code = server_callback_code(model, keys, {name: js_expression(str(expression), lambda n: f'{n}.value')
+                                                  for name, expression in spec['params'].items()}, url=server)
+        lookup_args = {}
+    elif use_lookup:
+        from pharmaplot.lookup import build_lookup
+        code, lookup_args, lookup_report = build_lookup([(model, list(sources))],
+                                                 xs={name: data[name]['x'] for name in sources},
+                                                 sliders=sliders,
+                                                 params={name: str(expression) for name, expression in
+                                                         spec['params'].items()},
+                                                 snap_sliders=True)
+        if report is not None:
+            report.extend(lookup_report)
+    else:
+        code = _live_code(model, tuple((name, str(expression)) for name, expression in spec['params'].items()),
+                          tuple(sources))
+        lookup_args = {}
+
+    callback = CustomJS(args=dict(**sources, **sliders, **lookup_args), code=code)
+    connect(callback, *sliders.values(), throttled=spec['throttle'])
+
+    return row(plot, column(*sliders.values()))
+
+
+def render(specs: Union[dict, Sequence[dict]], output_dir: str = None) -> List[str]:
+    """
+    build and save the page of every spec (and variant) in this process
+
+    Parameters
+    ----------
+    specs: Union[dict, Sequence[dict]]
+        one spec or a list of them; each needs output.filename
+
+    output_dir: str
+        directory for the pages; defaults to config.html_output_dir
+
+    Returns
+    -------
+    paths: List[str]
+        the html files written
+    """
+    from bokeh.io import reset_output, save
+    from bokeh.resources import CDN
+
+    output_dir = config.html_output_dir if output_dir is None else output_dir
+    paths = []
+    for spec in [specs] if isinstance(specs, dict) else specs:
+        for full in expand(spec):
+            output = full['output']
+            path = f'{output_dir.rstrip("/")}/{output["filename"]}'
+            reset_output()
+            paths.append(save(build_layout(full), filename=path, resources=CDN,
+                              title=output.get('title', full['figure'].get('title', ''))))
+            if config.optimize_payloads:
+                from pharmaplot.payload import optimize_file
+                optimize_file(path, encoding=config.payload_encoding)
+    return paths
@@ -0,0 +1,223 @@
+"""
+persistent store of fit results, so that re-running an analysis only fits new or changed datasets
+
+every fit is stored in a SQLite table under (dataset, model, options): dataset is a sha256 of the data points that
+were fitted, options the canonical json of the fit settings (fixed parameters, weights, iteration limit, tolerance).
+:func:`fit_stored` looks every dataset of a batch up at once, fits only the missing ones with one
+:func:`pharmaplot.fit.fit_batch` call and inserts them in a single transaction. the plate and compound labels of
+every dataset are kept in a separate, indexed table, so that identical data under several labels (e.g. a compound
+re-tested on another plate) are fitted once and found under each of them::
+
+    with FitStore('campaign.sqlite') as store:
+        result, fitted = fit_stored(store, 'four_parameter_logistic_equation', x, y, labels=labels)
+        history = store.lookup(compound='CPD-1')
+"""
+import hashlib
+import json
+import time
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from pharmaplot.fit import FitResult, fit_batch
+from pharmaplot.models import Model, get_model
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fits (
+    dataset TEXT NOT NULL,
+    model TEXT NOT NULL,
+    options TEXT NOT NULL,
+    names TEXT NOT NULL,
+    params TEXT NOT NULL,
+    stderr TEXT NOT NULL,
+    converged INTEGER NOT NULL,
+    iterations INTEGER NOT NULL,
+    sse REAL,
+    created REAL NOT NULL,
+    PRIMARY KEY (dataset, model, options)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    dataset TEXT NOT NULL,
+    model TEXT NOT NULL,
+    options TEXT NOT NULL,
+    plate TEXT NOT NULL,
+    compound TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (dataset, model, options, plate, compound)
+);
+CREATE INDEX IF NOT EXISTS labels_compound ON labels (compound, plate);
+"""
+
+# sqlite limits the number of parameters of a statement
+_LOOKUP_BATCH = 500
+
+
+class FitStore:
+    """
+    SQLite database of fit results; usable as a context manager
+
+    Parameters
+    ----------
+    path: str
+        database file, created if needed. several processes may share it (the database uses write-ahead logging)
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # with write-ahead logging a crash can lose the last transactions but not corrupt the database
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, model: str, keys: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], tuple]:
+        """stored (names, params, stderr, converged, iterations, sse) of the (dataset, options) keys that are present"""
+        found = {}
+        for start in range(0, len(keys), _LOOKUP_BATCH):
+            datasets = sorted({dataset for dataset, _ in keys[start:start + _LOOKUP_BATCH]})
+            rows = self.connection.execute(
+                f'SELECT dataset, options, names, params, stderr, converged, iterations, sse FROM fits '
+                f'WHERE model = ? AND dataset IN ({", ".join("?" * len(datasets))})', [model, *datasets])
+            for dataset, options, names, params, stderr, converged, iterations, sse in rows:
+                found[dataset, options] = (tuple(json.loads(names)), json.loads(params), json.loads(stderr),
+                                           bool(converged), iterations, np.nan if sse is None else sse)
+        return found
+
+    def put(self, model: str, rows: Sequence[tuple], labels: Sequence[tuple] = ()):
+        """
+        insert (dataset, options, names, params, stderr, converged, iterations, sse) rows and (dataset, options,
+        plate, compound) labels in one transaction; labels already stored are kept, as are the other labels of a
+        dataset
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO fits (dataset, model, options, names, params, stderr, converged, iterations, '
+                'sse, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(dataset, model, options, json.dumps(list(names)), json.dumps(list(params)),
+                  json.dumps(list(stderr)), int(converged), int(iterations), None if np.isnan(sse) else float(sse),
+                  now) for dataset, options, names, params, stderr, converged, iterations, sse in rows])
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO labels (dataset, model, options, plate, compound, created) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(dataset, model, options, plate or '', compound or '', now)
+                 for dataset, options, plate, compound in labels if plate is not None or compound is not None])
+
+    def lookup(self, compound: str = None, plate: str = None, model: str = None) -> List[dict]:
+        """stored fits, optionally of one compound, plate and/or model, oldest first; a fit stored under several
+        labels is listed once per label"""
+        conditions = [(column, value) for column, value in (('labels.compound', compound), ('labels.plate', plate),
+                                                             ('fits.model', model)) if value is not None]
+        where = ' AND '.join(f'{column} = ?' for column, _ in conditions) or '1'
+        rows = self.connection.execute(
+            f'SELECT labels.plate, labels.compound, fits.model, names, params, stderr, converged, iterations, sse, '
+            f'fits.created FROM fits LEFT JOIN labels USING (dataset, model, options) '
+            f'WHERE {where} ORDER BY COALESCE(labels.created, fits.created), labels.rowid, fits.rowid',
+            [value for _, value in conditions])
+        results = []
+        for plate, compound, model, names, params, stderr, converged, iterations, sse, created in rows:
+            names = json.loads(names)
+            results.append(dict(plate=plate or None, compound=compound or None, model=model,
+                                params=dict(zip(names, json.loads(params))),
+                                stderr=dict(zip(names, json.loads(stderr))), converged=bool(converged),
+                                iterations=iterations, sse=sse, created=created))
+        return results
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM fits').fetchone()[0]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# incremental fitting
+# ----------------------------------------------------------------------------------------------------------------------
+def dataset_hashes(x: np.ndarray, y: np.ndarray, weights: np.ndarray = None) -> List[str]:
+    """sha256 of the fitted points (finite x and y, and their weights) of every row"""
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+    w = None if weights is None else np.broadcast_to(np.asarray(weights, dtype=float), y.shape)
+    valid = np.isfinite(x) & np.isfinite(y)
+    hashes = []
+    for i in range(y.shape[0]):
+        digest = hashlib.sha256(x[i, valid[i]].tobytes())
+        digest.update(y[i, valid[i]].tobytes())
+        if w is not None:
+            digest.update(w[i, valid[i]].tobytes())
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def _options(n: int, fixed: dict, weights, max_iter: int, tol: float) -> List[str]:
+    """canonical json of the fit options of every row (fixed values may differ between rows)"""
+    fixed = {name: np.broadcast_to(np.asarray(value, dtype=float), (n,)) for name, value in (fixed or {}).items()}
+    common = dict(weighted=weights is not None, max_iter=max_iter, tol=tol)
+    return [json.dumps(dict(common, fixed={name: float(values[i]) for name, values in sorted(fixed.items())}),
+                       sort_keys=True) for i in range(n)]
+
+
+def fit_stored(store: FitStore,
+               model: Union[str, Model],
+               x: np.ndarray,
+               y: np.ndarray,
+               labels: Sequence[Tuple[str, str]] = None,
+               fixed: Dict[str, Union[float, np.ndarray]] = None,
+               weights: np.ndarray = None,
+               max_iter: int = 50,
+               tol: float = 1e-8):
+    """
+    :func:`pharmaplot.fit.fit_batch`, returning stored results for datasets fitted before with the same options
+
+    Parameters
+    ----------
+    store: FitStore
+        the results store
+
+    model, x, y, fixed, weights, max_iter, tol:
+        as for :func:`pharmaplot.fit.fit_batch`
+
+    labels: Sequence[Tuple[str, str]]
+        (plate, compound) of every dataset, stored for lookups (also for datasets taken from the store)
+
+    Returns
+    -------
+    result, fitted: tuple
+        result = FitResult of every dataset; fitted = boolean array marking the datasets fitted now
+    """
+    model = get_model(model)
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    n = y.shape[0]
+    x = np.broadcast_to(np.asarray(x, dtype=float), y.shape)
+    keys = list(zip(dataset_hashes(x, y, weights), _options(n, fixed, weights, max_iter, tol)))
+    stored = store.get(model.name, keys)
+    fitted = np.array([key not in stored for key in keys], dtype=bool)
+
+    names = tuple(name for name in model.parameters if name not in (fixed or {}))
+    params, stderr = np.full((n, len(names)), np.nan), np.full((n, len(names)), np.nan)
+    converged, iterations, sse = np.zeros(n, dtype=bool), np.zeros(n, dtype=int), np.full(n, np.nan)
+
+    for i, key in enumerate(keys):
+        if not fitted[i]:
+            _, params[i], stderr[i], converged[i], iterations[i], sse[i] = stored[key]
+
+    rows = np.flatnonzero(fitted)
+    if rows.size:
+        subset = {name: np.broadcast_to(np.asarray(value, dtype=float), (n,))[rows]
+                  for name, value in (fixed or {}).items()}
+        w = None if weights is None else np.broadcast_to(np.asarray(weights, dtype=float), y.shape)[rows]
+        new = fit_batch(model, x[rows], y[rows], fixed=subset or None, weights=w, max_iter=max_iter, tol=tol)
+        params[rows], stderr[rows], converged[rows], iterations[rows], sse[rows] = new[1:]
+    if rows.size or labels:
+        store.put(model.name, [(*keys[i], names, params[i], stderr[i], converged[i], iterations[i], sse[i])
+                               for i in rows], [(*key, *label) for key, label in zip(keys, labels or ())])
+
+    return FitResult(names, params, stderr, converged, iterations, sse), fitted
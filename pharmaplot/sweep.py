@@ -0,0 +1,233 @@
+"""
+out-of-core evaluation of parameter sweeps too large for memory, streamed into a .npy file on disk
+
+the grid of :func:`pharmaplot.grid.evaluate_grid` (grid axes + the x axis) is walked in chunks of whole curves of about
+chunk_bytes each. every chunk is evaluated into one reused buffer and written at its offset in the output .npy, so the
+memory used is a few chunks whatever the size of the grid, and the finished file can be opened memory-mapped with
+np.load(path, mmap_mode='r'). progress is checkpointed next to the output (<output>.progress.json, together with a hash
+of the model and its source, x and parameters), so a sweep that was interrupted continues where it stopped when run
+again::
+
+    report = sweep(mm.mm_competitive, np.logspace(-1, 3, 10_000), 'sweep.npy', vmax=100., km=10.,
+                   ki=np.logspace(-2, 2, 316), conc_i=np.logspace(-1, 3, 316))
+    v = np.load('sweep.npy', mmap_mode='r')  # shape (316, 316, 10000)
+
+on the command line x and the parameters are given as in :func:`parse_values`::
+
+    python -m pharmaplot sweep mm_competitive sweep.npy --x log:-1:3:10000 -p vmax=100 -p km=10 \\
+        -p ki=log:-2:2:316 -p conc_i=log:-1:3:316
+"""
+import hashlib
+import inspect
+import json
+import os
+import time
+from typing import Callable
+
+import numpy as np
+
+from pharmaplot.grid import _broadcast_parameters, evaluate_grid
+
+# bytes of output per chunk; small enough for the buffer to stay in cache, large enough to amortize every write
+CHUNK_BYTES = 2 ** 20
+
+# seconds between checkpoints, each of which syncs the written chunks to disk
+CHECKPOINT_INTERVAL = 1.
+
+
+def _progress_path(path: str) -> str:
+    return path + '.progress.json'
+
+
+def _model_source(model: Callable) -> bytes:
+    """the source of a model function (its bytecode when the source is not available)"""
+    try:
+        return inspect.getsource(model).encode()
+    except (OSError, TypeError):
+        return inspect.unwrap(model).__code__.co_code
+
+
+def _sweep_key(model: Callable, x: np.ndarray, mode: str, dtype: np.dtype, shape: tuple, params: dict) -> str:
+    """sha256 identifying a sweep: a checkpoint is only resumed by the same model (name and source), grid and dtype"""
+    digest = hashlib.sha256(f'{model.__module__}.{model.__name__} {mode} {dtype.str} {shape}'.encode())
+    digest.update(_model_source(model))
+    digest.update(x.tobytes())
+    for name in sorted(params):
+        value = np.asarray(params[name], dtype=dtype)
+        digest.update(f'{name} {value.shape}'.encode() + value.tobytes())
+    return digest.hexdigest()
+
+
+def _load_progress(path: str, key: str) -> int:
+    """curves already written by an interrupted run of the same sweep, or 0"""
+    try:
+        with open(_progress_path(path)) as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if progress.get('key') != key or not os.path.exists(path):
+        return 0
+    return int(progress['done'])
+
+
+def _save_progress(path: str, key: str, done: int, rows: int):
+    tmp = f'{_progress_path(path)}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(dict(key=key, done=done, rows=rows), f)
+    os.replace(tmp, _progress_path(path))
+
+
+def _create(path: str, dtype: np.dtype, shape: tuple) -> int:
+    """create the output .npy (sparse, at its full size) and return the offset of its data"""
+    with open(path, 'wb') as f:
+        np.lib.format.write_array_header_1_0(f, dict(descr=np.lib.format.dtype_to_descr(dtype), fortran_order=False,
+                                                     shape=shape))
+        offset = f.tell()
+        f.truncate(offset + int(np.prod(shape)) * dtype.itemsize)
+    return offset
+
+
+def _data_offset(path: str) -> int:
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        read_header(f)
+        return f.tell()
+
+
+def parse_values(text: str):
+    """
+    a number or 1-D array written as 'value', 'v1,v2,...', 'start:stop:num' (np.linspace) or 'log:start:stop:num'
+    (np.logspace, start and stop being exponents of 10)
+
+    Parameters
+    ----------
+    text: str
+        the values, e.g. '100', '0,1,10', '0:1:11' or 'log:-2:2:100'
+
+    Returns
+    -------
+    values: Union[float, np.ndarray]
+        a float for a single number, otherwise a 1-D float64 array
+    """
+    fields = text.strip().split(':')
+    try:
+        if len(fields) == 1 and ',' not in text:
+            return float(text)
+        if len(fields) == 1:
+            return np.array([float(value) for value in text.split(',')])
+        space = np.linspace
+        if fields[0].strip().lower() == 'log':
+            space, fields = np.logspace, fields[1:]
+        start, stop, num = fields
+        return space(float(start), float(stop), num=int(num))
+    except ValueError:
+        raise ValueError(f"invalid values {text!r}: expected a number, a comma-separated list, 'start:stop:num' or "
+                         f"'log:start:stop:num'") from None
+
+
+def sweep(model: Callable,
+          x: np.ndarray,
+          path: str,
+          mode: str = 'product',
+          dtype=np.float64,
+          chunk_bytes: int = CHUNK_BYTES,
+          workers: int = 1,
+          resume: bool = True,
+          progress: Callable[[int, int], None] = None,
+          **params) -> dict:
+    """
+    evaluate a model over a grid of parameter values into a .npy file, a chunk of curves at a time
+
+    Parameters
+    ----------
+    model: Callable
+        model function from pharmaplot.mm or pharmaplot.receptors, e.g. mm.mm_competitive
+
+    x: np.ndarray
+        1-D array of the independent variable
+
+    path: str
+        the output .npy file, with shape grid_shape + x.shape as for :func:`pharmaplot.grid.evaluate_grid`
+
+    mode, dtype, params:
+        as for :func:`pharmaplot.grid.evaluate_grid`
+
+    chunk_bytes: int
+        approximate size of the output evaluated and written at a time (at least one curve)
+
+    workers: int
+        number of threads evaluating every chunk, each working on about chunk_bytes of it; None uses every cpu
+
+    resume: bool
+        continue an interrupted run of the same sweep from its last checkpoint; with False the sweep starts over
+
+    progress: Callable[[int, int], None]
+        called with (curves done, curves in total) after every chunk
+
+    Returns
+    -------
+    report: dict
+        path, shape, curves (in total), resumed (curves done before this run), bytes (written by this run), seconds
+        and gb_per_second
+    """
+    dtype = np.dtype(dtype)
+    x = np.asarray(x, dtype=dtype)
+    if x.ndim != 1:
+        raise ValueError('x must be a 1-D array')
+    values, grid_shape = _broadcast_parameters(model, mode, dtype, params)
+    axes = [name for name in params if values[name].ndim]
+    arrays = {name: np.asarray(params[name], dtype=dtype) for name in axes}
+    shape = grid_shape + x.shape
+    rows = int(np.prod(grid_shape))
+    row_bytes = x.size * dtype.itemsize
+
+    key = _sweep_key(model, x, mode, dtype, shape, params)
+    done = _load_progress(path, key) if resume else 0
+    offset = _create(path, dtype, shape) if done == 0 else _data_offset(path)
+    resumed = done
+
+    workers = workers or os.cpu_count() or 1
+    per_chunk = max(1, workers * chunk_bytes // max(row_bytes, 1))
+    buffer = np.empty((min(per_chunk, rows), x.size), dtype=dtype)
+    start = last_checkpoint = time.perf_counter()
+    f = open(path, 'r+b', buffering=0)
+    try:
+        while done < rows:
+            stop = min(done + per_chunk, rows)
+            out = buffer[:stop - done]
+            if not axes:
+                evaluate_grid(model, x, out=out[0], dtype=dtype, workers=workers, **params)
+            else:
+                if mode == 'product':
+                    index = np.unravel_index(np.arange(done, stop), grid_shape)
+                    chunk = {name: arrays[name][index[axis]] for axis, name in enumerate(axes)}
+                else:
+                    chunk = {name: arrays[name][done:stop] for name in axes}
+                evaluate_grid(model, x, mode='zip', out=out, dtype=dtype, workers=workers, **dict(params, **chunk))
+            f.seek(offset + done * row_bytes)
+            f.write(out.data)
+            done = stop
+            if time.perf_counter() - last_checkpoint > CHECKPOINT_INTERVAL:
+                os.fsync(f.fileno())
+                _save_progress(path, key, done, rows)
+                last_checkpoint = time.perf_counter()
+            if progress is not None:
+                progress(done, rows)
+    finally:
+        # also on interruption, so that the next run resumes from here
+        os.fsync(f.fileno())
+        f.close()
+        _save_progress(path, key, done, rows)
+
+    seconds = time.perf_counter() - start
+    written = (done - resumed) * row_bytes
+    return dict(path=path, shape=shape, curves=rows, resumed=resumed, bytes=written, seconds=seconds,
+                gb_per_second=written / seconds / 1e9 if seconds else np.inf)
+
+
+def format_report(report: dict) -> str:
+    """one line summary of a :func:`sweep`"""
+    resumed = f', resumed after {report["resumed"]:,}' if report['resumed'] else ''
+    return (f'{report["path"]}: {report["curves"]:,} curves of shape {report["shape"]}{resumed}, '
+            f'{report["bytes"] / 1e9:.2f} GB in {report["seconds"]:.2f} s ({report["gb_per_second"]:.2f} GB/s)')
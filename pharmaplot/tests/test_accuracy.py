@@ -0,0 +1,65 @@
+"""
+unit testing for the numerical stability and accuracy of the logistic and hill models
+"""
+import numpy as np
+import pytest
+
+from pharmaplot import accuracy, receptors
+from pharmaplot.__main__ import main
+from pharmaplot.grid import evaluate_grid
+
+
+def test_models_match_the_high_precision_reference():
+    """every stress case stays within a few machine epsilons of the span, in float32 and float64, for the functions
+    and their kernels"""
+    results = accuracy.run(size=200)
+    assert len(results) == len(accuracy.CASES) * 2 * 2
+    assert not accuracy.failures(results, tolerance=8)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_extreme_inputs_do_not_overflow(dtype):
+    """steep slopes, huge log ranges and molar concentrations raised to high hill coefficients raise no floating
+    point errors, give finite values within the curve and keep the dtype"""
+    log_x = np.linspace(-300., 300., 1001, dtype=dtype)
+    x = np.geomspace(1e-30, 1e30, 1001, dtype=dtype)
+    with np.errstate(over='raise', divide='raise', invalid='raise'):
+        curves = [
+            receptors.four_parameter_logistic_equation(log_x, 100., 0., 1000., -6.),
+            receptors.competitive_binding(log_x, 0., 100., 9., -50.),
+            receptors.specific_binding_hill(x, 100., 1e-9, 60.),
+            evaluate_grid(receptors.four_parameter_logistic_equation, log_x, dtype=dtype, top=100., bottom=0.,
+                          hillslope=np.array([-500., 1., 500.]), logec50=-6.),
+            evaluate_grid(receptors.specific_binding_hill, x, dtype=dtype, bmax=100., kd=1e-9,
+                          hill_coef=np.array([0.5, 4., 60.])),
+        ]
+    eps = np.finfo(dtype).eps
+    for curve in curves:
+        assert curve.dtype == dtype
+        assert np.all((curve >= 0) & (curve <= 100 * (1 + eps)))
+    # the clamp of the hill equation changes the result by less than 1e-34 of bmax
+    np.testing.assert_allclose(curves[2][[0, -1]], [0, 100], rtol=2 * eps, atol=100 * 1e-34)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_hill_equation_at_zero_concentration(dtype):
+    """l = 0 gives exactly 0 without dividing by zero for low hill coefficients, whose overflow bound underflows, in
+    the function, its kernel and its jacobian"""
+    x = np.array([0., 1e-9, 1e-6, 1e-3], dtype=dtype)
+    hill_coef = np.array([0.05, 0.5, 1., 60.])
+    with np.errstate(over='raise', divide='raise', invalid='raise'):
+        curves = [receptors.specific_binding_hill(x, 100., 1e-6, n) for n in hill_coef]
+        grid = evaluate_grid(receptors.specific_binding_hill, x, dtype=dtype, bmax=100., kd=1e-6, hill_coef=hill_coef)
+        jacobians = [receptors.specific_binding_hill_jacobian(x, 100., 1e-6, n) for n in hill_coef]
+    np.testing.assert_allclose(grid, curves, rtol=8 * np.finfo(dtype).eps)
+    expected = 100. / (1 + (1e-6 / x[1:].astype(float)) ** hill_coef[:, None])
+    np.testing.assert_allclose(np.array(curves)[:, 1:], expected, rtol=1e-5 if dtype == np.float32 else 1e-12,
+                               atol=100 * 1e-34)
+    for curve, (value, jacobian) in zip(curves, jacobians):
+        assert curve[0] == value[0] == 0 and np.all(jacobian[0] == 0) and np.isfinite(jacobian).all()
+
+
+def test_accuracy_command(capsys):
+    """the command prints every evaluation and exits with 0 when all are within the tolerance"""
+    assert main(['accuracy', '--size', '50']) == 0
+    assert '0 above 16.0 eps' in capsys.readouterr().out
@@ -0,0 +1,106 @@
+"""
+unit testing for the micro-batching json api
+"""
+import asyncio
+import json
+
+import numpy as np
+from pharmaplot import api, mm, receptors
+from pharmaplot.api import EvalServer, benchmark, eval_batch
+
+
+async def _post(port: int, path: str, value: dict):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(value).encode()
+    writer.write(f'POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+def test_eval_batch_matches_single_calls():
+    """requests of different lengths and parameters evaluated together give the curves of separate calls"""
+    xs = [np.linspace(0, 10, 5), np.logspace(-1, 2, 8)]
+    params = [dict(vmax=10., km=2., ki=1., conc_i=0.), dict(vmax=50., km=5.)]
+    for x, p, y in zip(xs, params, eval_batch('mm_competitive', xs, params)):
+        np.testing.assert_allclose(y, mm.mm_competitive(x, **p))
+
+
+def test_concurrent_requests_are_batched():
+    """concurrent /eval requests are answered correctly from one batch, fits and bad requests are handled"""
+    async def run():
+        server = await EvalServer(window=0.05).start(port=0)
+        try:
+            x = np.logspace(-1, 3, 20)
+            responses = await asyncio.gather(*(_post(server.port, '/eval/michaelis_menten',
+                                                     dict(x=x.tolist(), params=dict(vmax=v, km=5)))
+                                               for v in range(1, 11)))
+            stats = server.batcher.requests, server.batcher.batches
+
+            x_fit = np.linspace(-9, -3, 12)
+            y_fit = receptors.four_parameter_logistic_equation(x_fit, 100., 0., 1., -6.)
+            fit = await _post(server.port, '/fit/four_parameter_logistic_equation',
+                              dict(x=x_fit.tolist(), y=y_fit.tolist(), fixed=dict(bottom=0)))
+            bad = await _post(server.port, '/eval/michaelis_menten', dict(x=[1], params=dict(kd=1)))
+            unknown = await _post(server.port, '/eval/no_such_model', dict(x=[1]))
+            report = await benchmark('127.0.0.1', server.port, concurrency=(4,), requests=40)
+        finally:
+            await server.close()
+        return responses, stats, fit, bad, unknown, report
+
+    responses, stats, fit, bad, unknown, report = asyncio.run(run())
+    for v, (status, value) in zip(range(1, 11), responses):
+        assert status == 200
+        np.testing.assert_allclose(value['y'], mm.michaelis_menten(np.logspace(-1, 3, 20), v, 5))
+    assert stats == (10, 1)
+    assert fit[0] == 200 and fit[1]['converged'] and abs(fit[1]['params']['logec50'] + 6) < 1e-6
+    assert bad[0] == 400 and unknown[0] == 400
+    assert report[0]['requests'] == 40 and report[0]['mean_batch'] > 1
+
+
+def test_bad_requests_fail_alone(monkeypatch):
+    """a request that fails its batch gets its own error, the others their curves; nan is sent as null and an
+    oversized body is refused with 413"""
+    def failing_eval_batch(model, xs, params):
+        if any(13 in x for x in xs):
+            raise ValueError('unlucky x')
+        return eval_batch(model, xs, params)
+
+    monkeypatch.setattr(api, 'eval_batch', failing_eval_batch)
+
+    async def run():
+        server = await EvalServer(window=0.05).start(port=0)
+        try:
+            responses = await asyncio.gather(*(_post(server.port, '/eval/michaelis_menten',
+                                                     dict(x=[0, 1, x], params=dict(vmax=10, km=km)))
+                                               for x, km in ((2, 1), (13, 1), (3, 0))))
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            writer.write(f'POST /eval/michaelis_menten HTTP/1.1\r\nContent-Length: {api.MAX_BODY + 1}\r\n\r\n'.encode())
+            oversized = await reader.read()
+            writer.close()
+        finally:
+            await server.close()
+        return responses, server.batcher.batches, oversized
+
+    (good, bad, nan), batches, oversized = asyncio.run(run())
+    assert batches == 1
+    assert good == (200, dict(y=[0, 5, 10 * 2 / 3]))
+    assert bad[0] == 422 and 'unlucky x' in bad[1]['error']
+    assert nan == (200, dict(y=[None, 10, 10]))
+    assert oversized.startswith(b'HTTP/1.1 413')
+
+
+def test_malformed_bodies_are_answered_with_400():
+    """bodies that are not json objects, or whose params or fixed are not objects, get a 400 response"""
+    async def run():
+        server = await EvalServer().start(port=0)
+        try:
+            return await asyncio.gather(_post(server.port, '/eval/michaelis_menten', dict(x=[1, 2], params=[1, 2])),
+                                        _post(server.port, '/fit/michaelis_menten', dict(x=[1], y=[1], fixed=3)),
+                                        _post(server.port, '/eval/michaelis_menten', [1, 2]))
+        finally:
+            await server.close()
+
+    for status, value in asyncio.run(run()):
+        assert status == 400 and 'json object' in value['error']
@@ -0,0 +1,40 @@
+"""
+unit testing for the benchmark suite
+"""
+import json
+
+from pharmaplot import bench
+from pharmaplot.__main__ import main
+
+
+def test_kernels_cover_every_model_function_and_dtype():
+    """every public function of mm and receptors is timed in both dtypes, and float32 inputs stay float32"""
+    results = bench.bench_kernels(sizes=(100, 1000), min_time=0., repeat=1)
+    names = {entry['name'] for entry in results}
+    assert {'michaelis_menten', 'scatchard', 'four_parameter_logistic_equation'} <= names
+    assert not any(name.endswith('_jacobian') for name in names)
+    assert len(results) == len(names) * 2 * 2
+    assert all(entry['seconds'] > 0 and entry['result_dtype'] == entry['dtype'] for entry in results)
+
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    """slower kernels and larger pages beyond the tolerance are regressions, and the command exits with 1"""
+    baseline = bench.run(str(tmp_path / 'baseline.json'), sizes=(100,), dtypes=('float64',), builds=False,
+                         min_time=0., repeat=1)
+    baseline['pages'] = [dict(page='01-mm.html', bytes=1000), dict(page='02-mm.html', bytes=1000)]
+    current = json.loads(json.dumps(baseline))
+    current['kernels'][0]['seconds'] *= 2
+    current['pages'][0]['bytes'] = 1005
+    current['pages'][1]['bytes'] = 1100
+
+    rows = {row['key']: row for row in bench.compare(baseline, current)}
+    assert rows[f'kernel {baseline["kernels"][0]["name"]} float64 n=1e+02']['regression']
+    assert [rows['page 01-mm.html']['regression'], rows['page 02-mm.html']['regression']] == [False, True]
+    assert sum(row['regression'] for row in rows.values()) == 2
+
+    for name, results in (('baseline.json', baseline), ('current.json', current)):
+        with open(tmp_path / name, 'w') as f:
+            json.dump(results, f)
+    assert main(['bench-compare', str(tmp_path / 'baseline.json'), str(tmp_path / 'baseline.json')]) == 0
+    assert main(['bench-compare', str(tmp_path / 'baseline.json'), str(tmp_path / 'current.json')]) == 1
+    assert '2 regressions' in capsys.readouterr().out
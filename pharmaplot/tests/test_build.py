@@ -0,0 +1,51 @@
+"""
+unit testing for the headless incremental site build
+"""
+import json
+
+import pytest
+from pharmaplot.build import MANIFEST, build, dependencies
+
+pytest.importorskip('bokeh')
+
+SCRIPT = '''
+import numpy as np
+from bokeh.plotting import figure, output_file, show
+from pharmaplot import mm
+from pharmaplot.config import html_output_dir
+
+plot = figure(title={title!r})
+plot.line([1, 2, 3], mm.michaelis_menten(np.array([1, 2, 3]), 10, 2))
+show(plot)  # preview before output_file, not saved
+output_file(html_output_dir + {page!r})
+show(plot)
+'''
+
+
+def test_dependencies_follow_pharmaplot_imports(tmp_path):
+    """a script importing pharmaplot.callbacks depends on the registry and the model modules behind it"""
+    script = tmp_path / 'page.py'
+    script.write_text('from pharmaplot.callbacks import callback_code\n')
+    names = {path.rsplit('/', 1)[-1] for path in dependencies(str(script))}
+    assert {'callbacks.py', 'models.py', 'mm.py', 'receptors.py'} <= names
+
+
+def test_build_skips_unchanged_pages(tmp_path):
+    """only the page whose script changed is rendered again"""
+    scripts = []
+    for n in range(2):
+        script = tmp_path / f'{n}-page.py'
+        script.write_text(SCRIPT.format(title='before', page=f'{n}-page.html'))
+        scripts.append(str(script))
+    output_dir = tmp_path / 'site'
+
+    report = build(scripts, output_dir=str(output_dir), workers=1)
+    assert [entry['status'] for entry in report] == ['built', 'built', 'shared']
+    assert sorted(p.name for p in output_dir.glob('*.html')) == ['0-page.html', '1-page.html']
+
+    (tmp_path / '1-page.py').write_text(SCRIPT.format(title='after', page='1-page.html'))
+    report = build(scripts, output_dir=str(output_dir), workers=1)
+    assert [entry['status'] for entry in report] == ['cached', 'built', 'shared']
+    assert 'after' in (output_dir / '1-page.html').read_text()
+    assert all(report[-1]['outputs'][0] in (output_dir / page).read_text() for page in ('0-page.html', '1-page.html'))
+    assert json.loads((output_dir / MANIFEST).read_text())['1-page.py']['outputs'] == ['1-page.html']
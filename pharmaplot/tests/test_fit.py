@@ -0,0 +1,70 @@
+"""
+unit testing for batched curve fitting
+"""
+import numpy as np
+from pharmaplot import mm, receptors
+from pharmaplot.fit import eadie_hofstee_estimate, fit_batch, lineweaver_burk_estimate, scatchard_estimate
+
+
+def test_fit_recovers_4pl_parameters():
+    """noise-free dose-response curves should be fitted (almost) exactly, missing points included"""
+    rng = np.random.default_rng(0)
+    x = np.linspace(-9, -3, num=12)
+    true = np.column_stack([rng.uniform(80, 120, 200), rng.uniform(-5, 10, 200),
+                            rng.uniform(0.6, 2, 200), rng.uniform(-8, -4, 200)])
+    y = receptors.four_parameter_logistic_equation(x, *(true[:, i:i + 1] for i in range(4)))
+    y[0, 5] = np.nan
+
+    result = fit_batch(receptors.four_parameter_logistic_equation, x, y)
+
+    assert result.names == ('top', 'bottom', 'hillslope', 'logec50')
+    assert result.converged.all()
+    np.testing.assert_allclose(result.params, true, rtol=1e-4, atol=1e-4)
+
+
+def test_fit_with_fixed_parameters_and_stderr():
+    """fixed parameters are excluded from the fit and standard errors come back for the rest"""
+    rng = np.random.default_rng(1)
+    substrate = np.logspace(-1, 2, num=10)
+    y = mm.mm_competitive(substrate, vmax=100., km=5., ki=2., conc_i=4.) + rng.normal(0, 1, (50, 10))
+
+    result = fit_batch('mm_competitive', substrate, y, fixed=dict(ki=2., conc_i=4.))
+
+    assert result.names == ('vmax', 'km')
+    assert result.params.shape == result.stderr.shape == (50, 2)
+    assert np.all(result.stderr > 0)
+    np.testing.assert_allclose(np.median(result.params, axis=0), [100., 5.], rtol=0.05)
+
+
+def test_degenerate_data_is_not_reported_as_a_determined_fit():
+    """missing, flat and pure-noise data never give converged non-finite parameters or spurious standard errors"""
+    rng = np.random.default_rng(2)
+    x = np.linspace(-9, -4, num=12)
+
+    missing = fit_batch('four_parameter_logistic_equation', x, np.full((3, 12), np.nan))
+    assert not missing.converged.any() and np.isnan(missing.stderr).all()
+
+    flat = fit_batch('four_parameter_logistic_equation', x, np.full((3, 12), 50.))
+    np.testing.assert_allclose(flat.params[:, :2], 50.)
+    assert np.isnan(flat.stderr).all()
+
+    noise = fit_batch('four_parameter_logistic_equation', x, rng.normal(50, 10, (200, 12)))
+    assert np.isfinite(noise.params[noise.converged]).all()
+    # steep steps fitted to noise leave the slope undetermined (nan or huge errors) rather than known to 1e-35
+    assert np.all(np.isnan(noise.stderr) | (noise.stderr > 1e-3))
+    assert not np.any(noise.stderr[np.abs(noise.params[:, 2]) > 100, 2] < 1e3)
+
+
+def test_linearization_estimates_are_exact_without_noise():
+    """the lineweaver-burk, eadie-hofstee and scatchard lines recover the parameters of noise-free data"""
+    x = np.logspace(-1, 2, num=8)
+    vmax, km = np.array([[50.], [100.], [150.]]), np.array([[1.], [10.], [30.]])
+    v = mm.michaelis_menten(x, vmax, km)
+    v[1, 3] = np.nan
+    for estimate in (lineweaver_burk_estimate(x, v), eadie_hofstee_estimate(x, v)):
+        np.testing.assert_allclose(estimate['vmax'], vmax[:, 0], rtol=1e-10)
+        np.testing.assert_allclose(estimate['km'], km[:, 0], rtol=1e-10)
+
+    estimate = scatchard_estimate(x, receptors.specific_binding(x, vmax, km))
+    np.testing.assert_allclose(estimate['bmax'], vmax[:, 0], rtol=1e-10)
+    np.testing.assert_allclose(estimate['kd'], km[:, 0], rtol=1e-10)
@@ -0,0 +1,73 @@
+"""
+unit testing for broadcast parameter-grid evaluation
+"""
+import pytest
+import numpy as np
+from pharmaplot import mm, receptors
+from pharmaplot.grid import evaluate_grid, grid_parameters
+
+
+def test_product_grid_matches_loops():
+    """every curve of a cartesian grid should match a direct call to the model"""
+    x = np.logspace(-1, 2, num=50)
+    ki_list = [0.1, 1, 10, 100]
+    conc_i_list = [0, 0.1, 1, 10, 100]
+
+    for model in [mm.mm_competitive, mm.mm_noncompetitive, mm.mm_uncompetitive,
+                  mm.lwb_competitive, mm.lwb_noncompetitive, mm.lwb_uncompetitive]:
+        grid = evaluate_grid(model, x, vmax=100., km=10., ki=ki_list, conc_i=conc_i_list)
+        assert grid.shape == (4, 5, 50)
+        for i, ki in enumerate(ki_list):
+            for j, conc_i in enumerate(conc_i_list):
+                np.testing.assert_allclose(grid[i, j], model(x, vmax=100., km=10., ki=ki, conc_i=conc_i))
+
+
+def test_zip_grid_and_out_buffer():
+    """zip mode pairs parameters element-wise and writes into a preallocated buffer"""
+    x = np.linspace(-9, -3, num=16)
+    top = np.array([100., 80., 120.])
+    logec50 = np.array([-6., -7., -5.])
+    out = np.empty((3, 16), dtype=np.float32)
+
+    result = evaluate_grid(receptors.four_parameter_logistic_equation, x, mode='zip', out=out,
+                           dtype=np.float32, top=top, bottom=0., hillslope=1., logec50=logec50)
+
+    assert result is out
+    for i in range(3):
+        expected = receptors.four_parameter_logistic_equation(x, top[i], 0., 1., logec50[i])
+        np.testing.assert_allclose(out[i], expected, rtol=1e-5)
+
+    params = grid_parameters(receptors.four_parameter_logistic_equation, mode='zip',
+                             top=top, bottom=0., hillslope=1., logec50=logec50)
+    np.testing.assert_array_equal(params['logec50'], logec50)
+
+
+def test_bad_out_buffer():
+    """an out buffer of the wrong shape is rejected"""
+    with pytest.raises(ValueError):
+        evaluate_grid(mm.michaelis_menten, np.arange(1., 5.), out=np.empty((2, 4)), vmax=[1., 2., 3.], km=1.)
+
+
+def test_parallel_evaluation_matches_serial():
+    """threads writing blocks of the shared output give the serial result, for long x and for large grids"""
+    x = np.linspace(0.1, 100, 3 * 2 ** 18 + 5)
+    np.testing.assert_array_equal(evaluate_grid(mm.mm_noncompetitive, x, workers=3),
+                                  evaluate_grid(mm.mm_noncompetitive, x))
+
+    x = np.linspace(-9, -3, 1000)
+    params = dict(top=100., bottom=0., hillslope=np.linspace(0.5, 2, 37), logec50=np.linspace(-8, -5, 29))
+    out = np.empty((37, 29, 1000), dtype=np.float32)
+    assert evaluate_grid(receptors.four_parameter_logistic_equation, x, out=out, dtype=np.float32, workers=4,
+                         **params) is out
+    np.testing.assert_array_equal(out, evaluate_grid(receptors.four_parameter_logistic_equation, x, dtype=np.float32,
+                                                     **params))
+
+
+def test_scalar_x_with_many_curves():
+    """a scalar x against a long parameter axis is split along the parameters, serially and on threads"""
+    kd = np.linspace(1, 10, 300000)
+    expected = receptors.specific_binding_hill(5., 1., kd, 1.5)
+    for workers in (1, 3):
+        result = evaluate_grid(receptors.specific_binding_hill, 5.0, mode='zip', workers=workers, bmax=1., kd=kd,
+                               hill_coef=1.5)
+        np.testing.assert_allclose(result, expected, rtol=1e-15)
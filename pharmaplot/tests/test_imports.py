@@ -0,0 +1,48 @@
+"""
+import-time budget: the modules must stay cheap to import in worker processes and short-lived command line calls
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODULES = ['pharmaplot', 'pharmaplot.mm', 'pharmaplot.receptors', 'pharmaplot.models', 'pharmaplot.grid',
+           'pharmaplot.fit', 'pharmaplot.callbacks', 'pharmaplot.lookup', 'pharmaplot.pipeline', 'pharmaplot.spec',
+           'pharmaplot.build', 'pharmaplot.payload', 'pharmaplot.resources', 'pharmaplot.server', 'pharmaplot.api',
+           'pharmaplot.ingest', 'pharmaplot.store', 'pharmaplot.bench', 'pharmaplot.instrument', 'pharmaplot.sweep',
+           'pharmaplot.accuracy', 'pharmaplot.sampling', 'pharmaplot.transforms', 'pharmaplot.__main__']
+
+# top-level packages that may only be imported lazily, inside the functions that use them
+LAZY = {'bokeh', 'scipy', 'pandas', 'yaml', 'jinja2', 'multiprocessing', 'concurrent'}
+
+# import time of a module on top of numpy (which every worker needs anyway), in milliseconds. the modules currently
+# take well under 10 ms; the margin is for slow or busy machines
+BUDGET_MS = 50
+
+
+def _import_times(module: str) -> list:
+    """(self time in microseconds, module name) of everything `import module` loads after numpy"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import numpy; import {module}'],
+                            capture_output=True, text=True, check=True, cwd=ROOT_DIR).stderr
+    entries = []
+    for line in stderr.splitlines():
+        fields = line[len('import time:'):].split('|')
+        if line.startswith('import time:') and fields[0].strip().isdigit():
+            entries.append((int(fields[0]), fields[2].strip(), fields[2].rstrip() == ' numpy'))
+    start = max(i for i, (_, _, top_level_numpy) in enumerate(entries) if top_level_numpy) + 1
+    return [(us, name) for us, name, _ in entries[start:]]
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_is_lazy_and_within_budget(module):
+    """no heavy dependency is imported eagerly, and the import stays within the time budget"""
+    times = _import_times(module)
+    eager = sorted({name.split('.')[0] for _, name in times} & LAZY)
+    assert not eager, f'{module} imports {", ".join(eager)} at import time'
+
+    total_ms = sum(us for us, _ in times) / 1000
+    slowest = sorted(times, reverse=True)[:5]
+    assert total_ms < BUDGET_MS, f'importing {module} took {total_ms:.1f} ms; slowest: {slowest}'
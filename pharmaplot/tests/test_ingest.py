@@ -0,0 +1,46 @@
+"""
+unit testing for the chunked ingestion of plate-reader exports and its columnar cache
+"""
+import numpy as np
+import pytest
+from pharmaplot import ingest
+from pharmaplot.pipeline import read_plates, run_pipeline
+from pharmaplot.tests.test_pipeline import _write_campaign
+
+pytest.importorskip('pandas')
+
+
+def test_units_are_normalized_to_molar(tmp_path):
+    """conc with a unit column or a unit in the header gives the same molar concentrations"""
+    (tmp_path / 'unit.csv').write_text('plate,compound,conc,unit,response\n'
+                                       'P1,A,10,nM,1\nP1,A,2.5,uM,2\nP1,A,1,mM,3\nP1,POS,,,4\n')
+    (tmp_path / 'header.tsv').write_text('plate\tcompound\tconc (nM)\tresponse\n'
+                                         'P1\tA\t10\t1\nP1\tA\t2500\t2\nP1\tA\t1000000\t3\nP1\tPOS\t\t4\n')
+    for name in ('unit.csv', 'header.tsv'):
+        columns = ingest.ingest(str(tmp_path / name), cache_dir=str(tmp_path / 'cache'))
+        np.testing.assert_allclose(columns.conc, [1e-8, 2.5e-6, 1e-3, np.nan], rtol=1e-12)
+
+    (tmp_path / 'bad.csv').write_text('plate,compound,conc,unit,response\nP1,A,10,ppm,1\n')
+    with pytest.raises(ValueError, match='ppm'):
+        ingest.ingest(str(tmp_path / 'bad.csv'), cache_dir=str(tmp_path / 'cache'))
+
+
+def test_cached_plates_match_the_csv_reader(tmp_path, monkeypatch):
+    """plates read through the cache equal those parsed row by row, and a second read does not parse at all"""
+    export = tmp_path / 'campaign.csv'
+    _write_campaign(str(export), plates=4, compounds=6)
+    cached = list(ingest.read_plates(str(export), cache_dir=str(tmp_path / 'cache'), chunksize=50))
+    for plate, expected in zip(cached, read_plates(str(export)), strict=True):
+        assert (plate.name, plate.compounds) == (expected.name, expected.compounds)
+        for a, b in zip(plate[2:], expected[2:]):
+            np.testing.assert_allclose(a, b, rtol=1e-12)
+
+    def parse(*args):
+        raise AssertionError('the export was parsed again')
+
+    monkeypatch.setattr(ingest, 'read_chunks', parse)
+    columns = ingest.ingest(str(export), cache_dir=str(tmp_path / 'cache'))
+    assert isinstance(columns.response, np.memmap) and len(columns.plates) == 4
+
+    summary = run_pipeline(str(export), str(tmp_path / 'results.csv'), workers=1, cache_dir=str(tmp_path / 'cache'))
+    assert (summary['plates'], summary['compounds']) == (4, 24)
@@ -0,0 +1,50 @@
+"""
+unit testing for the opt-in instrumentation
+"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+from pharmaplot import fit, instrument, mm, pipeline, receptors
+from pharmaplot.models import get_model
+
+
+def test_functions_are_only_wrapped_while_enabled(tmp_path):
+    """model functions and stages are recorded with their call paths, and restored untouched afterwards"""
+    originals = mm.michaelis_menten, pipeline.fit_batch, get_model('four_parameter_logistic_equation').jacobian
+    x = np.linspace(-9, -4, 8)
+    y = receptors.four_parameter_logistic_equation(x, 100., 0., 1., np.array([[-7.], [-6.]]))
+
+    with instrument.instrument(str(tmp_path / 'profile.folded'), memory=True) as profile:
+        assert instrument.enabled() and mm.michaelis_menten is not originals[0]
+        mm.michaelis_menten(np.ones(100), 1., 2.)
+        assert get_model(originals[0]) is get_model('michaelis_menten')
+        fit.fit_batch('four_parameter_logistic_equation', x, y)
+    assert not instrument.enabled()
+    restored = mm.michaelis_menten, pipeline.fit_batch, get_model('four_parameter_logistic_equation').jacobian
+    assert restored == originals
+
+    record = profile.functions['michaelis_menten']
+    assert (record['calls'], record['elements'], record['result_bytes']) == (1, 100, 800)
+    assert record['peak_bytes'] >= 800
+    assert profile.functions['fit_batch']['calls'] == 1 and profile.functions['fit_batch']['elements'] == 8
+    assert ('fit_batch', 'four_parameter_logistic_equation_jacobian') in profile.stacks
+
+    lines = (tmp_path / 'profile.folded').read_text().splitlines()
+    assert 'michaelis_menten' in [line.rsplit(' ', 1)[0] for line in lines]
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+
+def test_environment_variable_writes_profile_at_exit(tmp_path):
+    """PHARMAPLOT_PROFILE turns instrumentation on for a whole process and writes json when it exits"""
+    output = tmp_path / 'profile.json'
+    code = 'import numpy as np\nfrom pharmaplot.receptors import specific_binding\nspecific_binding(np.ones(10), 1, 2)'
+    env = dict(os.environ, PHARMAPLOT_PROFILE=str(output))
+    subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    with open(output) as f:
+        profile = json.load(f)
+    assert profile['functions']['specific_binding']['calls'] == 1
+    assert profile['stacks'].keys() == {'specific_binding'}
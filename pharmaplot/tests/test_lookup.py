@@ -0,0 +1,82 @@
+"""
+unit testing for precomputed slider-state lookup tables
+"""
+import json
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+import numpy as np
+from pharmaplot import receptors
+from pharmaplot.lookup import build_lookup, keeps_slider_values, slider_values
+
+pytest.importorskip('bokeh')
+
+
+def make_sliders():
+    return dict(ec50=SimpleNamespace(start=3, end=8, step=0.5, value=6),
+                hill=SimpleNamespace(start=0.5, end=2, step=0.5, value=1.5))
+
+
+def test_slider_values():
+    """all reachable slider values, optionally thinned out"""
+    slider = SimpleNamespace(start=0, end=10, step=2.5)
+    np.testing.assert_allclose(slider_values(slider), [0, 2.5, 5, 7.5, 10])
+    np.testing.assert_allclose(slider_values(slider, stride=2), [0, 5, 10])
+
+
+def test_falls_back_to_live_code_over_budget():
+    """a table that does not fit in the budget is replaced by the live model kernels"""
+    x = np.linspace(-9, -3, 10)
+    code, args, report = build_lookup([('four_parameter_logistic_equation', ['LineSource'])],
+                                      xs=dict(LineSource=x), sliders=make_sliders(),
+                                      params=dict(top='100', bottom='0', hillslope='hill', logec50='-ec50'),
+                                      budget=10)
+    assert args == {}
+    assert 'function four_parameter_logistic_equation' in code
+    assert not any(entry['chosen'] for entry in report)
+
+
+def test_coarse_tables_keep_the_slider_values():
+    """a coarser table is only used when the starting values and slider ends stay in it; its error is measured
+    against the original slider steps"""
+    x = np.linspace(-9, -3, 10)
+    params = dict(top='100', bottom='0', hillslope='hill', logec50='-ec50')
+    sliders = dict(ec50=SimpleNamespace(start=3, end=8, step=0.5, value=6),
+                   hill=SimpleNamespace(start=0.5, end=2.5, step=0.5, value=1.5))
+    assert all(keeps_slider_values(slider, 2) for slider in sliders.values())
+    code, args, report = build_lookup([('four_parameter_logistic_equation', ['LineSource'])], xs=dict(LineSource=x),
+                                      sliders=sliders, params=params, budget=600, max_error=1., snap_sliders=True)
+    chosen, = [entry for entry in report if entry['chosen']]
+    assert chosen['stride'] == 2 and chosen['error'] > 0.01
+    assert (sliders['ec50'].step, sliders['hill'].step) == (1, 1)
+
+    sliders = dict(ec50=SimpleNamespace(start=3, end=8, step=0.5, value=6.5),
+                   hill=SimpleNamespace(start=0.5, end=2.5, step=0.5, value=1.5))
+    code, args, report = build_lookup([('four_parameter_logistic_equation', ['LineSource'])], xs=dict(LineSource=x),
+                                      sliders=sliders, params=params, budget=600, max_error=1., snap_sliders=True)
+    assert args == {} and sliders['ec50'].step == 0.5
+    assert {entry['skipped'] for entry in report if entry['stride'] > 1} == {'misses a slider value'}
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_lookup_code_matches_model():
+    """the generated callback should copy the curve of the current slider state out of the table"""
+    x = np.linspace(-9, -3, 10)
+    sliders = make_sliders()
+    code, args, report = build_lookup([('four_parameter_logistic_equation', ['LineSource'])],
+                                      xs=dict(LineSource=x), sliders=sliders,
+                                      params=dict(top='100', bottom='0', hillslope='hill', logec50='-ec50'))
+    assert [entry['stride'] for entry in report if entry['chosen']] == [1]
+
+    codes = args['LookupTable'].data['codes']
+    script = (f'const LookupTable = {{data: {{codes: {json.dumps(codes.tolist())}}}}};\n'
+              f'const LineSource = {{data: {{y: new Float64Array({x.size})}}, change: {{emit() {{}}}}}};\n'
+              f'const ec50 = {{value: 6.5}}, hill = {{value: 1.5}};\n'
+              f'{code}\n'
+              f'console.log(JSON.stringify(Array.from(LineSource.data.y)));')
+    output = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout
+
+    expected = receptors.four_parameter_logistic_equation(x, 100, 0, 1.5, -6.5)
+    np.testing.assert_allclose(json.loads(output), expected, atol=1e-2)
@@ -0,0 +1,107 @@
+"""
+unit testing for the model registry and the generated numpy/javascript kernels
+"""
+import json
+import shutil
+import subprocess
+
+import pytest
+import numpy as np
+from pharmaplot.callbacks import callback_code
+from pharmaplot.models import MODELS
+
+# one set of typical parameter values for every registered model
+TEST_PARAMS = {
+    'michaelis_menten': dict(vmax=100., km=5.),
+    'mm_competitive': dict(vmax=100., km=5., ki=2., conc_i=3.),
+    'mm_noncompetitive': dict(vmax=100., km=5., ki=2., conc_i=3.),
+    'mm_uncompetitive': dict(vmax=100., km=5., ki=2., conc_i=3.),
+    'lineweaver_burk': dict(vmax=10., km=1.),
+    'lwb_competitive': dict(vmax=10., km=1., ki=2., conc_i=3.),
+    'lwb_noncompetitive': dict(vmax=10., km=1., ki=2., conc_i=3.),
+    'lwb_uncompetitive': dict(vmax=10., km=1., ki=2., conc_i=3.),
+    'specific_binding': dict(bmax=100., kd=2.),
+    'specific_binding_hill': dict(bmax=100., kd=2., hill_coef=1.7),
+    'competitive_binding': dict(nonspecific=5., total=100., pIC50=1., nH=0.8),
+    'four_parameter_logistic_equation': dict(top=100., bottom=5., hillslope=1.2, logec50=-0.5),
+}
+
+X = np.linspace(0.1, 3, num=25)
+
+
+def test_every_model_has_test_params():
+    """keep the parameter table above in sync with the registry"""
+    assert set(TEST_PARAMS) == set(MODELS)
+
+
+@pytest.mark.parametrize('name', sorted(TEST_PARAMS))
+def test_numpy_kernel_matches_function(name):
+    """the generated in-place kernel should reproduce the model function"""
+    model = MODELS[name]
+    params = TEST_PARAMS[name]
+    out = np.empty_like(X)
+    model.kernel(X, *(params[p] for p in model.parameters), out=out)
+    np.testing.assert_allclose(out, model.function(X, **params), rtol=1e-12)
+
+
+def test_kernels_compute_repeated_subexpressions_once():
+    """the hill equation takes one power per point (its clamp is hoisted), the logistic one exponential, and named
+    constants are inlined"""
+    source = MODELS['specific_binding_hill'].kernel_source
+    assert source.count('np.power(') == 1 and 'exp(-80.0 / hill_coef)' in source
+    assert MODELS['four_parameter_logistic_equation'].kernel_source.count('np.exp(') == 1
+    assert 'Math.max(xi, t0)' in MODELS['specific_binding_hill'].js()
+    assert '2.302585092994046' in MODELS['competitive_binding'].js()
+
+
+@pytest.mark.parametrize('name', sorted(TEST_PARAMS))
+def test_analytic_jacobian_matches_finite_differences(name):
+    """the fused value and partial derivatives should agree with the function and central differences"""
+    model = MODELS[name]
+    params = TEST_PARAMS[name]
+    value, jacobian = model.jacobian(X, **params)
+    np.testing.assert_allclose(value, model.function(X, **params), rtol=1e-12)
+    assert jacobian.shape == X.shape + (len(model.parameters),)
+
+    for i, p in enumerate(model.parameters):
+        step = 1e-6 * max(abs(params[p]), 1.)
+        upper = model.function(X, **dict(params, **{p: params[p] + step}))
+        lower = model.function(X, **dict(params, **{p: params[p] - step}))
+        np.testing.assert_allclose(jacobian[:, i], (upper - lower) / (2 * step), rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_js_kernels_match_functions():
+    """the generated javascript kernels should reproduce the model functions"""
+    script = [MODELS[name].js() for name in TEST_PARAMS]
+    script.append(f'const x = Float64Array.from({json.dumps(X.tolist())});')
+    script.append('const results = {};')
+    for name, params in TEST_PARAMS.items():
+        script.append(f'results["{name}"] = new Float64Array(x.length);')
+        script.append(f'{name}(x, results["{name}"], {json.dumps(params)});')
+    script.append('console.log(JSON.stringify(Object.fromEntries('
+                  'Object.entries(results).map(([k, v]) => [k, Array.from(v)]))));')
+
+    output = subprocess.run(['node', '-e', '\n'.join(script)], capture_output=True, text=True, check=True).stdout
+    results = json.loads(output)
+    for name, params in TEST_PARAMS.items():
+        np.testing.assert_allclose(results[name], MODELS[name].function(X, **params), rtol=1e-12)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_callback_updates_once_per_frame():
+    """slider changes within one animation frame lead to a single update with the latest value, emitted once"""
+    code = callback_code([('michaelis_menten', ['LineSource', ('LineSource', 'x', 'y2')])],
+                         params=dict(vmax='vmax.value', km='5'))
+    script = (f'const frames = [];\n'
+              f'const requestAnimationFrame = (f) => frames.push(f);\n'
+              f'let emits = 0;\n'
+              f'const LineSource = {{data: {{x: [5], y: [0], y2: [0]}}, change: {{emit() {{ emits++; }}}}}};\n'
+              f'const vmax = {{value: 0}};\n'
+              f'function callback() {{\n{code}\n}}\n'
+              f'for (const value of [10, 20, 30]) {{ vmax.value = value; callback(); }}\n'
+              f'const scheduled = frames.length;\n'
+              f'frames.forEach((f) => f());\n'
+              f'console.log(JSON.stringify([scheduled, emits, LineSource.data.y[0], LineSource.data.y2[0]]));')
+    output = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout
+    assert json.loads(output) == [1, 1, 15, 15]
@@ -0,0 +1,90 @@
+"""
+unit testing for the compact encoding of page data arrays
+"""
+import base64
+import html
+import json
+import re
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+from pharmaplot.payload import TABLE_ID, optimize_html
+
+bokeh = pytest.importorskip('bokeh')
+
+
+def _page(y: str = 'b', ratio: str = 'bf'):
+    """small standalone page with a duplicated baseline, an x_log column and a ratio column"""
+    from bokeh.embed import file_html
+    from bokeh.models import ColumnDataSource
+    from bokeh.plotting import figure
+    from bokeh.resources import CDN
+
+    x = np.logspace(-9, -3, num=50)
+    b = 100 * x / (x + 1e-6)
+    source = ColumnDataSource(data={'x': x, 'x_log': np.log10(x), y: b, ratio: b / x})
+    plot = figure(title='Specific Binding (μM)')
+    plot.line('x_log', y, source=source)
+    plot.line(np.log10(x), b, line_alpha=0.3)
+    return file_html(plot, CDN)
+
+
+def _arrays(page: str) -> list:
+    docs_json = re.search(r'<script type="application/json" id="\d+">\s*(.*?)\s*</script>', page, re.S).group(1)
+    docs = json.loads(html.unescape(docs_json))
+    found = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if '__ndarray__' in node:
+                found.append(np.frombuffer(base64.b64decode(node['__ndarray__']), dtype=node['dtype']))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+    walk(docs)
+    return found
+
+
+def test_optimize_dedupes_and_derives_columns():
+    """the baseline copies are stored once and x_log and B/F are left to the browser"""
+    page, report = optimize_html(_page(), encoding='float32')
+    assert report['arrays'] == 6
+    assert (report['stored'], report['derived']) == (2, 2)
+    assert report['after'] < report['before']
+    assert TABLE_ID in page and 'μM' in page
+    assert optimize_html(page)[0] == page
+
+
+def test_derivations_do_not_depend_on_column_names():
+    """x is not taken for y / (y / x) when that would leave x_log to be stored (as with pharmaplot.transforms names)"""
+    page, report = optimize_html(_page(y='y', ratio='y_over_x'), encoding='float32')
+    assert (report['stored'], report['derived']) == (2, 2)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+@pytest.mark.parametrize('encoding', ['float64', 'float32', 'uint16'])
+def test_browser_expansion_restores_the_arrays(encoding):
+    """running the decoder script gives back the original document arrays"""
+    original = _page()
+    page, _ = optimize_html(original, encoding=encoding)
+    docs_id, docs_json = re.search(r'<script type="application/json" id="(\d+)">\s*(.*?)\s*</script>', page,
+                                   re.S).groups()
+    table_json = re.search(rf'<script type="application/json" id="{TABLE_ID}">(.*?)</script>', page, re.S).group(1)
+    decoder = re.search(r'<script type="text/javascript">\s*(\(function\(\) \{.*?\}\)\(\);)\s*</script>', page[
+        page.index(TABLE_ID):], re.S).group(1)
+
+    script = (f'const elements = {{"{docs_id}": {{textContent: {json.dumps(docs_json)}}}, '
+              f'"{TABLE_ID}": {{textContent: {json.dumps(table_json)}}}}};\n'
+              'const document = {getElementById: (id) => elements[id]};\n'
+              f'{decoder}\n'
+              f'process.stdout.write(elements["{docs_id}"].textContent);')
+    expanded = subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout
+    expanded_page = page.replace(docs_json, expanded)
+
+    rtol = dict(float64=1e-12, float32=1e-6, uint16=1e-4)[encoding]
+    for restored, expected in zip(_arrays(expanded_page), _arrays(original)):
+        np.testing.assert_allclose(restored, expected, rtol=rtol, atol=rtol * np.abs(expected).max())
@@ -0,0 +1,79 @@
+"""
+unit testing for the multi-plate dose-response pipeline
+"""
+import csv
+
+import numpy as np
+from pharmaplot import ingest, receptors
+from pharmaplot.__main__ import main
+from pharmaplot.pipeline import plate_qc, read_plates, run_pipeline
+
+
+def _write_campaign(path, plates=3, compounds=5, seed=0):
+    """plate-reader export with noise-free 4PL compounds and noisy controls; returns the true logec50 values"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-9, -4, num=8)
+    logec50 = {}
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['plate', 'compound', 'log_conc', 'response'])
+        for p in range(plates):
+            for c in range(compounds):
+                logec50[f'P{p}', f'C{c}'] = rng.uniform(-8, -5)
+                y = receptors.four_parameter_logistic_equation(x, 100., 0., 1., logec50[f'P{p}', f'C{c}'])
+                writer.writerows([f'P{p}', f'C{c}', xi, yi] for xi, yi in zip(x, y))
+            writer.writerows([f'P{p}', 'POS', '', v] for v in rng.normal(100, 3, 8))
+            writer.writerows([f'P{p}', 'NEG', '', v] for v in rng.normal(0, 3, 8))
+    return logec50
+
+
+def test_plate_qc():
+    """Z' and signal window follow their textbook definitions"""
+    qc = plate_qc([90., 110.], [0., 10.])
+    spread = 3 * (np.std([90., 110.], ddof=1) + np.std([0., 10.], ddof=1))
+    assert np.isclose(qc['z_prime'], 1 - spread / 95.)
+    assert np.isclose(qc['signal_window'], (95. - spread) / np.std([90., 110.], ddof=1))
+    assert np.isnan(plate_qc([100.], [0., 1.])['z_prime'])
+
+
+def test_pipeline_streams_qc_and_fits(tmp_path):
+    """every plate is read, QC'd and fitted, and a second run appends to the same tables"""
+    export = tmp_path / 'campaign.csv'
+    truth = _write_campaign(str(export))
+    assert [plate.name for plate in read_plates(str(export))] == ['P0', 'P1', 'P2']
+
+    output = tmp_path / 'results.csv'
+    summary = run_pipeline(str(export), str(output), workers=2, max_in_flight=2)
+    assert (summary['plates'], summary['compounds'], summary['converged'], summary['passed_qc']) == (3, 15, 15, 3)
+
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 15
+    for row in rows:
+        assert np.isclose(float(row['logec50']), truth[row['plate'], row['compound']], atol=1e-4)
+
+    assert main(['pipeline', str(export), '-o', str(output), '-j', '1']) == 0
+    with open(tmp_path / 'results.qc.csv') as f:
+        assert len(list(csv.DictReader(f))) == 6
+
+
+def test_blank_and_failed_wells_are_skipped(tmp_path):
+    """wells without a numeric response or concentration are left out of the fits and QC and counted in the report"""
+    export = tmp_path / 'campaign.csv'
+    truth = _write_campaign(str(export), plates=1)
+    with open(export, 'a', newline='') as f:
+        csv.writer(f).writerows([['P0', 'C0', -6.5, ''], ['P0', 'C1', '', 50.], ['P0', 'C2', -6.5, 'OVRFLW'],
+                                 ['P0', 'POS', '', ''], ['P0', 'C9', 'n/a', 'n/a']])
+
+    for plate in [*read_plates(str(export)), *ingest.read_plates(str(export), cache_dir=str(tmp_path / 'cache'))]:
+        assert plate.skipped == 5 and plate.compounds == [f'C{c}' for c in range(5)]
+        assert plate.x.shape == (5, 8) and plate.positive.size == 8 and np.isfinite(plate.y).all()
+
+    output = tmp_path / 'results.csv'
+    summary = run_pipeline(str(export), str(output), workers=1)
+    assert (summary['compounds'], summary['converged'], summary['skipped_wells']) == (5, 5, 5)
+    with open(tmp_path / 'results.qc.csv') as f:
+        assert [row['skipped_wells'] for row in csv.DictReader(f)] == ['5']
+    with open(output) as f:
+        for row in csv.DictReader(f):
+            assert np.isclose(float(row['logec50']), truth[row['plate'], row['compound']], atol=1e-4)
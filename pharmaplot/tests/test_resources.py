@@ -0,0 +1,56 @@
+"""
+unit testing for the shared BokehJS bundle of a site
+"""
+import os
+import re
+
+import pytest
+from pharmaplot.resources import link_site, page_components
+
+bokeh = pytest.importorskip('bokeh')
+
+
+def _write_page(path: str, widgets: bool):
+    from bokeh.embed import file_html
+    from bokeh.layouts import column
+    from bokeh.models import Slider
+    from bokeh.plotting import figure
+    from bokeh.resources import CDN
+
+    plot = figure()
+    plot.line([1, 2, 3], [1, 4, 9])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(file_html(column(plot, Slider(start=0, end=1, value=0, step=.1)) if widgets else plot, CDN))
+
+
+def test_pages_share_one_local_bundle(tmp_path):
+    """every page loads the same hashed bundle with the components of all pages, instead of the CDN scripts"""
+    pages = [str(tmp_path / 'plot.html'), str(tmp_path / 'sliders.html')]
+    _write_page(pages[0], widgets=False)
+    _write_page(pages[1], widgets=True)
+    assert page_components(open(pages[0]).read()) == ['bokeh']
+
+    report = link_site(str(tmp_path), pages)
+    assert report['components'] == ['bokeh', 'bokeh-widgets'] and report['pages'] == 2
+    assert re.fullmatch(rf'static/bokeh-{re.escape(bokeh.__version__)}\.[0-9a-f]{{12}}\.min\.js', report['bundle'])
+    assert os.path.getsize(tmp_path / report['bundle']) == report['bytes']
+    for page in pages:
+        text = open(page).read()
+        assert 'cdn.bokeh.org' not in text
+        assert text.count(f'src="{report["bundle"]}"') == 1
+
+
+def test_relinking_is_idempotent(tmp_path):
+    """linking again leaves the pages and the bundle alone, and a new bundle replaces the stale one"""
+    pages = [str(tmp_path / 'plot.html')]
+    _write_page(pages[0], widgets=False)
+    first = link_site(str(tmp_path), pages)
+    linked = open(pages[0]).read()
+    assert link_site(str(tmp_path), pages) == first and open(pages[0]).read() == linked
+
+    pages.append(str(tmp_path / 'sliders.html'))
+    _write_page(pages[1], widgets=True)
+    second = link_site(str(tmp_path), pages)
+    assert second['bundle'] != first['bundle']
+    assert os.listdir(tmp_path / 'static') == [os.path.basename(second['bundle'])]
+    assert all(open(page).read().count('<script type="text/javascript" src="static/') == 1 for page in pages)
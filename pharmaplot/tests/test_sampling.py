@@ -0,0 +1,52 @@
+"""
+unit testing for adaptive sampling of model curves
+"""
+import numpy as np
+from pharmaplot import mm, receptors
+from pharmaplot.sampling import adaptive_curves, adaptive_x, parameter_sets
+
+
+def _pixel_error(model, x, params, width, height, y_range, dense=20001):
+    """largest distance in pixels between the curve on a dense grid and the chords of the polyline through x"""
+    fine = np.linspace(x[0], x[-1], dense)
+    x_scale, y_scale = width / (x[-1] - x[0]), height / (y_range[1] - y_range[0])
+    u, y = x * x_scale, model(x, **params) * y_scale
+    uq, yq = fine * x_scale, model(fine, **params) * y_scale
+    i = np.clip(np.searchsorted(x, fine) - 1, 0, x.size - 2)
+    du, dy = u[i + 1] - u[i], y[i + 1] - y[i]
+    return (np.abs(du * (yq - y[i]) - dy * (uq - u[i])) / np.hypot(du, dy)).max()
+
+
+def test_steep_curve_stays_within_tolerance_with_few_points():
+    """a steep dose response needs far fewer points than a uniform grid of the same accuracy"""
+    params = dict(top=100., bottom=0., hillslope=4., logec50=-6.)
+    x, curves = adaptive_curves(receptors.four_parameter_logistic_equation, -9, -3, scale='linear', width=600,
+                                height=400, y_range=(-5, 105), tolerance=0.5,
+                                **{name: np.array([value]) for name, value in params.items()})
+
+    assert x.size < 30 and np.all(np.diff(x) > 0) and (x[0], x[-1]) == (-9, -3)
+    np.testing.assert_allclose(curves[0], receptors.four_parameter_logistic_equation(x, **params))
+    assert _pixel_error(receptors.four_parameter_logistic_equation, x, params, 600, 400, (-5, 105)) <= 0.5
+
+    uniform = np.linspace(-9, -3, x.size)
+    assert _pixel_error(receptors.four_parameter_logistic_equation, uniform, params, 600, 400, (-5, 105)) > 1
+
+
+def test_straight_lines_need_only_their_ends():
+    """the lineweaver-burk lines of every slider state are straight, so two points draw them exactly"""
+    sliders = dict(ci=dict(start=0, end=100, value=10), ki=dict(start=1, end=50, value=10))
+    params = parameter_sets(sliders, dict(vmax=100., km=10., ki='ki', conc_i='ci'))
+    x = adaptive_x([mm.lwb_competitive, mm.lwb_noncompetitive], -0.5, 2, scale='linear', x_range=(-0.5, 2),
+                   y_range=(-0.05, 0.5), **params)
+    np.testing.assert_allclose(x, [-0.5, 2])
+
+
+def test_parameter_sets_cover_the_slider_ranges():
+    """the states include the corners and starting values of the sliders, and many values of every slider between"""
+    sliders = dict(a=dict(start=0, end=1, value=0.5), b=dict(start=1, end=3, value=2))
+    params = parameter_sets(sliders, dict(x='a', y='10 ** b', z=3), samples=100)
+
+    assert {name: values.shape for name, values in params.items()} == dict(x=(109,), y=(109,), z=(109,))
+    assert (params['x'].min(), params['x'].max(), params['y'].min(), params['y'].max()) == (0, 1, 10, 1000)
+    assert np.unique(params['x']).size > 100 and np.all(params['z'] == 3)
+    assert {(0., 10.), (0.5, 100.), (1., 1000.)} <= set(zip(params['x'], params['y']))
@@ -0,0 +1,110 @@
+"""
+unit testing for the local plot server and its curve cache
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+from pharmaplot import mm, server
+from pharmaplot.server import CurveCache, PlotServer, load_test
+
+pytest.importorskip('bokeh')
+
+SPEC = dict(
+    model='michaelis_menten',
+    x=dict(start=-1, end=3, line=50, points=10),
+    params=dict(vmax='vmax', km='10 ** log_km'),
+    sliders=dict(vmax=dict(start=0, end=200, value=100, step=10, title='Vmax'),
+                 log_km=dict(start=-1, end=2, value=1, step=0.5, title='log Km')),
+    output=dict(filename='mm.html'),
+)
+
+
+def test_cache_evicts_least_recently_used():
+    """the cache keeps at most maxsize curves and evicts the one used longest ago"""
+    cache = CurveCache(maxsize=2)
+    grid = ('log', -1., 3., 50)
+    for vmax in (1., 2., 1., 3.):
+        cache.get('michaelis_menten', dict(vmax=vmax, km=5.), grid)
+    assert cache.stats() == dict(size=2, maxsize=2, hits=1, misses=3, coalesced=0)
+    cache.get('michaelis_menten', dict(vmax=1., km=5.), grid)
+    cache.get('michaelis_menten', dict(vmax=2., km=5.), grid)
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_identical_requests_are_coalesced(monkeypatch):
+    """requests for a curve that is being computed wait for that computation instead of repeating it"""
+    evaluate, calls = server.evaluate_curve, []
+
+    def slow(*args):
+        calls.append(args)
+        time.sleep(0.2)
+        return evaluate(*args)
+
+    monkeypatch.setattr(server, 'evaluate_curve', slow)
+    cache, results = CurveCache(), []
+    threads = [threading.Thread(target=lambda: results.append(
+        cache.get('michaelis_menten', dict(vmax=1., km=5.), ('linear', 0., 10., 5)))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and cache.coalesced == 3
+    assert all(result is results[0] for result in results)
+
+
+def test_client_grids_are_not_kept_outside_the_curve_cache():
+    """the x grids of requests are not memoized in the unbounded spec cache, and invalid grids are rejected"""
+    from pharmaplot.spec import _x_values
+
+    before = _x_values.cache_info().currsize
+    cache = CurveCache(maxsize=2)
+    for num in range(10, 20):
+        cache.get('michaelis_menten', dict(vmax=1, km=1), ('log', -1, 3, num))
+    assert _x_values.cache_info().currsize == before and len(cache) == 2
+    for grid in (('log', -1, 3, server.MAX_GRID_POINTS + 1), ('linear', 0, float('inf'), 10), ('ln', 0, 1, 10)):
+        with pytest.raises(ValueError, match='grid'):
+            server.evaluate_curve('michaelis_menten', dict(vmax=1, km=1), grid)
+
+
+def test_server_evaluates_curves():
+    """pages load the local bundle, /curve returns the model curves, and a small load test runs without errors"""
+    plot_server = PlotServer([SPEC], port=0)
+    threading.Thread(target=plot_server.serve_forever, daemon=True).start()
+    try:
+        with urllib.request.urlopen(f'{plot_server.url}/mm.html') as response:
+            page = response.read().decode()
+        assert 'cdn.bokeh.org' not in page and 'curves evaluated by the pharmaplot plot server' in page
+        bundle = next(iter(plot_server.static))
+        with urllib.request.urlopen(f'{plot_server.url}{bundle}') as response:
+            assert 'immutable' in response.headers['Cache-Control']
+
+        request = dict(model='michaelis_menten', params=dict(vmax=50, km=2), grids=dict(LineSource=['log', -1, 3, 50]))
+        with urllib.request.urlopen(urllib.request.Request(f'{plot_server.url}/curve',
+                                                           data=json.dumps(request).encode())) as response:
+            y = json.load(response)['y']['LineSource']
+        np.testing.assert_allclose(y, mm.michaelis_menten(np.logspace(-1, 3, num=50), 50, 2))
+
+        request = dict(model='michaelis_menten', params=dict(vmax=50, km=0), grids=dict(LineSource=['linear', 0, 1, 5]))
+        with urllib.request.urlopen(urllib.request.Request(f'{plot_server.url}/curve',
+                                                           data=json.dumps(request).encode())) as response:
+            assert json.loads(response.read(), parse_constant=pytest.fail)['y']['LineSource'] == [None, 50, 50, 50, 50]
+
+        for request in (dict(model='michaelis_menten', params=dict(vmax=50, km=2), grids=[1, 2]),
+                        dict(model='michaelis_menten', params=[50, 2], grids=dict(LineSource=['linear', 0, 1, 5])),
+                        [1, 2]):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(urllib.request.Request(f'{plot_server.url}/curve',
+                                                              data=json.dumps(request).encode()))
+            assert error.value.code == 400
+
+        report = load_test(plot_server.url, [SPEC], clients=5, updates=4)
+        assert report['requests'] == 20 and report['errors'] == 0
+        assert report['p50_ms'] <= report['p99_ms']
+    finally:
+        plot_server.shutdown()
+        plot_server.server_close()
@@ -0,0 +1,81 @@
+"""
+unit testing for declarative plot specs and the figure factory
+"""
+import pytest
+from pharmaplot.spec import FIXED_LINE_POINTS, build_layout, expand, load_spec, render, validate
+
+pytest.importorskip('bokeh')
+
+SPEC = dict(
+    model='michaelis_menten',
+    x=dict(start=-1, end=3, points=20),
+    params=dict(vmax='vmax', km='10 ** log_km'),
+    sliders=dict(vmax=dict(start=0, end=200, value=100, step=1, title='Vmax'),
+                 log_km=dict(start=-1, end=2, value=1, step=0.1, title='log Km')),
+    figure=dict(title='Michaelis-Menten Kinetics', y_range=[-5, 200]),
+    output=dict(filename='mm.html'),
+)
+
+
+def test_variants_are_merged_over_the_base_spec():
+    """every variant overrides only the keys it names"""
+    specs = expand(dict(SPEC, variants=[dict(figure=dict(title='Cinétique')), dict(x=dict(points=0))]))
+    assert [spec['figure']['title'] for spec in specs] == ['Cinétique', 'Michaelis-Menten Kinetics']
+    assert specs[0]['figure']['y_range'] == [-5, 200]
+    assert [spec['x']['points'] for spec in specs] == [20, 0]
+    assert SPEC['figure']['title'] == 'Michaelis-Menten Kinetics'
+
+
+def test_validate_rejects_incomplete_specs():
+    """parameters without a value and sliders without a range are reported"""
+    spec = expand(SPEC)[0]
+    validate(spec)
+    with pytest.raises(ValueError, match='km'):
+        validate(dict(spec, params=dict(vmax='vmax')))
+    with pytest.raises(ValueError, match='step'):
+        validate(dict(spec, sliders=dict(vmax=dict(start=0, end=200, value=100))))
+
+
+def test_throttled_sliders_update_on_release():
+    """with throttle set, the callback listens to value_throttled instead of every step of a drag"""
+    for throttle, event in ((False, 'change:value'), (True, 'change:value_throttled')):
+        sliders = build_layout(dict(SPEC, throttle=throttle)).children[1].children
+        assert all(list(slider.js_property_callbacks) == [event] for slider in sliders)
+
+
+def test_lookup_report_is_returned_not_printed(capsys):
+    """the size vs. error report of the lookup tables goes to the caller's list; building the layout prints nothing"""
+    report = []
+    build_layout(dict(SPEC, lookup=True, x=dict(SPEC['x'], line=50)), report=report)
+    assert report and {'stride', 'bytes', 'error', 'chosen'} <= set(report[0])
+    build_layout(dict(SPEC, lookup=True, x=dict(SPEC['x'], line=50)))
+    assert capsys.readouterr().out == ''
+
+
+def test_curves_are_sampled_adaptively_by_default():
+    """the default line is sampled to the pixel tolerance with fewer points than a fixed grid; an int line is kept"""
+    def line_sizes(x_spec):
+        from bokeh.models import ColumnDataSource
+
+        layout = build_layout(dict(SPEC, x=x_spec))
+        return {len(source.data['x']) for source in layout.select({'type': ColumnDataSource})} - {x_spec['points']}
+
+    adaptive, = line_sizes(SPEC['x'])
+    assert 2 < adaptive < FIXED_LINE_POINTS
+    assert line_sizes(dict(SPEC['x'], line=50)) == {50}
+    spec = expand(SPEC)[0]
+    with pytest.raises(ValueError, match='line'):
+        validate(dict(spec, x=dict(spec['x'], line='dense')))
+
+
+def test_render_every_variant_from_yaml(tmp_path):
+    """a yaml spec with variants becomes one page per variant, rendered in this process"""
+    yaml = pytest.importorskip('yaml')
+    spec = dict(SPEC, variants=[dict(output=dict(filename=f'mm-{lang}.html'), figure=dict(title=title))
+                                for lang, title in (('en', 'Kinetics'), ('de', 'Kinetik'))])
+    (tmp_path / 'mm.yaml').write_text(yaml.safe_dump(spec, allow_unicode=True))
+
+    paths = render(load_spec(str(tmp_path / 'mm.yaml')), output_dir=str(tmp_path))
+    assert [path.rsplit('/', 1)[-1] for path in paths] == ['mm-en.html', 'mm-de.html']
+    page = (tmp_path / 'mm-de.html').read_text()
+    assert 'Kinetik' in page and 'Math.pow(10, log_km.value)' in page
@@ -0,0 +1,61 @@
+"""
+unit testing for the SQLite store of fit results
+"""
+import numpy as np
+from pharmaplot import receptors
+from pharmaplot.pipeline import run_pipeline
+from pharmaplot.store import FitStore, fit_stored
+from pharmaplot.tests.test_pipeline import _write_campaign
+
+
+def test_only_new_or_changed_datasets_are_fitted(tmp_path):
+    """a second batch with one changed and one new dataset fits those two and returns the rest from the store"""
+    x = np.linspace(-9, -4, 8)
+    logec50 = np.array([-8., -7., -6.])
+    y = receptors.four_parameter_logistic_equation(x, 100., 0., 1., logec50[:, None])
+    labels = [('P1', f'C{i}') for i in range(3)]
+
+    with FitStore(str(tmp_path / 'fits.sqlite')) as store:
+        first, fitted = fit_stored(store, 'four_parameter_logistic_equation', x, y, labels=labels)
+        assert fitted.all() and len(store) == 3
+
+        changed = np.vstack([y, receptors.four_parameter_logistic_equation(x, 100., 0., 1., -5.5)])
+        changed[1, -1] = np.nan
+        second, fitted = fit_stored(store, 'four_parameter_logistic_equation', x, changed, labels=labels + [
+            ('P2', 'C0')])
+        assert fitted.tolist() == [False, True, False, True]
+        np.testing.assert_array_equal(second.params[[0, 2]], first.params[[0, 2]])
+        np.testing.assert_allclose(second.params[:, 3], [-8., -7., -6., -5.5], atol=1e-6)
+
+        # other fit options are stored separately
+        _, fitted = fit_stored(store, 'four_parameter_logistic_equation', x, y, fixed=dict(bottom=0.))
+        assert fitted.all() and len(store) == 8
+
+        history = store.lookup(compound='C0')
+        assert [row['plate'] for row in history] == ['P1', 'P2']
+        assert abs(history[1]['params']['logec50'] + 5.5) < 1e-6
+
+
+def test_identical_data_keep_every_label(tmp_path):
+    """the same data under two labels are fitted once and found under both, also after a re-run"""
+    x = np.linspace(-9, -4, 8)
+    y = receptors.four_parameter_logistic_equation(x, 100., 0., 1., np.array([[-7.], [-7.]]))
+    path = str(tmp_path / 'fits.sqlite')
+    with FitStore(path) as store:
+        for _ in range(2):
+            _, fitted = fit_stored(store, 'four_parameter_logistic_equation', x, y, labels=[('P1', 'A'), ('P2', 'B')])
+        assert fitted.tolist() == [False, False] and len(store) == 1
+        assert [(row['plate'], row['compound']) for row in store.lookup()] == [('P1', 'A'), ('P2', 'B')]
+        assert [row['plate'] for row in store.lookup(compound='B')] == ['P2']
+
+
+def test_pipeline_rerun_fits_only_new_plates(tmp_path):
+    """re-running a campaign with added plates fits only the compounds of the new plates"""
+    store = str(tmp_path / 'fits.sqlite')
+    _write_campaign(str(tmp_path / 'a.csv'), plates=3, compounds=4)
+    summary = run_pipeline(str(tmp_path / 'a.csv'), str(tmp_path / 'results.csv'), workers=1, store=store)
+    assert summary['fitted'] == 12
+
+    _write_campaign(str(tmp_path / 'a.csv'), plates=5, compounds=4)
+    summary = run_pipeline(str(tmp_path / 'a.csv'), str(tmp_path / 'results.csv'), workers=1, store=store)
+    assert (summary['compounds'], summary['fitted'], summary['converged']) == (20, 8, 20)
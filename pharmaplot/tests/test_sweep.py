@@ -0,0 +1,90 @@
+"""
+unit testing for the out-of-core parameter sweeps
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+from pharmaplot import mm, receptors
+from pharmaplot.__main__ import main
+from pharmaplot.grid import evaluate_grid
+from pharmaplot.sweep import parse_values, sweep
+
+
+def test_sweep_matches_evaluate_grid_in_bounded_memory(tmp_path):
+    """product and zip sweeps equal the in-memory grid, while memory stays at a few chunks"""
+    x = np.logspace(-1, 3, 500)
+    params = dict(vmax=100., km=10., ki=np.logspace(-2, 2, 40), conc_i=np.logspace(-1, 3, 50))
+    tracemalloc.start()
+    try:
+        report = sweep(mm.mm_competitive, x, str(tmp_path / 'product.npy'), chunk_bytes=2 ** 16, **params)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    result = np.load(tmp_path / 'product.npy', mmap_mode='r')
+    np.testing.assert_array_equal(result, evaluate_grid(mm.mm_competitive, x, **params))
+    assert report['bytes'] == result.nbytes == 8 * 2000 * 500 and report['gb_per_second'] > 0
+    assert peak < result.nbytes / 8
+
+    x = np.linspace(-9, -3, 50)
+    params = dict(top=100., bottom=np.zeros(30), hillslope=np.linspace(0.5, 2, 30), logec50=-6.)
+    sweep(receptors.four_parameter_logistic_equation, x, str(tmp_path / 'zip.npy'), mode='zip', dtype=np.float32,
+          **params)
+    np.testing.assert_array_equal(np.load(tmp_path / 'zip.npy'),
+                                  evaluate_grid(receptors.four_parameter_logistic_equation, x, mode='zip',
+                                                dtype=np.float32, **params))
+
+
+def test_interrupted_sweep_resumes(tmp_path):
+    """a sweep interrupted part way continues from its checkpoint, but not when the grid changed"""
+    x = np.linspace(0.1, 100, 200)
+    params = dict(bmax=100., kd=np.logspace(-1, 2, 30), hill_coef=np.linspace(0.5, 3, 20))
+    path = str(tmp_path / 'hill.npy')
+
+    def interrupt(done, total):
+        if done >= total // 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        sweep(receptors.specific_binding_hill, x, path, chunk_bytes=2 ** 14, progress=interrupt, **params)
+    report = sweep(receptors.specific_binding_hill, x, path, chunk_bytes=2 ** 14, **params)
+    assert 300 <= report['resumed'] < 600 and report['bytes'] == (600 - report['resumed']) * 200 * 8
+    np.testing.assert_array_equal(np.load(path), evaluate_grid(receptors.specific_binding_hill, x, **params))
+
+    assert sweep(receptors.specific_binding_hill, x, path, **params)['resumed'] == 600
+    assert sweep(receptors.specific_binding_hill, x, path, **dict(params, bmax=50.))['resumed'] == 0
+
+
+def test_checkpoint_is_not_resumed_by_changed_model_code(tmp_path):
+    """a model of the same name whose code changed starts the sweep over"""
+    def scaled(x, a):
+        return a * x
+
+    def edited(x, a):
+        return a * x + 1
+
+    edited.__name__ = edited.__qualname__ = scaled.__qualname__
+    path, x = str(tmp_path / 'scaled.npy'), np.linspace(0, 1, 10)
+    assert sweep(scaled, x, path, a=np.arange(5.))['resumed'] == 0
+    assert sweep(scaled, x, path, a=np.arange(5.))['resumed'] == 5
+    assert sweep(edited, x, path, a=np.arange(5.))['resumed'] == 0
+    np.testing.assert_array_equal(np.load(path), np.arange(5.)[:, None] * x + 1)
+
+
+def test_command_line_values_are_parsed_not_evaluated(tmp_path, capsys):
+    """numbers, lists and (log) ranges are parsed; anything else is rejected"""
+    assert parse_values('2.5') == 2.5
+    np.testing.assert_array_equal(parse_values('0, 1,10'), [0., 1., 10.])
+    np.testing.assert_array_equal(parse_values('0:1:11'), np.linspace(0, 1, 11))
+    np.testing.assert_array_equal(parse_values('log:-2:2:5'), np.logspace(-2, 2, 5))
+    for text in ('np.arange(3)', '__import__("os")', '1:2', 'log:1:2:x'):
+        with pytest.raises(ValueError, match='invalid values'):
+            parse_values(text)
+
+    path = str(tmp_path / 'mm.npy')
+    assert main(['sweep', 'michaelis_menten', path, '--x', 'log:-1:3:20', '-p', 'vmax=100', '-p', 'km=1,10']) == 0
+    expected = mm.michaelis_menten(np.logspace(-1, 3, 20), 100., np.array([[1.], [10.]]))
+    np.testing.assert_allclose(np.load(path), expected)
+    with pytest.raises(SystemExit):
+        main(['sweep', 'michaelis_menten', path, '--x', 'np.logspace(-1, 3, 20)', '-p', 'vmax=100', '-p', 'km=1'])
+    assert 'invalid values' in capsys.readouterr().err
@@ -0,0 +1,75 @@
+"""
+unit testing for fused evaluation of saturation curves and their transforms
+"""
+import json
+import shutil
+import subprocess
+import warnings
+
+import pytest
+import numpy as np
+from pharmaplot import mm, receptors
+from pharmaplot.transforms import (TRANSFORMS, js_transforms, michaelis_menten_transforms, saturation_transforms,
+                                   specific_binding_transforms)
+
+X = np.logspace(-9, 3, num=200)
+
+
+def test_transforms_match_the_separate_functions():
+    """one fused evaluation gives the curve, lineweaver-burk, scatchard and log x of the separate functions"""
+    t = michaelis_menten_transforms(X, vmax=10., km=1.)
+    assert list(t) == list(TRANSFORMS)
+    np.testing.assert_allclose(t['y'], mm.michaelis_menten(X, 10., 1.), rtol=1e-15)
+    np.testing.assert_array_equal(t['y_inverse'], mm.lineweaver_burk(1 / X, 10., 1.))
+    np.testing.assert_array_equal(t['x_log'], np.log10(X))
+
+    t = specific_binding_transforms(X, bmax=100., kd=1e-6)
+    b, bf = receptors.scatchard(X, 100., 1e-6)
+    np.testing.assert_allclose(t['y'], b, rtol=1e-15)
+    np.testing.assert_allclose(t['y_over_x'], bf, rtol=1e-15)
+    np.testing.assert_array_equal(t['y_over_x'], t['y'] / X)
+    np.testing.assert_array_equal(specific_binding_transforms(X, bmax=0., kd=1e-6)['y'], 0.)
+
+
+def test_zero_concentration_gives_the_limits_without_warnings():
+    """at x = 0 the curve is 0 as in mm.michaelis_menten, y/x its limit top/k, and no floating point warning is
+    raised"""
+    x = np.array([0., 1., 4.])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        t = michaelis_menten_transforms(x, vmax=10., km=2.)
+        grid = saturation_transforms(x, np.array([[10.], [0.]]), 2.)
+    assert t['y'][0] == mm.michaelis_menten(0., 10., 2.) == 0
+    assert t['y_over_x'][0] == 5. and np.isfinite(t['y_over_x']).all()
+    np.testing.assert_array_equal(t['y_over_x'][1:], t['y'][1:] / x[1:])
+    assert t['x_inverse'][0] == t['y_inverse'][0] == np.inf and t['x_log'][0] == -np.inf
+    np.testing.assert_array_equal(grid['y_over_x'][:, 0], [5., 0.])
+
+
+def test_output_buffer_is_written_in_place():
+    """a preallocated buffer receives every column (float32 stays float32); parameters broadcast against x"""
+    out = np.empty((len(TRANSFORMS), X.size), dtype=np.float32)
+    t = saturation_transforms(X.astype(np.float32), 10., 1., out=out)
+    assert all(np.shares_memory(column, out) and column.dtype == np.float32 for column in t.values())
+    np.testing.assert_allclose(out[0], mm.michaelis_menten(X, 10., 1.), rtol=1e-6)
+
+    grid = saturation_transforms(X, np.array([[10.], [20.]]), 1.)
+    assert grid['y'].shape == (2, X.size)
+    with pytest.raises(ValueError, match='shape'):
+        saturation_transforms(X, 10., 1., out=np.empty((len(TRANSFORMS), 3)))
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_js_transforms_match_the_python_columns():
+    """the callback code recomputes the transform columns from x and y as saturation_transforms does"""
+    t = saturation_transforms(X, 10., 1.)
+    columns = [name for name in TRANSFORMS if name != 'y']
+    data = dict(x=X.tolist(), y=t['y'].tolist(), **{name: [0] * X.size for name in columns})
+    script = (f'const Source = {{data: {json.dumps(data)}}};\n'
+              f'{js_transforms(["Source"], columns)}\n'
+              f'console.log(JSON.stringify(Source.data));')
+    output = json.loads(subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout)
+    for name in columns:
+        np.testing.assert_allclose(output[name], t[name], rtol=1e-14)
+    with pytest.raises(ValueError, match='y'):
+        js_transforms(['Source'], ['y'])
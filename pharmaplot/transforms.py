@@ -0,0 +1,126 @@
+"""
+fused evaluation of saturation curves together with their standard linear transforms
+
+the michaelis-menten equation and the specific binding isotherm are the same hyperbola, y = top * x / (k + x), and the
+dual-panel pages and batch reports plot it next to its transforms: lineweaver-burk (1/x, 1/y), eadie-hofstee (y/x, y),
+scatchard (y, y/x) and against log10(x). evaluating the curve and then each transform separately recomputes the
+hyperbola once per panel (receptors.scatchard evaluates specific_binding again). :func:`saturation_transforms`
+computes every column of TRANSFORMS in one pass from shared intermediates, in place in one (optionally preallocated)
+buffer::
+
+    t = michaelis_menten_transforms(substrate, vmax=10., km=1.)
+    lb_plot.circle(t['x_inverse'], t['y_inverse'])
+
+the rows come out in the order of TRANSFORMS, so ColumnDataSource(data=dict(x=x, **t)) holds every panel's data.
+:func:`js_transforms` recomputes the transform columns of data sources in a CustomJS callback from their x and y
+"""
+from typing import Dict, Sequence, Union
+
+import numpy as np
+
+# the columns of a fused evaluation: name -> the same column as a javascript expression in x and y
+TRANSFORMS = {
+    'y': 'y',                   # the curve itself, v0 or specific binding
+    'x_log': 'Math.log10(x)',   # log10 of the concentration, for semi-log plots
+    'x_inverse': '1 / x',       # lineweaver-burk / double reciprocal x
+    'y_inverse': '1 / y',       # lineweaver-burk / double reciprocal y
+    'y_over_x': 'y / x',        # eadie-hofstee x, scatchard y (bound / free)
+}
+
+
+def saturation_transforms(x: Union[float, np.ndarray], top: Union[float, np.ndarray], k: Union[float, np.ndarray],
+                          out: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    the hyperbola y = top * x / (k + x) and its transforms, evaluated in one pass
+
+    1/y is the lineweaver-burk line (k / top) / x + 1 / top, computed as in mm.lineweaver_burk, and y its reciprocal;
+    y / x is divided as in receptors.scatchard (and js_transforms). y agrees with mm.michaelis_menten to a few ulp.
+    at x = 0 (e.g. a linear grid starting at 0) y is 0, y / x its limit top / k, and 1/x, 1/y and log10(x) infinite,
+    without floating point warnings
+
+    Parameters
+    ----------
+    x: Union[float, np.ndarray]
+        concentration (substrate or free ligand)
+
+    top, k: Union[float, np.ndarray]
+        plateau (vmax, bmax) and half-saturating concentration (km, kd); arrays broadcast against x
+
+    out: np.ndarray
+        buffer of shape (len(TRANSFORMS),) + the broadcast shape, written in place; by default one is allocated with
+        the result dtype of the inputs (float32 inputs stay float32)
+
+    Returns
+    -------
+    transforms: Dict[str, np.ndarray]
+        name -> column for every entry of TRANSFORMS, views of the rows of out
+    """
+    x = np.asarray(x)
+    dtype = out.dtype if out is not None else np.result_type(x, top, k, 1.)
+    top, k = np.asarray(top, dtype=dtype), np.asarray(k, dtype=dtype)
+    shape = (len(TRANSFORMS),) + np.broadcast_shapes(x.shape, top.shape, k.shape)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f'out has shape {out.shape}, expected {shape}')
+    y, x_log, x_inverse, y_inverse, y_over_x = out
+
+    # a zero plateau gives an infinite 1/y, and so a flat curve at zero; x = 0 an infinite 1/x and 1/y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept = k / top, 1 / top
+        np.divide(1, x, out=x_inverse)
+        np.multiply(x_inverse, slope, out=y_inverse)
+        np.add(y_inverse, intercept, out=y_inverse)
+        np.divide(1, y_inverse, out=y)
+        np.divide(y, x, out=y_over_x)
+        # y / x = top / (k + x) is 0 / 0 at x = 0, where it takes its limit
+        np.copyto(y_over_x, top / k, where=x == 0)
+        np.log10(x, out=x_log)
+    return dict(zip(TRANSFORMS, out))
+
+
+def michaelis_menten_transforms(substrate: Union[float, np.ndarray], vmax: float, km: float,
+                                out: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    initial velocity (mm.michaelis_menten) with its lineweaver-burk, eadie-hofstee and log transforms, see
+    :func:`saturation_transforms`; y is v0, (x_inverse, y_inverse) the lineweaver-burk plot and (y_over_x, y) the
+    eadie-hofstee plot
+    """
+    return saturation_transforms(substrate, vmax, km, out)
+
+
+def specific_binding_transforms(l: Union[float, np.ndarray], bmax: float, kd: float,
+                                out: np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    specific binding (receptors.specific_binding) with its scatchard, double reciprocal and log transforms, see
+    :func:`saturation_transforms`; y is the bound ligand B, (y, y_over_x) the scatchard plot of B/F against B
+    """
+    return saturation_transforms(l, bmax, kd, out)
+
+
+def js_transforms(sources: Sequence[str], columns: Sequence[str]) -> str:
+    """
+    javascript recomputing transform columns of data sources from their x and y columns, e.g. as the `extra` code of
+    :func:`pharmaplot.callbacks.callback_code` after the model kernel has updated y. as only x and y are known, y / x
+    is NaN at x = 0 (a point bokeh leaves out) rather than its limit
+
+    Parameters
+    ----------
+    sources: Sequence[str]
+        CustomJS argument names of the data sources
+
+    columns: Sequence[str]
+        names from TRANSFORMS (other than y) to recompute
+    """
+    unknown = [column for column in columns if column not in TRANSFORMS or column == 'y']
+    if unknown:
+        raise ValueError(f'not a transform of y: {", ".join(unknown)}')
+    body = '\n'.join(f'        data.{column}[i] = {TRANSFORMS[column]};' for column in columns)
+    return '\n'.join(['// transforms of the recomputed curves, as in pharmaplot.transforms',
+                      f'for (const source of [{", ".join(sources)}]) {{',
+                      '    const data = source.data;',
+                      '    for (let i = 0; i < data.x.length; i++) {',
+                      '        const x = data.x[i], y = data.y[i];',
+                      body,
+                      '    }',
+                      '}'])
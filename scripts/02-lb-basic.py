@@ -7,6 +7,7 @@ from bokeh.models import CustomJS, Slider, Label, Span
 from bokeh.plotting import figure, output_file, show, ColumnDataSource
 
 from pharmaplot import mm
+from pharmaplot.callbacks import callback_code, connect
 from pharmaplot.config import html_output_dir
 
 
@@ -53,28 +54,11 @@ callback = CustomJS(args=dict(LineSource=line_source,
                               PointSource=point_source,
                               vmax=vmax_slider,
                               km=km_slider),
-                    code="""
-    const LineData = LineSource.data;
-    const PointData = PointSource.data;
-    const VMAX = vmax.value;
-    const KM = km.value;
-    const lx = LineData['x']
-    const ly = LineData['y']
-    const px = PointData['x']
-    const py = PointData['y']
-    for (var i = 0; i < lx.length; i++) {
-        ly[i] = ((KM/VMAX)*lx[i]) + (1/VMAX);
-    }
-    LineSource.change.emit();
-    for (var i = 0; i < px.length; i++) {
-    py[i] = ((KM/VMAX)*px[i]) + (1/VMAX);
-    }
-    PointSource.change.emit();
-""")
+                    code=callback_code([('lineweaver_burk', ['LineSource', 'PointSource'])],
+                                       params=dict(vmax='vmax.value', km='km.value')))
 
 # add sliders to plot and display
-vmax_slider.js_on_change('value', callback)
-km_slider.js_on_change('value', callback)
+connect(callback, vmax_slider, km_slider)
 
 layout = row(
     plot,
@@ -1,8 +1,9 @@
 """
-interactive plots for standard michaelis-menten kinetics, plus competitive, noncompetitive, and uncompetitive
-inhibtion
+interactive dashboard for michaelis-menten kinetics with competitive, noncompetitive, and uncompetitive inhibition,
+optionally with the lineweaver-burk plot of each
 
-TODO -> this does not plot properly - need to lay them out all on the same page; fix layout issue
+all panels share one substrate grid (and one inverse substrate grid for the lineweaver-burk panels), one set of
+sliders and a single callback, which recomputes every curve in one pass and redraws each data source once
 """
 import numpy as np
 from bokeh.layouts import row, column
@@ -10,12 +11,22 @@ from bokeh.models import CustomJS, Slider, Label, Span
 from bokeh.plotting import figure, output_file, show, ColumnDataSource
 
 from pharmaplot import mm
+from pharmaplot.callbacks import callback_code, connect
 from pharmaplot.config import html_output_dir
+from pharmaplot.sampling import adaptive_x, parameter_sets
+
+# show the lineweaver-burk counterpart below each michaelis-menten panel
+show_lineweaver_burk = True
+
+INHIBITION = {
+    'competitive': 'Competitive',
+    'noncompetitive': 'Noncompetitive',
+    'uncompetitive': 'Uncompetitive',
+}
 
 # ----------------------------------------------------------------------------------------------------------------------
-# competitive inhibition
+# shared data
 # ----------------------------------------------------------------------------------------------------------------------
-
 # generate data for plotting
 log_start = -1
 log_end = 4
@@ -25,242 +36,104 @@ km = 5
 ki = 1
 conc_i = 0
 
-x_line = np.logspace(log_start, log_end, num=100)
-y_line = mm.mm_competitive(x_line, vmax=vmax, km=km, ki=ki, conc_i=conc_i)
-
-x_points = np.logspace(log_start, log_end, num=20)
-y_points = mm.mm_competitive(x_points, vmax=vmax, km=km, ki=ki, conc_i=conc_i)
-
-# set up source data and plot lines that will vary
-line_source = ColumnDataSource(data=dict(x=x_line, y=y_line))
-point_source = ColumnDataSource(data=dict(x=x_points, y=y_points))
-
-plot = figure(y_range=(-5, 120), x_range=(-5, 100), plot_width=600, plot_height=400,
-              x_axis_label='[S]: substrate concentration (μM)',
-              y_axis_label='initial velocity (μM/s)',
-              title='Michaelis-Menten Kinetics with Competitive Inhibition')
-
-plot.line('x', 'y', source=line_source, line_width=3, line_alpha=0.6, color='black')
-plot.circle('x', 'y', source=point_source, size=10, color='black')
-
-# set up static line and annotations
-plot.line(x_line, y_line, line_width=5, color='blue', line_alpha=0.3)
-plot.circle(x_points, y_points, size=10, color='blue', line_alpha=0.3)
-
-mytext = Label(x=10, y=87, text='[I] = 0 (μM)',
-               text_color="blue", text_alpha=0.5)
-plot.add_layout(mytext)
+pw = 400
+ph = 300
 
-# add axes lines
-vline = Span(location=0, dimension='height', line_color='black', line_width=1, line_alpha=0.3)
-hline = Span(location=0, dimension='width', line_color='black', line_width=1, line_alpha=0.3)
-plot.renderers.extend([vline, hline])
-
-# set up java script callback function to make plot interactive
 ci_slider = Slider(start=0, end=100, value=0, step=1, title="[I] (μM)")
 ki_slider = Slider(start=1, end=100, value=50, step=1, title="Ki (μM)")
 
-callback = CustomJS(args=dict(LineSource=line_source,
-                              PointSource=point_source,
-                              ci=ci_slider,
-                              ki=ki_slider,
-                              vmax=vmax,
-                              km=km),
-                    code="""
-    const LineData = LineSource.data;
-    const PointData = PointSource.data;
-    const VMAX = vmax
-    const KM = km
-    const CI = ci.value
-    const KI = ki.value
-    const lx = LineData['x']
-    const ly = LineData['y']
-    const px = PointData['x']
-    const py = PointData['y']
-    for (var i = 0; i < lx.length; i++) {
-        ly[i] = (VMAX*lx[i])/((KM*(1+(CI/KI))+lx[i]));
-    }
-    LineSource.change.emit();
-    for (var i = 0; i < px.length; i++) {
-    py[i] = (VMAX*px[i])/((KM*(1+(CI/KI))+px[i]));
-    }
-    PointSource.change.emit();
-""")
-
-# add sliders to plot and display
-ci_slider.js_on_change('value', callback)
-ki_slider.js_on_change('value', callback)
-
-layout = row(
-    plot,
-    column(ci_slider, ki_slider),
-)
-show(layout)
-
-# ----------------------------------------------------------------------------------------------------------------------
-# noncompetitive inhibition
-# ----------------------------------------------------------------------------------------------------------------------
-# generate data for plotting
-log_start = -1
-log_end = 4
-
-vmax = 100
-km = 5
-ki = 1
-conc_i = 0
-
-x_line = np.logspace(log_start, log_end, num=100)
-y_line = mm.mm_noncompetitive(x_line, vmax=vmax, km=km, ki=ki, conc_i=conc_i)
-
+# the fewest points that draw every curve of a panel within half a pixel over the slider ranges
+slider_params = parameter_sets(dict(ci=ci_slider, ki=ki_slider), dict(vmax=vmax, km=km, ki='ki', conc_i='ci'))
+x_line = adaptive_x([getattr(mm, f'mm_{kind}') for kind in INHIBITION], log_start, log_end, width=pw, height=ph,
+                    x_range=(-5, 100), y_range=(-5, 120), **slider_params)
 x_points = np.logspace(log_start, log_end, num=20)
-y_points = mm.mm_noncompetitive(x_points, vmax=vmax, km=km, ki=ki, conc_i=conc_i)
 
-# set up source data and plot lines that will vary
-line_source = ColumnDataSource(data=dict(x=x_line, y=y_line))
-point_source = ColumnDataSource(data=dict(x=x_points, y=y_points))
+# one column of y values per inhibition type, all on the same x grid
+line_source = ColumnDataSource(data=dict(x=x_line, **{
+    kind: getattr(mm, f'mm_{kind}')(x_line, vmax=vmax, km=km, ki=ki, conc_i=conc_i) for kind in INHIBITION}))
+point_source = ColumnDataSource(data=dict(x=x_points, **{
+    kind: getattr(mm, f'mm_{kind}')(x_points, vmax=vmax, km=km, ki=ki, conc_i=conc_i) for kind in INHIBITION}))
 
-plot = figure(y_range=(-5, 120), x_range=(-5, 100), plot_width=600, plot_height=400,
-              x_axis_label='[S]: substrate concentration (μM)',
-              y_axis_label='initial velocity (μM/s)',
-              title='Michaelis-Menten Kinetics with Noncompetitive Inhibition')
+# without inhibitor the three curves coincide, so the panels share one static starting curve
+baseline_line = ColumnDataSource(data=dict(x=x_line, y=mm.michaelis_menten(x_line, vmax, km)))
+baseline_points = ColumnDataSource(data=dict(x=x_points, y=mm.michaelis_menten(x_points, vmax, km)))
 
-plot.line('x', 'y', source=line_source, line_width=3, line_alpha=0.6, color='black')
-plot.circle('x', 'y', source=point_source, size=10, color='black')
+if show_lineweaver_burk:
+    x_lb_line = adaptive_x([getattr(mm, f'lwb_{kind}') for kind in INHIBITION], -0.5, 2, scale='linear', width=pw,
+                           height=ph, x_range=(-0.5, 2), y_range=(-0.05, 0.5), **slider_params)
+    x_lb_points = 1 / np.geomspace(0.5, 10, num=8)
 
-# set up static line and annotations
-plot.line(x_line, y_line, line_width=5, color='blue', line_alpha=0.3)
-plot.circle(x_points, y_points, size=10, color='blue', line_alpha=0.3)
+    lb_line_source = ColumnDataSource(data=dict(x=x_lb_line, **{
+        kind: getattr(mm, f'lwb_{kind}')(x_lb_line, vmax=vmax, km=km, ki=ki, conc_i=conc_i) for kind in INHIBITION}))
+    lb_point_source = ColumnDataSource(data=dict(x=x_lb_points, **{
+        kind: getattr(mm, f'lwb_{kind}')(x_lb_points, vmax=vmax, km=km, ki=ki, conc_i=conc_i) for kind in INHIBITION}))
 
-mytext = Label(x=10, y=87, text='[I] = 0 (μM)',
-               text_color="blue", text_alpha=0.5)
-plot.add_layout(mytext)
+    lb_baseline_line = ColumnDataSource(data=dict(x=x_lb_line, y=mm.lineweaver_burk(x_lb_line, vmax, km)))
+    lb_baseline_points = ColumnDataSource(data=dict(x=x_lb_points, y=mm.lineweaver_burk(x_lb_points, vmax, km)))
 
-# add axes lines
-vline = Span(location=0, dimension='height', line_color='black', line_width=1, line_alpha=0.3)
-hline = Span(location=0, dimension='width', line_color='black', line_width=1, line_alpha=0.3)
-plot.renderers.extend([vline, hline])
-
-# set up java script callback function to make plot interactive
-ci_slider = Slider(start=0, end=100, value=0, step=1, title="[I] (μM)")
-ki_slider = Slider(start=1, end=100, value=50, step=1, title="Ki (μM)")
-
-callback = CustomJS(args=dict(LineSource=line_source,
-                              PointSource=point_source,
-                              ci=ci_slider,
-                              ki=ki_slider,
-                              vmax=vmax,
-                              km=km),
-                    code="""
-    const LineData = LineSource.data;
-    const PointData = PointSource.data;
-    const VMAX = vmax
-    const KM = km
-    const CI = ci.value
-    const KI = ki.value
-    const lx = LineData['x']
-    const ly = LineData['y']
-    const px = PointData['x']
-    const py = PointData['y']
-    for (var i = 0; i < lx.length; i++) {
-        ly[i] = (VMAX*lx[i])/((KM*(1+(CI/KI)))+(lx[i]*(1+(CI/KI))));
-    }
-    LineSource.change.emit();
-    for (var i = 0; i < px.length; i++) {
-    py[i] = (VMAX*px[i])/((KM*(1+(CI/KI)))+(px[i]*(1+(CI/KI))));
-    }
-    PointSource.change.emit();
-""")
-
-# add sliders to plot and display
-ci_slider.js_on_change('value', callback)
-ki_slider.js_on_change('value', callback)
-
-layout = row(
-    plot,
-    column(ci_slider, ki_slider),
-)
-show(layout)
 
 # ----------------------------------------------------------------------------------------------------------------------
-# uncompetitive inhibition
+# panels
 # ----------------------------------------------------------------------------------------------------------------------
-# generate data for plotting
-log_start = -1
-log_end = 4
-
-vmax = 100
-km = 5
-ki = 1
-conc_i = 0
-
-x_line = np.logspace(log_start, log_end, num=100)
-y_line = mm.mm_noncompetitive(x_line, vmax=vmax, km=km, ki=ki, conc_i=conc_i)
-
-x_points = np.logspace(log_start, log_end, num=20)
-y_points = mm.mm_noncompetitive(x_points, vmax=vmax, km=km, ki=ki, conc_i=conc_i)
-
-# set up source data and plot lines that will vary
-line_source = ColumnDataSource(data=dict(x=x_line, y=y_line))
-point_source = ColumnDataSource(data=dict(x=x_points, y=y_points))
-
-plot = figure(y_range=(-5, 120), x_range=(-5, 100), plot_width=600, plot_height=400,
-              x_axis_label='[S]: substrate concentration (μM)',
-              y_axis_label='initial velocity (μM/s)',
-              title='Michaelis-Menten Kinetics with Uncompetitive Inhibition')
-
-plot.line('x', 'y', source=line_source, line_width=3, line_alpha=0.6, color='black')
-plot.circle('x', 'y', source=point_source, size=10, color='black')
-
-# set up static line and annotations
-plot.line(x_line, y_line, line_width=5, color='blue', line_alpha=0.3)
-plot.circle(x_points, y_points, size=10, color='blue', line_alpha=0.3)
-
-mytext = Label(x=10, y=87, text='[I] = 0 (μM)',
-               text_color="blue", text_alpha=0.5)
-plot.add_layout(mytext)
-
-# add axes lines
-vline = Span(location=0, dimension='height', line_color='black', line_width=1, line_alpha=0.3)
-hline = Span(location=0, dimension='width', line_color='black', line_width=1, line_alpha=0.3)
-plot.renderers.extend([vline, hline])
+def add_axes_lines(plot):
+    vline = Span(location=0, dimension='height', line_color='black', line_width=1, line_alpha=0.3)
+    hline = Span(location=0, dimension='width', line_color='black', line_width=1, line_alpha=0.3)
+    plot.renderers.extend([vline, hline])
+
+
+mm_plots, lb_plots = [], []
+for kind, name in INHIBITION.items():
+    plot = figure(y_range=(-5, 120), x_range=(-5, 100), plot_width=pw, plot_height=ph,
+                  x_axis_label='[S]: substrate concentration (μM)',
+                  y_axis_label='initial velocity (μM/s)',
+                  title=f'{name} Inhibition')
+
+    plot.line('x', kind, source=line_source, line_width=3, line_alpha=0.6, color='black')
+    plot.circle('x', kind, source=point_source, size=10, color='black')
+
+    # set up static line and annotations
+    plot.line('x', 'y', source=baseline_line, line_width=5, color='blue', line_alpha=0.3)
+    plot.circle('x', 'y', source=baseline_points, size=10, color='blue', line_alpha=0.3)
+    plot.add_layout(Label(x=10, y=87, text='[I] = 0 (μM)', text_color="blue", text_alpha=0.5))
+    add_axes_lines(plot)
+    mm_plots.append(plot)
+
+    if show_lineweaver_burk:
+        plot = figure(y_range=(-0.05, 0.5), x_range=(-0.5, 2), plot_width=pw, plot_height=ph,
+                      x_axis_label='1/[S]: substrate concentration (1/μM)',
+                      y_axis_label='1/initial velocity (s/μM)',
+                      title=f'{name} Inhibition (Lineweaver-Burk)')
+
+        plot.line('x', kind, source=lb_line_source, line_width=3, line_alpha=0.6, color='black')
+        plot.circle('x', kind, source=lb_point_source, size=10, color='black')
+
+        plot.line('x', 'y', source=lb_baseline_line, line_width=5, color='blue', line_alpha=0.3)
+        plot.circle('x', 'y', source=lb_baseline_points, size=10, color='blue', line_alpha=0.3)
+        add_axes_lines(plot)
+        lb_plots.append(plot)
 
+# ----------------------------------------------------------------------------------------------------------------------
+# make plots interactive
+# ----------------------------------------------------------------------------------------------------------------------
 # set up java script callback function to make plot interactive
-ci_slider = Slider(start=0, end=100, value=0, step=1, title="[I] (μM)")
-ki_slider = Slider(start=1, end=100, value=50, step=1, title="Ki (μM)")
+sources = dict(LineSource=line_source, PointSource=point_source)
+updates = [(f'mm_{kind}', [('LineSource', 'x', kind), ('PointSource', 'x', kind)]) for kind in INHIBITION]
+if show_lineweaver_burk:
+    sources.update(lbLineSource=lb_line_source, lbPointSource=lb_point_source)
+    updates += [(f'lwb_{kind}', [('lbLineSource', 'x', kind), ('lbPointSource', 'x', kind)]) for kind in INHIBITION]
 
-callback = CustomJS(args=dict(LineSource=line_source,
-                              PointSource=point_source,
+callback = CustomJS(args=dict(**sources,
                               ci=ci_slider,
                               ki=ki_slider,
                               vmax=vmax,
                               km=km),
-                    code="""
-    const LineData = LineSource.data;
-    const PointData = PointSource.data;
-    const VMAX = vmax
-    const KM = km
-    const CI = ci.value
-    const KI = ki.value
-    const lx = LineData['x']
-    const ly = LineData['y']
-    const px = PointData['x']
-    const py = PointData['y']
-    for (var i = 0; i < lx.length; i++) {
-        ly[i] = (VMAX*lx[i])/(KM+(lx[i]*(1+(CI/KI))));
-    }
-    LineSource.change.emit();
-    for (var i = 0; i < px.length; i++) {
-    py[i] = (VMAX*px[i])/(KM+(px[i]*(1+(CI/KI))));
-    }
-    PointSource.change.emit();
-""")
+                    code=callback_code(updates, params=dict(vmax='vmax', km='km', ki='ki.value', conc_i='ci.value')))
 
 # add sliders to plot and display
-ci_slider.js_on_change('value', callback)
-ki_slider.js_on_change('value', callback)
+connect(callback, ci_slider, ki_slider)
 
 layout = row(
-    plot,
+    column(row(*mm_plots), row(*lb_plots)) if show_lineweaver_burk else row(*mm_plots),
     column(ci_slider, ki_slider),
 )
 
@@ -10,7 +10,9 @@ from bokeh.models import CustomJS, Slider, Label, Span
 from bokeh.plotting import figure, output_file, show, ColumnDataSource
 
 from pharmaplot import mm
+from pharmaplot.callbacks import callback_code, connect
 from pharmaplot.config import html_output_dir
+from pharmaplot.transforms import michaelis_menten_transforms
 
 # -------------------------------------------------
 # create baseline michaelis-menten plot
@@ -66,8 +68,9 @@ mm_plot.renderers.extend([vline, hline])
 x_line = np.linspace(-3, np.max(x_points))
 y_line = mm.lineweaver_burk(x_line, vmax, km)
 
-x_points = 1 / np.geomspace(0.1, 10, num=8)
-y_points = mm.lineweaver_burk(x_points, vmax, km)
+# the double reciprocal of measurements at [S] = 0.1 ... 10, both coordinates from one evaluation
+lb_points = michaelis_menten_transforms(np.geomspace(0.1, 10, num=8), vmax, km)
+x_points, y_points = lb_points['x_inverse'], lb_points['y_inverse']
 
 # set up source data and plot lines that will vary
 lb_line_source = ColumnDataSource(data=dict(x=x_line, y=y_line))
@@ -107,55 +110,12 @@ callback = CustomJS(args=dict(mmLineSource=mm_line_source,
                               lbPointSource=lb_point_source,
                               vmax=vmax_slider,
                               km=km_slider),
-                    code="""
-    const mmLineData = mmLineSource.data;
-    const mmPointData = mmPointSource.data;
-    const lbLineData = lbLineSource.data;
-    const lbPointData = lbPointSource.data;
-    const VMAX = vmax.value;
-    const KM = km.value;
-    const mmlx = mmLineData['x'];
-    const mmly = mmLineData['y'];
-    const mmpx = mmPointData['x'];
-    const mmpy = mmPointData['y'];
-    const lblx = lbLineData['x'];
-    const lbly = lbLineData['y'];
-    const lbpx = lbPointData['x'];
-    const lbpy = lbPointData['y'];
-    
-    // define functions for plotting data
-    function mm(x, VMAX, KM){
-        return (VMAX*x)/(KM+x);
-    }
-    
-    function lb(x, VMAX, KM){
-        return ((KM/VMAX)*x) + (1/VMAX);
-    }
-    
-    // loop over data to edit
-    for (var i = 0; i < mmlx.length; i++) {
-        mmly[i] = mm(mmlx[i], VMAX, KM);
-    }
-    for (var i = 0; i < mmpx.length; i++) {
-        mmpy[i] = mm(mmpx[i], VMAX, KM);
-    }
-    for (var i = 0; i < lblx.length; i++) {
-        lbly[i] = lb(lblx[i], VMAX, KM);
-    }
-    for (var i = 0; i < lbpx.length; i++) {
-        lbpy[i] = lb(lbpx[i], VMAX, KM);
-    }
-    
-    // change data sources
-    mmLineSource.change.emit();
-    mmPointSource.change.emit();
-    lbLineSource.change.emit();
-    lbPointSource.change.emit();
-""")
+                    code=callback_code([('michaelis_menten', ['mmLineSource', 'mmPointSource']),
+                                        ('lineweaver_burk', ['lbLineSource', 'lbPointSource'])],
+                                       params=dict(vmax='vmax.value', km='km.value')))
 
 # add sliders to plot and display
-vmax_slider.js_on_change('value', callback)
-km_slider.js_on_change('value', callback)
+connect(callback, vmax_slider, km_slider)
 
 # -------------------------------------------------
 # create baseline michaelis-menten plot
@@ -11,7 +11,10 @@ from bokeh.models import CustomJS, Slider, Label, Span, Select
 from bokeh.plotting import figure, output_file, show, ColumnDataSource
 
 from pharmaplot import mm
-from pharmaplot.config import html_output_dir
+from pharmaplot.callbacks import callback_code, connect
+from pharmaplot.config import html_output_dir, use_lookup_tables
+from pharmaplot.lookup import build_lookup, format_report
+from pharmaplot.sampling import adaptive_x, parameter_sets
 
 # generate data for plotting
 log_start = -1
@@ -22,7 +25,13 @@ km = 5
 ki = 1
 conc_i = 0
 
-x_line = np.logspace(log_start, log_end, num=100)
+ci_slider = Slider(start=0, end=100, value=0, step=1, title="[I] (μM)")
+ki_slider = Slider(start=1, end=100, value=50, step=1, title="Ki (μM)")
+
+# the fewest substrate concentrations that draw every inhibition type within half a pixel over the slider ranges
+x_line = adaptive_x([mm.mm_competitive, mm.mm_noncompetitive, mm.mm_uncompetitive], log_start, log_end,
+                    width=600, height=400, x_range=(-5, 100), y_range=(-5, 120),
+                    **parameter_sets(dict(ci=ci_slider, ki=ki_slider), dict(vmax=vmax, km=km, ki='ki', conc_i='ci')))
 y_line = mm.mm_competitive(x_line, vmax=vmax, km=km, ki=ki, conc_i=conc_i)
 
 x_points = np.logspace(log_start, log_end, num=20)
@@ -54,72 +63,39 @@ hline = Span(location=0, dimension='width', line_color='black', line_width=1, li
 plot.renderers.extend([vline, hline])
 
 # set up java script callback function and widgets to make plot interactive
-ci_slider = Slider(start=0, end=100, value=0, step=1, title="[I] (μM)")
-ki_slider = Slider(start=1, end=100, value=50, step=1, title="Ki (μM)")
 inhib_select = Select(title="Inhibition Type:", value="competitive",
                       options=["competitive", "noncompetitive", "uncompetitive"])
 
+inhibition_models = dict(competitive='mm_competitive',
+                         noncompetitive='mm_noncompetitive',
+                         uncompetitive='mm_uncompetitive')
+
+if use_lookup_tables:
+    # precompute the curves for every slider state; falls back to live computation above the payload budget
+    code, lookup_args, report = build_lookup([(inhibition_models, ['LineSource', 'PointSource'])],
+                                             xs=dict(LineSource=x_line, PointSource=x_points),
+                                             sliders=dict(ci=ci_slider, ki=ki_slider),
+                                             params=dict(vmax=repr(vmax), km=repr(km), ki='ki', conc_i='ci'),
+                                             select='inhibType', snap_sliders=True)
+    print(format_report(report))
+else:
+    code = callback_code([(inhibition_models, ['LineSource', 'PointSource'])],
+                         params=dict(vmax='vmax', km='km', ki='ki.value', conc_i='ci.value'),
+                         select='inhibType.value')
+    lookup_args = {}
+
 callback = CustomJS(args=dict(LineSource=line_source,
                               PointSource=point_source,
                               ci=ci_slider,
                               ki=ki_slider,
                               vmax=vmax,
                               km=km,
-                              inhibType=inhib_select),
-                    code="""
-    const LineData = LineSource.data;
-    const PointData = PointSource.data;
-    const VMAX = vmax;
-    const KM = km;
-    const CI = ci.value;
-    const KI = ki.value;
-    const lx = LineData['x'];
-    const ly = LineData['y'];
-    const px = PointData['x'];
-    const py = PointData['y'];
-    const it = inhibType.value;
-    
-    // define functions for editing data
-    function competitive(x, VMAX, KM, CI, KI){
-        return (VMAX*x)/((KM*(1+(CI/KI))+x));
-    }
-    function noncompetitive(x, VMAX, KM, CI, KI){
-        return (VMAX*x)/((KM*(1+(CI/KI)))+(x*(1+(CI/KI))));
-    }
-    function uncompetitive(x, VMAX, KM, CI, KI){
-        return (VMAX*x)/(KM+(x*(1+(CI/KI))));
-    }
-    
-    // loop over line data and point data to edit
-    for (var i = 0; i < lx.length; i++) {
-        if (it == "competitive"){
-            ly[i] = competitive(lx[i], VMAX, KM, CI, KI);
-        } else if (it == "noncompetitive"){
-            ly[i] = noncompetitive(lx[i], VMAX, KM, CI, KI);
-        } else if (it == "uncompetitive"){
-            ly[i] = uncompetitive(lx[i], VMAX, KM, CI, KI);
-        }
-    }
-    
-    for (var i = 0; i < px.length; i++) {
-        if (it == "competitive"){
-            py[i] = competitive(px[i], VMAX, KM, CI, KI);
-        } else if (it == "noncompetitive"){
-            py[i] = noncompetitive(px[i], VMAX, KM, CI, KI);
-        } else if (it == "uncompetitive"){
-            py[i] = uncompetitive(px[i], VMAX, KM, CI, KI);      
-        }
-    }
-    
-    // emit changes
-    LineSource.change.emit();
-    PointSource.change.emit();
-""")
+                              inhibType=inhib_select,
+                              **lookup_args),
+                    code=code)
 
 # add sliders to plot and display
-ci_slider.js_on_change('value', callback)
-ki_slider.js_on_change('value', callback)
-inhib_select.js_on_change('value', callback)
+connect(callback, ci_slider, ki_slider, inhib_select)
 
 layout = row(
     plot,
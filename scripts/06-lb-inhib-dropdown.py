@@ -8,6 +8,7 @@ from bokeh.models import CustomJS, Slider, Label, Span, Select
 from bokeh.plotting import figure, output_file, show, ColumnDataSource
 
 from pharmaplot import mm
+from pharmaplot.callbacks import callback_code, connect
 from pharmaplot.config import html_output_dir
 
 # generate data for plotting
@@ -63,60 +64,15 @@ callback = CustomJS(args=dict(LineSource=line_source,
                               vmax=vmax,
                               km=km,
                               inhibType=inhib_select),
-                    code="""
-    const LineData = LineSource.data;
-    const PointData = PointSource.data;
-    const VMAX = vmax;
-    const KM = km;
-    const CI = ci.value;
-    const KI = ki.value;
-    const lx = LineData['x'];
-    const ly = LineData['y'];
-    const px = PointData['x'];
-    const py = PointData['y'];
-    const it = inhibType.value;
-
-    // define functions for editing data
-    function competitive(x, VMAX, KM, CI, KI){
-        return ((KM*(1+(CI/KI)))/VMAX)*x+(1/VMAX);
-    }
-    function noncompetitive(x, VMAX, KM, CI, KI){
-        return (KM/VMAX)*((1+(CI/KI))* x)+((1+(CI/KI))/VMAX);
-    }
-    function uncompetitive(x, VMAX, KM, CI, KI){
-        return (KM/VMAX)*x +((1+(CI/KI))/VMAX);
-    }
-
-    // loop over line data and point data to edit
-    for (var i = 0; i < lx.length; i++) {
-        if (it == "competitive"){
-            ly[i] = competitive(lx[i], VMAX, KM, CI, KI);
-        } else if (it == "noncompetitive"){
-            ly[i] = noncompetitive(lx[i], VMAX, KM, CI, KI);
-        } else if (it == "uncompetitive"){
-            ly[i] = uncompetitive(lx[i], VMAX, KM, CI, KI);
-        }
-    }
-
-    for (var i = 0; i < px.length; i++) {
-        if (it == "competitive"){
-            py[i] = competitive(px[i], VMAX, KM, CI, KI);
-        } else if (it == "noncompetitive"){
-            py[i] = noncompetitive(px[i], VMAX, KM, CI, KI);
-        } else if (it == "uncompetitive"){
-            py[i] = uncompetitive(px[i], VMAX, KM, CI, KI);      
-        }
-    }
-
-    // emit changes
-    LineSource.change.emit();
-    PointSource.change.emit();
-""")
+                    code=callback_code([(dict(competitive='lwb_competitive',
+                                              noncompetitive='lwb_noncompetitive',
+                                              uncompetitive='lwb_uncompetitive'),
+                                        ['LineSource', 'PointSource'])],
+                                       params=dict(vmax='vmax', km='km', ki='ki.value', conc_i='ci.value'),
+                                       select='inhibType.value'))
 
 # add sliders to plot and display
-ci_slider.js_on_change('value', callback)
-ki_slider.js_on_change('value', callback)
-inhib_select.js_on_change('value', callback)
+connect(callback, ci_slider, ki_slider, inhib_select)
 
 layout = row(
     plot,
@@ -7,8 +7,9 @@ from bokeh.layouts import row, column
 from bokeh.models import CustomJS, Slider, Label, Span
 from bokeh.plotting import figure, output_file, show, ColumnDataSource
 
-import pharmaplot.receptors as rec
+from pharmaplot.callbacks import callback_code, connect
 from pharmaplot.config import html_output_dir
+from pharmaplot.transforms import js_transforms, specific_binding_transforms
 
 # -------------------------------------------------
 # set common parameters to both plots
@@ -23,25 +24,20 @@ log_end = -3
 bmax = 100
 kd = 1e-6
 
+# binding, its log x and its scatchard transformation (bound/free) in one evaluation
 x_line = np.logspace(log_start, log_end, num=100)
-x_log_line = np.log10(x_line)
-y_line = rec.specific_binding(x_line, bmax, kd)
+line = specific_binding_transforms(x_line, bmax, kd)
 
 x_points = np.logspace(log_start, log_end, num=16)
-x_log_points = np.log10(x_points)
-y_points = rec.specific_binding(x_points, bmax, kd)
-
-b_l, bf_l = rec.scatchard(x_line, bmax, kd)
-b_p, bf_p = rec.scatchard(x_points, bmax, kd)
+points = specific_binding_transforms(x_points, bmax, kd)
 
 # -------------------------------------------------
 # make specific binding plot
 # -------------------------------------------------
 # set up source data and plot lines that will vary
-line_source = ColumnDataSource(data=dict(x=x_line, y=y_line, x_log=x_log_line,
-                                         b=b_l, bf=bf_l))
-point_source = ColumnDataSource(data=dict(x=x_points, y=y_points, x_log=x_log_points,
-                                          b=b_p, bf=bf_p))
+line_source = ColumnDataSource(data=dict(x=x_line, y=line['y'], x_log=line['x_log'], y_over_x=line['y_over_x']))
+point_source = ColumnDataSource(data=dict(x=x_points, y=points['y'], x_log=points['x_log'],
+                                          y_over_x=points['y_over_x']))
 
 sb_plot = figure(plot_width=pw, plot_height=ph,
                  x_axis_label='log[Free Compound (M)]',
@@ -52,8 +48,8 @@ sb_plot.line('x_log', 'y', source=line_source, line_width=3, line_alpha=0.6, col
 sb_plot.circle('x_log', 'y', source=point_source, size=10, color='black')
 
 # set up static line and annotations
-sb_plot.line(x_log_line, y_line, line_width=5, color='blue', line_alpha=0.3)
-sb_plot.circle(x_log_points, y_points, size=10, color='blue', line_alpha=0.3)
+sb_plot.line(line['x_log'], line['y'], line_width=5, color='blue', line_alpha=0.3)
+sb_plot.circle(points['x_log'], points['y'], size=10, color='blue', line_alpha=0.3)
 
 mytext = Label(x=-6, y=20, text='log(Kd) = -6, Bmax = 100',
                text_color="blue", text_alpha=0.5)
@@ -72,12 +68,12 @@ sc_plot = figure(plot_width=pw, plot_height=ph,
                  y_axis_label='Specific Binding/Free Lignad',
                  title='Scatchard Transformation')
 
-sc_plot.line('b', 'bf', source=line_source, line_width=3, line_alpha=0.6, color='black')
-sc_plot.circle('b', 'bf', source=point_source, size=10, color='black')
+sc_plot.line('y', 'y_over_x', source=line_source, line_width=3, line_alpha=0.6, color='black')
+sc_plot.circle('y', 'y_over_x', source=point_source, size=10, color='black')
 
 # set up static line and annotations
-sc_plot.line(b_l, bf_l, line_width=5, color='blue', line_alpha=0.3)
-sc_plot.circle(b_p, bf_p, size=10, color='blue', line_alpha=0.3)
+sc_plot.line(line['y'], line['y_over_x'], line_width=5, color='blue', line_alpha=0.3)
+sc_plot.circle(points['y'], points['y_over_x'], size=10, color='blue', line_alpha=0.3)
 
 mytext = Label(x=50, y=6e7, text='log(Kd) = -6, Bmax = 100',
                text_color="blue", text_alpha=0.5)
@@ -99,50 +95,12 @@ callback = CustomJS(args=dict(LineSource=line_source,
                               PointSource=point_source,
                               bmax=bmax_slider,
                               kd=pkd_slider),
-                    code="""
-    const LineData = LineSource.data;
-    const PointData = PointSource.data;
-    const BMAX = bmax.value;
-    const KD = Math.pow(10, kd.value);
-    const lx = LineData.x;
-    const ly = LineData.y;
-    const lb = LineData.b;
-    const lbf = LineData.bf;
-    const px = PointData.x;
-    const py = PointData.y;
-    const pb = PointData.b;
-    const pbf = PointData.bf;
-
-    // define function(s) for editing data
-    function sb(x, BMAX, KD){
-        return (x*BMAX)/(x+KD);
-    }
-
-    function sc(x, BMAX, KD){
-        return sb(x, BMAX, KD)/x;
-    }
-
-    // loop over data and edit
-    for (var i = 0; i < lx.length; i++) {
-        ly[i] = sb(lx[i], BMAX, KD);
-        lb[i] = sb(lx[i], BMAX, KD);
-        lbf[i] = sc(lx[i], BMAX, KD);
-    }
-
-    for (var i = 0; i < px.length; i++) {
-        py[i] = sb(px[i], BMAX, KD);
-        pb[i] = sb(px[i], BMAX, KD);
-        pbf[i] = sc(px[i], BMAX, KD);
-    }
-
-    // emit changes
-    LineSource.change.emit();
-    PointSource.change.emit();
-""")
+                    code=callback_code([('specific_binding', ['LineSource', 'PointSource'])],
+                                       params=dict(bmax='bmax.value', kd='Math.pow(10, kd.value)'),
+                                       extra=js_transforms(['LineSource', 'PointSource'], ['y_over_x'])))
 
 # add sliders to plot and display
-bmax_slider.js_on_change('value', callback)
-pkd_slider.js_on_change('value', callback)
+connect(callback, bmax_slider, pkd_slider)
 
 # -------------------------------------------------
 # set layout and display